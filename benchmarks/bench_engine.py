@@ -0,0 +1,186 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import timeit
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from benchmarks import bench_models
+from src.engine import bitboard, game
+from src.engine.perft import PERFT_POSITIONS, bitboard_perft, perft, perft_position
+from src.strategy.evaluation import evaluate, evaluate_batch, position_arrays
+from src.strategy.minimax import Searcher
+
+# Deepest perft run per representation; the pydantic engine is far slower per node
+PERFT_DEPTHS = {
+    "pydantic": {"start": 3, "midgame": 4, "endgame": 5},
+    "bitboard": {"start": 4, "midgame": 5, "endgame": 7},
+}
+
+# Results where a larger value is better; everything else is a time
+HIGHER_IS_BETTER = ("_nps",)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+def _per_call_us(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+def bench_perft(quick: bool = False) -> dict[str, float]:
+    results = {}
+    for engine, depths in PERFT_DEPTHS.items():
+        for name, depth in depths.items():
+            if quick:
+                depth -= 1
+            expected = PERFT_POSITIONS[name][1][depth]
+            bits = perft_position(name)
+            start = time.perf_counter()
+            if engine == "pydantic":
+                nodes = perft(bits.to_game_state(), depth)
+            else:
+                nodes = bitboard_perft(bits, depth)
+            seconds = time.perf_counter() - start
+            if nodes != expected:
+                raise AssertionError(f"perft {engine} {name} depth {depth}: {nodes} nodes, expected {expected}")
+            results[f"perft_{engine}_{name}_d{depth}_s"] = seconds
+            results[f"perft_{engine}_{name}_nps"] = nodes / seconds
+    return results
+
+def bench_operations(number: int) -> dict[str, float]:
+    """Microseconds per call of the engine primitives on the midgame position."""
+    bits = perft_position("midgame")
+    state = bits.to_game_state()
+    piece = state.remaining_pieces[0]
+    placement = game.get_legal_placements(state)[0]
+    code = bitboard.piece_to_bits(piece)
+    square = bitboard.square_index(*placement)
+
+    def pydantic_turn():
+        game.make_move(state, piece_to_give=piece)
+        game.make_move(state, placement=placement)
+        game.unmake_move(state)
+        game.unmake_move(state)
+
+    def bitboard_turn():
+        bitboard.make_move(bits, piece_to_give=code)
+        bitboard.make_move(bits, placement=square)
+        bitboard.unmake_move(bits)
+        bitboard.unmake_move(bits)
+
+    def pydantic_moves():
+        game.get_legal_placements(state)
+        game.get_legal_piece_selections(state)
+
+    def bitboard_moves():
+        bitboard.get_legal_placements(bits)
+        bitboard.get_legal_piece_selections(bits)
+
+    return {
+        "make_unmake_turn_pydantic_us": _per_call_us(pydantic_turn, number),
+        "make_unmake_turn_bitboard_us": _per_call_us(bitboard_turn, number),
+        "check_winner_pydantic_us": _per_call_us(lambda: game.check_winner(state), number),
+        "check_winner_bitboard_us": _per_call_us(lambda: bitboard.check_winner(bits), number),
+        "placement_wins_pydantic_us": _per_call_us(lambda: game.placement_wins(state, (1, 1)), number),
+        "placement_wins_bitboard_us": _per_call_us(lambda: bitboard.placement_wins(bits, 5), number),
+        "legal_moves_pydantic_us": _per_call_us(pydantic_moves, number),
+        "legal_moves_bitboard_us": _per_call_us(bitboard_moves, number),
+    }
+
+def bench_evaluation(number: int) -> dict[str, float]:
+    """Microseconds to score every child of a midgame node, one at a time and as a batch."""
+    state = perft_position("midgame")
+    bitboard.make_move(state, piece_to_give=bitboard.get_legal_piece_selections(state)[0])
+    children = []
+    for square in bitboard.get_legal_placements(state):
+        for give in bitboard.get_legal_piece_selections(state):
+            child = state.copy()
+            bitboard.make_move(child, placement=square)
+            bitboard.make_move(child, piece_to_give=give)
+            children.append(child)
+    arrays = position_arrays(children)
+    number = max(number // 20, 10)
+    return {
+        "evaluate_children_scalar_us": _per_call_us(lambda: [evaluate(child) for child in children], number),
+        "evaluate_children_batch_us": _per_call_us(lambda: evaluate_batch(*arrays), number),
+    }
+
+def bench_search(quick: bool = False) -> dict[str, float]:
+    state = perft_position("midgame")
+    bitboard.make_move(state, piece_to_give=bitboard.get_legal_piece_selections(state)[0])
+    depth = 2 if quick else 3
+    searcher = Searcher()
+    start = time.perf_counter()
+    result = searcher.search(state, depth)
+    seconds = time.perf_counter() - start
+    return {
+        f"search_midgame_d{depth}_s": seconds,
+        "search_midgame_nps": result.nodes / seconds,
+    }
+
+def run(quick: bool = False) -> dict:
+    number = 200 if quick else 2000
+    results = {}
+    results.update(bench_perft(quick))
+    results.update(bench_operations(number))
+    results.update(bench_models.run(number))
+    results.update(bench_evaluation(number))
+    results.update(bench_search(quick))
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "quick": quick,
+        "results": results,
+    }
+
+def compare(baseline: dict, current: dict, tolerance: float) -> list[str]:
+    """Names of results more than `tolerance` (a fraction) worse than the baseline."""
+    regressions = []
+    for name, value in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None or old == 0 or value == 0:
+            continue
+        higher_better = name.endswith(HIGHER_IS_BETTER)
+        ratio = old / value if higher_better else value / old
+        flag = ""
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:40s} {old:14.2f} -> {value:14.2f}  x{ratio:5.2f} slower{flag}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Engine speed benchmarks with perft validation.")
+    parser.add_argument("--quick", action="store_true", help="smaller depths and iteration counts")
+    parser.add_argument("--output", type=Path, help="write results as JSON to this file")
+    parser.add_argument("--compare", type=Path, help="baseline JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed slowdown before flagging")
+    args = parser.parse_args()
+
+    report = run(args.quick)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        regressions = compare(baseline, report, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            sys.exit(1)
+    else:
+        for name, value in report["results"].items():
+            print(f"{name:40s} {value:14.2f}")
+
+
+if __name__ == "__main__":
+    main()
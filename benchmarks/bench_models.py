@@ -0,0 +1,57 @@
+import random
+import timeit
+
+from src.engine.game import get_legal_placements, make_move
+from src.engine.models import Board, GamePhase, GameState, all_pieces
+
+
+def _mid_game_state(seed: int = 0, plies: int = 12) -> GameState:
+    rng = random.Random(seed)
+    state = GameState(
+        board=Board.empty(),
+        remaining_pieces=all_pieces(),
+        current_phase=GamePhase.SELECT_PIECE,
+        selected_piece=None,
+        current_player=0
+    )
+    for _ in range(plies):
+        if state.current_phase == GamePhase.SELECT_PIECE:
+            make_move(state, piece_to_give=rng.choice(state.remaining_pieces))
+        else:
+            make_move(state, placement=rng.choice(get_legal_placements(state)))
+    return state
+
+def _per_call_us(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+def run(number: int = 2000) -> dict[str, float]:
+    """Microseconds per call for validated vs trusted construction and copying."""
+    state = _mid_game_state()
+    fields = dict(
+        board=state.board,
+        remaining_pieces=state.remaining_pieces,
+        current_phase=state.current_phase,
+        selected_piece=state.selected_piece,
+        current_player=state.current_player,
+        history=state.history
+    )
+    grid = [row[:] for row in state.board.grid]
+
+    return {
+        "construct_validated_us": _per_call_us(lambda: GameState(**fields), number),
+        "construct_trusted_us": _per_call_us(lambda: GameState.trusted(**fields), number),
+        "board_validated_us": _per_call_us(lambda: Board(grid=grid), number),
+        "board_trusted_us": _per_call_us(lambda: Board.trusted(grid), number),
+        "copy_deep_us": _per_call_us(lambda: state.model_copy(deep=True), number),
+        "copy_fast_us": _per_call_us(state.fast_copy, number),
+    }
+
+
+def main() -> None:
+    results = run()
+    for name, value in results.items():
+        print(f"{name:24s} {value:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
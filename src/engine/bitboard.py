@@ -0,0 +1,317 @@
+import struct
+from typing import Optional
+
+from src.engine.models import PIECES, Board, GamePhase, GameState, MoveRecord, Piece, piece_id
+
+# Squares are indexed row-major (square = row * 4 + col), so a board fits in a 16-bit mask.
+# Pieces are 4-bit codes, most significant bit first in piece_to_code order:
+# bit 3 = height, bit 2 = color, bit 1 = shape, bit 0 = top.
+EMPTY = -1
+FULL_BOARD = 0xFFFF
+ALL_PIECES = 0xFFFF  # one bit per piece code
+
+# occupancy, piece codes as nibbles, remaining pieces, selected piece, phase and player
+_PACKED = struct.Struct("<HQHBB")
+
+HEIGHT = 8
+COLOR = 4
+SHAPE = 2
+TOP = 1
+ATTRIBUTE_BITS = (TOP, SHAPE, COLOR, HEIGHT)
+
+
+def square_index(row: int, col: int) -> int:
+    return row * 4 + col
+
+def square_coords(square: int) -> tuple[int, int]:
+    return divmod(square, 4)
+
+def _mask(squares) -> int:
+    mask = 0
+    for square in squares:
+        mask |= 1 << square
+    return mask
+
+def _build_line_masks() -> tuple[int, ...]:
+    lines = []
+    for i in range(4):
+        lines.append(_mask(square_index(i, j) for j in range(4)))
+    for j in range(4):
+        lines.append(_mask(square_index(i, j) for i in range(4)))
+    lines.append(_mask(square_index(i, i) for i in range(4)))
+    lines.append(_mask(square_index(i, 3 - i) for i in range(4)))
+    for i in range(3):
+        for j in range(3):
+            lines.append(_mask(square_index(r, c) for r in range(i, i + 2) for c in range(j, j + 2)))
+    return tuple(lines)
+
+# Rows, columns, diagonals and 2x2 squares, in the same order check_winner scans them.
+LINE_MASKS = _build_line_masks()
+
+# square -> masks of the lines through it (4 to 7 of them), for incremental win checks
+SQUARE_LINE_MASKS = tuple(
+    tuple(line for line in LINE_MASKS if line >> square & 1) for square in range(16)
+)
+
+
+def piece_to_bits(piece: Piece) -> int:
+    # Piece codes are catalog ids
+    return piece_id(piece)
+
+def bits_to_piece(code: int) -> Piece:
+    return PIECES[code]
+
+
+class BitState:
+    """Compact game state: piece codes per square plus occupancy and per-attribute masks."""
+
+    __slots__ = ("cells", "occupied", "attrs", "remaining", "selected", "phase", "player", "history")
+
+    def __init__(
+        self,
+        cells: list[int],
+        remaining: int,
+        phase: GamePhase,
+        selected: int = EMPTY,
+        player: int = 0,
+        history: Optional[list[tuple[int, int]]] = None
+    ):
+        self.cells = cells
+        self.remaining = remaining
+        self.phase = phase
+        self.selected = selected
+        self.player = player
+        # undo stack of (square, piece) per ply; square is EMPTY for a piece selection
+        self.history = [] if history is None else history
+
+        self.occupied = 0
+        # attrs[i] holds the squares whose piece has ATTRIBUTE_BITS[i] set
+        self.attrs = [0, 0, 0, 0]
+        for square, code in enumerate(cells):
+            if code != EMPTY:
+                self._set_square(square, code)
+
+    def _set_square(self, square: int, code: int) -> None:
+        bit = 1 << square
+        self.occupied |= bit
+        attrs = self.attrs
+        if code & TOP:
+            attrs[0] |= bit
+        if code & SHAPE:
+            attrs[1] |= bit
+        if code & COLOR:
+            attrs[2] |= bit
+        if code & HEIGHT:
+            attrs[3] |= bit
+
+    def _clear_square(self, square: int) -> None:
+        keep = ~(1 << square)
+        self.occupied &= keep
+        attrs = self.attrs
+        attrs[0] &= keep
+        attrs[1] &= keep
+        attrs[2] &= keep
+        attrs[3] &= keep
+
+    @staticmethod
+    def initial() -> "BitState":
+        return BitState(cells=[EMPTY] * 16, remaining=ALL_PIECES, phase=GamePhase.SELECT_PIECE)
+
+    @staticmethod
+    def from_game_state(state: GameState) -> "BitState":
+        cells = [EMPTY] * 16
+        for row in range(4):
+            for col in range(4):
+                piece = state.board.grid[row][col]
+                if piece is not None:
+                    cells[square_index(row, col)] = piece_to_bits(piece)
+
+        remaining = state.remaining_mask
+        selected = EMPTY if state.selected_piece is None else piece_to_bits(state.selected_piece)
+        history = [
+            (EMPTY if record.placement is None else square_index(*record.placement),
+             EMPTY if record.piece is None else piece_to_bits(record.piece))
+            for record in state.history
+        ]
+        return BitState(
+            cells=cells,
+            remaining=remaining,
+            phase=state.current_phase,
+            selected=selected,
+            player=state.current_player,
+            history=history
+        )
+
+    def to_game_state(self) -> GameState:
+        grid = [
+            [None if self.cells[square_index(row, col)] == EMPTY
+             else bits_to_piece(self.cells[square_index(row, col)])
+             for col in range(4)]
+            for row in range(4)
+        ]
+        # Highest code first, which is the order the CLI builds the full piece set in
+        remaining_pieces = [bits_to_piece(code) for code in range(15, -1, -1) if self.remaining >> code & 1]
+        return GameState.trusted(
+            board=Board.trusted(grid),
+            remaining_pieces=remaining_pieces,
+            current_phase=self.phase,
+            selected_piece=None if self.selected == EMPTY else bits_to_piece(self.selected),
+            current_player=self.player,
+            history=self._history_records(),
+            remaining_mask=self.remaining
+        )
+
+    def _history_records(self) -> list[MoveRecord]:
+        # Walk the undo stack backwards to recover each given piece's index in the
+        # (highest code first) remaining list at the time it was given.
+        records = []
+        remaining = self.remaining
+        for square, code in reversed(self.history):
+            piece = bits_to_piece(code)
+            if square == EMPTY:
+                remaining |= 1 << code
+                index = bin(remaining >> (code + 1)).count("1")
+                records.append(
+                    MoveRecord.trusted(phase=GamePhase.SELECT_PIECE, piece=piece, piece_index=index)
+                )
+            else:
+                records.append(
+                    MoveRecord.trusted(phase=GamePhase.PLACE_PIECE, placement=square_coords(square), piece=piece)
+                )
+        records.reverse()
+        return records
+
+    def to_bytes(self) -> bytes:
+        """14-byte encoding for shipping positions between processes; history is not kept."""
+        nibbles = 0
+        for square, code in enumerate(self.cells):
+            if code != EMPTY:
+                nibbles |= code << (4 * square)
+        flags = (self.phase == GamePhase.PLACE_PIECE) | self.player << 1
+        selected = 0xFF if self.selected == EMPTY else self.selected
+        return _PACKED.pack(self.occupied, nibbles, self.remaining, selected, flags)
+
+    @staticmethod
+    def from_bytes(data: bytes) -> "BitState":
+        occupied, nibbles, remaining, selected, flags = _PACKED.unpack(data)
+        cells = [nibbles >> (4 * square) & 0xF if occupied >> square & 1 else EMPTY for square in range(16)]
+        return BitState(
+            cells=cells,
+            remaining=remaining,
+            phase=GamePhase.PLACE_PIECE if flags & 1 else GamePhase.SELECT_PIECE,
+            selected=EMPTY if selected == 0xFF else selected,
+            player=flags >> 1
+        )
+
+    def copy(self) -> "BitState":
+        clone = BitState.__new__(BitState)
+        clone.cells = self.cells[:]
+        clone.occupied = self.occupied
+        clone.attrs = self.attrs[:]
+        clone.remaining = self.remaining
+        clone.selected = self.selected
+        clone.phase = self.phase
+        clone.player = self.player
+        clone.history = self.history[:]
+        return clone
+
+
+def get_legal_placements(state: BitState) -> list[int]:
+    free = ~state.occupied & FULL_BOARD
+    return [square for square in range(16) if free >> square & 1]
+
+def get_legal_piece_selections(state: BitState) -> list[int]:
+    remaining = state.remaining
+    return [code for code in range(16) if remaining >> code & 1]
+
+def make_move(
+    state: BitState,
+    placement: Optional[int] = None,
+    piece_to_give: Optional[int] = None
+) -> BitState:
+
+    if state.phase == GamePhase.SELECT_PIECE:
+        if piece_to_give is None:
+            raise ValueError("Must provide a piece to give during SELECT_PIECE phase.")
+        if not (0 <= piece_to_give < 16 and state.remaining >> piece_to_give & 1):
+            raise ValueError("Piece is not available for selection.")
+
+        state.history.append((EMPTY, piece_to_give))
+        state.selected = piece_to_give
+        state.remaining &= ~(1 << piece_to_give)
+        state.player = 1 - state.player
+        state.phase = GamePhase.PLACE_PIECE
+
+    elif state.phase == GamePhase.PLACE_PIECE:
+        if placement is None:
+            raise ValueError("Must provide a placement during PLACE_PIECE phase.")
+        if not (0 <= placement < 16) or state.occupied >> placement & 1:
+            raise ValueError("Position is already occupied or out of bounds.")
+
+        state.history.append((placement, state.selected))
+        state.cells[placement] = state.selected
+        state._set_square(placement, state.selected)
+        state.selected = EMPTY
+        state.phase = GamePhase.SELECT_PIECE
+
+    return state
+
+def unmake_move(state: BitState) -> BitState:
+    if not state.history:
+        raise ValueError("No move to undo.")
+
+    square, code = state.history.pop()
+    if square == EMPTY:
+        state.remaining |= 1 << code
+        state.selected = EMPTY
+        state.player = 1 - state.player
+        state.phase = GamePhase.SELECT_PIECE
+    else:
+        state.cells[square] = EMPTY
+        state._clear_square(square)
+        state.selected = code
+        state.phase = GamePhase.PLACE_PIECE
+
+    return state
+
+def line_is_winning(state: BitState, line: int) -> bool:
+    if state.occupied & line != line:
+        return False
+    for mask in state.attrs:
+        shared = mask & line
+        if shared == line or shared == 0:
+            return True
+    return False
+
+def placement_wins(state: BitState, square: int) -> bool:
+    """Whether the piece on `square` completes a winning line; call right after placing it."""
+    occupied = state.occupied
+    top, shape, color, height = state.attrs
+    for line in SQUARE_LINE_MASKS[square]:
+        if occupied & line != line:
+            continue
+        for mask in (top & line, shape & line, color & line, height & line):
+            if mask == line or mask == 0:
+                return True
+    return False
+
+def wins_with(state: BitState, square: int, code: int) -> bool:
+    """Whether placing piece `code` on the empty `square` would win, without making the move."""
+    bit = 1 << square
+    occupied = state.occupied | bit
+    for line in SQUARE_LINE_MASKS[square]:
+        if occupied & line != line:
+            continue
+        for mask, attr in zip(state.attrs, ATTRIBUTE_BITS):
+            shared = mask & line
+            if code & attr:
+                shared |= bit
+            if shared == line or shared == 0:
+                return True
+    return False
+
+def check_winner(state: BitState) -> int | None:
+    for line in LINE_MASKS:
+        if line_is_winning(state, line):
+            return 1 - state.player
+    return None
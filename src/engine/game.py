@@ -1,4 +1,4 @@
-from src.engine.models import GameState, Piece, GamePhase
+from src.engine.models import GameState, Piece, GamePhase, MoveRecord, piece_id
 from typing import Optional
 
 def get_legal_placements(state: GameState) -> list[tuple[int, int]]:
@@ -19,11 +19,15 @@ def make_move(
         if piece_to_give is None:
             raise ValueError("Must provide a piece to give during SELECT_PIECE phase.")
 
-        legal_pieces = get_legal_piece_selections(state)
-
-        if piece_to_give in legal_pieces:
+        if state.has_remaining(piece_to_give):
+            # Only the undo record needs the position in the list
+            index = state.remaining_pieces.index(piece_to_give)
+            state.history.append(
+                MoveRecord.trusted(phase=GamePhase.SELECT_PIECE, piece=piece_to_give, piece_index=index)
+            )
             state.selected_piece = piece_to_give
-            state.remaining_pieces.remove(piece_to_give)
+            del state.remaining_pieces[index]
+            state.remaining_mask &= ~(1 << piece_id(piece_to_give))
 
             if state.current_player == 0:
                 state.current_player = 1 
@@ -41,6 +45,9 @@ def make_move(
         legal_placements = get_legal_placements(state)
 
         if placement in legal_placements:
+            state.history.append(
+                MoveRecord.trusted(phase=GamePhase.PLACE_PIECE, placement=placement, piece=state.selected_piece)
+            )
             state.board.place(
                 piece = state.selected_piece, 
                 row = placement[0],
@@ -54,40 +61,72 @@ def make_move(
 
     return state
 
-def _pieces_share_attribute(pieces: list[Piece]):
-    for attr in ("height", "color", "shape", "top"):
-        if len(set(getattr(p, attr) for p in pieces)) == 1:
-            return True
-    return False
+def unmake_move(state: GameState) -> GameState:
+    """Take back the last make_move, restoring the state exactly as it was before it."""
+    if not state.history:
+        raise ValueError("No move to undo.")
+
+    record = state.history.pop()
+    if record.phase == GamePhase.SELECT_PIECE:
+        state.remaining_pieces.insert(record.piece_index, record.piece)
+        state.remaining_mask |= 1 << piece_id(record.piece)
+        state.selected_piece = None
+        state.current_player = 1 - state.current_player
+        state.current_phase = GamePhase.SELECT_PIECE
+    else:
+        state.board.remove(row=record.placement[0], col=record.placement[1])
+        state.selected_piece = record.piece
+        state.current_phase = GamePhase.PLACE_PIECE
 
-def check_winner(state: GameState) -> int | None:
-    grid = state.board.grid
+    return state
 
-    # check rows
+def _build_lines() -> tuple[tuple[tuple[int, int], ...], ...]:
+    lines = []
     for i in range(4):
-        row = grid[i][0:]
-        if None not in row and _pieces_share_attribute(row):
-            return 1-state.current_player
-
-    # check columns
+        lines.append(tuple((i, j) for j in range(4)))
     for j in range(4):
-        col = [grid[i][j] for i in range(4)]
-        if None not in col and _pieces_share_attribute(col):
-            return 1-state.current_player
-
-    # check diagonals
-    top_left_diag = [grid[i][i] for i in range(4)]
-    top_right_diag = [grid[i][3 - i] for i in range(4)]
-    if None not in top_left_diag and _pieces_share_attribute(top_left_diag):
-        return 1-state.current_player
-    if None not in top_right_diag and _pieces_share_attribute(top_right_diag):
-        return 1-state.current_player
-
-    # check 2x2 squares
+        lines.append(tuple((i, j) for i in range(4)))
+    lines.append(tuple((i, i) for i in range(4)))
+    lines.append(tuple((i, 3 - i) for i in range(4)))
     for i in range(3):
         for j in range(3):
-            square = [grid[r][c] for r in range(i, i + 2) for c in range(j, j + 2)]
-            if None not in square and _pieces_share_attribute(square):
-                return 1-state.current_player
+            lines.append(tuple((r, c) for r in range(i, i + 2) for c in range(j, j + 2)))
+    return tuple(lines)
+
+# rows, columns, diagonals, 2x2 squares
+LINES = _build_lines()
+
+# (row, col) -> the lines running through that square; a placement can only complete these
+SQUARE_LINES = {
+    (row, col): tuple(line for line in LINES if (row, col) in line)
+    for row in range(4) for col in range(4)
+}
+
+def _pieces_share_attribute(pieces: list[Piece]) -> bool:
+    # A line wins if some attribute bit is set in every code (AND) or clear in every code (NOR)
+    common = 0xF
+    absent = 0xF
+    for p in pieces:
+        code = piece_id(p)
+        common &= code
+        absent &= ~code
+    return (common | absent) != 0
+
+def _line_wins(grid: list[list[Optional[Piece]]], line: tuple[tuple[int, int], ...]) -> bool:
+    pieces = [grid[r][c] for r, c in line]
+    return None not in pieces and _pieces_share_attribute(pieces)
+
+def placement_wins(state: GameState, placement: tuple[int, int]) -> bool:
+    """Whether the piece on `placement` completes a winning line, checking only lines through it."""
+    grid = state.board.grid
+    for line in SQUARE_LINES[placement]:
+        if _line_wins(grid, line):
+            return True
+    return False
 
-    return None
\ No newline at end of file
+def check_winner(state: GameState) -> int | None:
+    grid = state.board.grid
+    for line in LINES:
+        if _line_wins(grid, line):
+            return 1-state.current_player
+    return None
@@ -1,13 +1,42 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field, model_validator
+from typing import Any, Optional
 from enum import Enum
 
+def _trusted_instance(cls, values: dict[str, Any]):
+    # Instance of a pydantic model from values already known to be valid. Skips both
+    # validation and model_construct's per-field default handling, so `values` must
+    # name every field.
+    obj = cls.__new__(cls)
+    object.__setattr__(obj, "__dict__", values)
+    object.__setattr__(obj, "__pydantic_fields_set__", set(values))
+    object.__setattr__(obj, "__pydantic_extra__", None)
+    object.__setattr__(obj, "__pydantic_private__", None)
+    return obj
+
 class Piece(BaseModel, frozen=True):
     height: bool
     color: bool
     shape: bool
     top: bool
 
+def piece_id(piece: Piece) -> int:
+    """Index of the piece in PIECES: its attributes as bits, height first."""
+    return (piece.height << 3) | (piece.color << 2) | (piece.shape << 1) | piece.top
+
+# The 16 distinct pieces as shared instances, indexed by piece_id
+PIECES: tuple[Piece, ...] = tuple(
+    Piece(height=bool(i & 8), color=bool(i & 4), shape=bool(i & 2), top=bool(i & 1))
+    for i in range(16)
+)
+
+def intern_piece(piece: Piece) -> Piece:
+    """The catalog instance equal to `piece`."""
+    return PIECES[piece_id(piece)]
+
+def all_pieces() -> list[Piece]:
+    """A fresh list of the full piece set, highest id first (tall, light, square, hollow)."""
+    return [PIECES[i] for i in range(15, -1, -1)]
+
 class Board(BaseModel):
     grid: list[list[Optional[Piece]]]
 
@@ -19,15 +48,105 @@ class Board(BaseModel):
 
     @staticmethod
     def empty() -> "Board":
-        return Board(grid=[[None] * 4 for _ in range(4)])
+        return Board.trusted([[None] * 4 for _ in range(4)])
+
+    @staticmethod
+    def trusted(grid: list[list[Optional[Piece]]]) -> "Board":
+        """Board without validation, for engine code whose grid is already valid."""
+        return _trusted_instance(Board, {"grid": grid})
+
+    def fast_copy(self) -> "Board":
+        """Copy the grid rows without revalidating; pieces are immutable and shared."""
+        return Board.trusted([row[:] for row in self.grid])
 
 class GamePhase(str, Enum):
     PLACE_PIECE = "place_piece"
     SELECT_PIECE = "select_piece"
 
+class MoveRecord(BaseModel, frozen=True):
+    """One ply of history, holding what unmake_move needs to restore the state before it."""
+    phase: GamePhase
+    placement: Optional[tuple[int, int]] = None
+    piece: Optional[Piece]
+    piece_index: Optional[int] = None  # where a given piece sat in remaining_pieces
+
+    @staticmethod
+    def trusted(
+        phase: GamePhase,
+        piece: Optional[Piece],
+        placement: Optional[tuple[int, int]] = None,
+        piece_index: Optional[int] = None
+    ) -> "MoveRecord":
+        return _trusted_instance(
+            MoveRecord,
+            {"phase": phase, "placement": placement, "piece": piece, "piece_index": piece_index}
+        )
+
 class GameState(BaseModel):
     board: Board
     remaining_pieces: list[Piece]
     current_phase: GamePhase
     selected_piece: Optional[Piece]
-    current_player: int
\ No newline at end of file
+    current_player: int
+    history: list[MoveRecord] = []
+    # Bit piece_id(p) is set for every p in remaining_pieces, so has_remaining is one bit
+    # test. Derived from the list on construction and reassignment; make_move/unmake_move
+    # keep it in step. Editing the list in place is not supported: assign a new list.
+    remaining_mask: int = Field(default=0, exclude=True, repr=False)
+
+    @model_validator(mode="after")
+    def _sync_remaining_mask(self) -> "GameState":
+        self.remaining_mask = _mask_of(self.remaining_pieces)
+        return self
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if name == "remaining_pieces":
+            super().__setattr__("remaining_mask", _mask_of(value))
+
+    @classmethod
+    def trusted(
+        cls,
+        board: Board,
+        remaining_pieces: list[Piece],
+        current_phase: GamePhase,
+        selected_piece: Optional[Piece],
+        current_player: int,
+        history: Optional[list[MoveRecord]] = None,
+        remaining_mask: Optional[int] = None
+    ) -> "GameState":
+        """Build a state without validation, for engine code whose inputs are already valid.
+
+        Anything built from outside input (CLI, files, other services) should go through
+        the normal constructor instead.
+        """
+        return _trusted_instance(cls, {
+            "board": board,
+            "remaining_pieces": remaining_pieces,
+            "current_phase": current_phase,
+            "selected_piece": selected_piece,
+            "current_player": current_player,
+            "history": [] if history is None else history,
+            "remaining_mask": _mask_of(remaining_pieces) if remaining_mask is None else remaining_mask,
+        })
+
+    def fast_copy(self) -> "GameState":
+        """Independent copy without revalidation; only the mutable containers are copied."""
+        return _trusted_instance(GameState, {
+            "board": self.board.fast_copy(),
+            "remaining_pieces": self.remaining_pieces[:],
+            "current_phase": self.current_phase,
+            "selected_piece": self.selected_piece,
+            "current_player": self.current_player,
+            "history": self.history[:],
+            "remaining_mask": self.remaining_mask,
+        })
+
+    def has_remaining(self, piece: Piece) -> bool:
+        return self.remaining_mask >> piece_id(piece) & 1 == 1
+
+def _mask_of(pieces: list[Piece]) -> int:
+    mask = 0
+    for piece in pieces:
+        mask |= 1 << piece_id(piece)
+    return mask
\ No newline at end of file
@@ -0,0 +1,76 @@
+from src.engine import bitboard
+from src.engine.bitboard import BitState
+from src.engine.game import (
+    get_legal_piece_selections,
+    get_legal_placements,
+    make_move,
+    placement_wins,
+    unmake_move,
+)
+from src.engine.models import GamePhase, GameState
+
+# Perft counts the distinct move sequences of `depth` plies, where a ply is a single
+# piece selection or a single placement. A placement that ends the game (a winning line
+# or the full board) is a leaf even if depth plies have not been played yet.
+
+
+def perft(state: GameState, depth: int) -> int:
+    if depth == 0:
+        return 1
+    nodes = 0
+    if state.current_phase == GamePhase.SELECT_PIECE:
+        for piece in list(get_legal_piece_selections(state)):
+            make_move(state, piece_to_give=piece)
+            nodes += perft(state, depth - 1)
+            unmake_move(state)
+    else:
+        for placement in get_legal_placements(state):
+            make_move(state, placement=placement)
+            if placement_wins(state, placement) or not state.remaining_pieces:
+                nodes += 1
+            else:
+                nodes += perft(state, depth - 1)
+            unmake_move(state)
+    return nodes
+
+def bitboard_perft(state: BitState, depth: int) -> int:
+    if depth == 0:
+        return 1
+    nodes = 0
+    if state.phase == GamePhase.SELECT_PIECE:
+        for piece in bitboard.get_legal_piece_selections(state):
+            bitboard.make_move(state, piece_to_give=piece)
+            nodes += bitboard_perft(state, depth - 1)
+            bitboard.unmake_move(state)
+    else:
+        for square in bitboard.get_legal_placements(state):
+            bitboard.make_move(state, placement=square)
+            if bitboard.placement_wins(state, square) or not state.remaining:
+                nodes += 1
+            else:
+                nodes += bitboard_perft(state, depth - 1)
+            bitboard.unmake_move(state)
+    return nodes
+
+
+# Reference positions for validating and timing perft: plies from the start, alternating
+# piece id to give and square to place on, with known node counts by depth.
+PERFT_POSITIONS: dict[str, tuple[tuple[int, ...], dict[int, int]]] = {
+    "start": ((), {1: 16, 2: 256, 3: 3840, 4: 57600}),
+    "midgame": ((15, 5, 0, 10, 6, 0, 9, 15), {3: 1584, 4: 17424, 5: 172152}),
+    "endgame": (
+        (15, 5, 0, 10, 6, 0, 9, 15, 3, 3, 12, 12, 5, 6, 10, 9, 1),
+        {4: 1982, 5: 11522, 6: 40114, 7: 183074},
+    ),
+}
+
+
+def perft_position(name: str) -> BitState:
+    plies, _ = PERFT_POSITIONS[name]
+    state = BitState.initial()
+    for i, value in enumerate(plies):
+        if i % 2 == 0:
+            bitboard.make_move(state, piece_to_give=value)
+        else:
+            bitboard.make_move(state, placement=value)
+    return state
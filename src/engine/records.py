@@ -0,0 +1,122 @@
+import os
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, NamedTuple
+
+from src.engine.bitboard import EMPTY, FULL_BOARD, BitState, make_move, placement_wins
+
+# A game is its plies from the empty board: piece ids given and squares placed on,
+# alternating and starting with a give. Every ply fits in a nibble, so a record is a
+# ply count, a result and the plies packed two to a byte; a full game takes 18 bytes.
+#
+# File layout: the magic, then records back to back.
+_MAGIC = b"QGR1"
+_CHUNK_BYTES = 1 << 16
+
+# Results other than a win, which is recorded as the player (0 or 1) who completed a line
+DRAW = 2
+UNFINISHED = 3
+
+
+class GameRecord(NamedTuple):
+    plies: tuple[int, ...]
+    result: int
+
+
+def record_game(state: BitState) -> GameRecord:
+    """The record of the game `state` was played to, from its undo history."""
+    placed = state.occupied.bit_count()
+    given = 16 - state.remaining.bit_count()
+    if len(state.history) != placed + given:
+        raise ValueError("State history does not start from the empty board.")
+    plies = tuple(piece if square == EMPTY else square for square, piece in state.history)
+    return GameRecord(plies, _result(state))
+
+def _result(state: BitState) -> int:
+    if not state.history or state.history[-1][0] == EMPTY:
+        return UNFINISHED
+    if placement_wins(state, state.history[-1][0]):
+        return state.player
+    return DRAW if state.occupied == FULL_BOARD else UNFINISHED
+
+def replay(record: GameRecord) -> BitState:
+    """The position at the end of `record`; raises ValueError on an illegal ply."""
+    state = BitState.initial()
+    for i, ply in enumerate(record.plies):
+        if i % 2 == 0:
+            make_move(state, piece_to_give=ply)
+        else:
+            make_move(state, placement=ply)
+    return state
+
+
+def encode(record: GameRecord) -> bytes:
+    plies = record.plies
+    if len(plies) > 32:
+        raise ValueError("A game has at most 32 plies.")
+    packed = bytearray((len(plies) + 1) // 2)
+    for i, ply in enumerate(plies):
+        packed[i >> 1] |= ply << (4 * (i & 1))
+    return bytes((len(plies), record.result)) + packed
+
+def decode(data: bytes, offset: int = 0) -> tuple[GameRecord, int]:
+    """The record at `offset` in `data` and the offset just past it."""
+    count = data[offset]
+    result = data[offset + 1]
+    body = offset + 2
+    plies = tuple(data[body + (i >> 1)] >> (4 * (i & 1)) & 0xF for i in range(count))
+    return GameRecord(plies, result), body + (count + 1) // 2
+
+
+class RecordWriter:
+    """Appends records to a game file, writing the magic when the file is new."""
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        new = not self.path.exists() or self.path.stat().st_size == 0
+        self._file: BinaryIO = open(self.path, "ab")
+        if new:
+            self._file.write(_MAGIC)
+        self.count = 0
+
+    def __enter__(self) -> "RecordWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def write(self, record: GameRecord) -> None:
+        self._file.write(encode(record))
+        self.count += 1
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def write_records(path: str | os.PathLike, records: Iterable[GameRecord]) -> int:
+    """Append `records` to `path`; returns how many were written."""
+    with RecordWriter(path) as writer:
+        for record in records:
+            writer.write(record)
+        return writer.count
+
+def read_records(path: str | os.PathLike) -> Iterator[GameRecord]:
+    """Records in `path`, in order, read a chunk at a time."""
+    with open(path, "rb") as f:
+        if f.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError(f"{path} is not a game record file.")
+        buffer = b""
+        offset = 0
+        while True:
+            chunk = f.read(_CHUNK_BYTES)
+            buffer = buffer[offset:] + chunk
+            offset = 0
+            # A record is at most 18 bytes; decode while a whole one is surely buffered
+            end = len(buffer) if not chunk else len(buffer) - 18
+            while offset < end:
+                if offset + 2 + (buffer[offset] + 1) // 2 > len(buffer):
+                    raise ValueError(f"{path} ends in a truncated record.")
+                record, offset = decode(buffer, offset)
+                yield record
+            if not chunk:
+                return
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import re
+import struct
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+
+from src.engine.bitboard import square_index
+from src.explanation.prompts import ATTRIBUTE_NAMES, PROMPT_VERSION, describe_square
+from src.strategy.minimax import Move
+from src.strategy.symmetry import Orientation
+
+DEFAULT_CAPACITY = 1024
+
+# Cache file: the magic, then records of a key digest and payload length, each followed
+# by its JSON payload; a later record for a key replaces an earlier one
+_MAGIC = b"QEC1"
+_RECORD = struct.Struct("<16sI")
+
+
+class ExplanationCache:
+    """Explanations and search results by canonical position, in two tiers.
+
+    The most recently used `capacity` entries are kept decoded in memory. With a
+    `path`, every entry is also appended to a file whose offsets are indexed when it is
+    opened, so older entries are one read away and survive restarts. A partial trailing
+    record from an interrupted write is dropped.
+
+    Each entry carries the seconds it took to produce, which is what a hit saves.
+    """
+
+    def __init__(self, path: Optional[str | os.PathLike] = None, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._memory: OrderedDict[bytes, dict] = OrderedDict()
+        self._offsets: dict[bytes, tuple[int, int]] = {}
+        self._file = None
+        if path is None:
+            return
+        path = Path(path)
+        if path.exists() and path.stat().st_size:
+            self._file = open(path, "r+b")
+            if self._file.read(len(_MAGIC)) != _MAGIC:
+                self._file.close()
+                raise ValueError(f"{path} is not an explanation cache.")
+            end = self._index(path.stat().st_size)
+            self._file.truncate(end)
+            self._file.seek(end)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(path, "w+b")
+            self._file.write(_MAGIC)
+
+    def _index(self, size: int) -> int:
+        """Record the offset of every complete record; returns where the last one ends."""
+        end = len(_MAGIC)
+        while end + _RECORD.size <= size:
+            key, length = _RECORD.unpack(self._file.read(_RECORD.size))
+            if end + _RECORD.size + length > size:
+                break
+            self._offsets[key] = (end + _RECORD.size, length)
+            end += _RECORD.size + length
+            self._file.seek(end)
+        return end
+
+    def __len__(self) -> int:
+        return len(self._offsets) if self._file is not None else len(self._memory)
+
+    def __enter__(self) -> "ExplanationCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+    def _remember(self, key: bytes, entry: dict) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.capacity:
+            self._memory.popitem(last=False)
+
+    def get(self, key: bytes) -> Optional[Any]:
+        """The value stored for `key`, counting the lookup as a hit or a miss."""
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+        elif key in self._offsets:
+            offset, length = self._offsets[key]
+            end = self._file.tell()
+            self._file.seek(offset)
+            entry = json.loads(self._file.read(length))
+            self._file.seek(end)
+            self._remember(key, entry)
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            return None
+        self.saved_seconds += entry["seconds"]
+        return entry["value"]
+
+    def put(self, key: bytes, value: Any, seconds: float) -> None:
+        """Store `value`, which must be JSON-serializable and took `seconds` to produce."""
+        entry = {"value": value, "seconds": seconds}
+        self._remember(key, entry)
+        if self._file is not None:
+            payload = json.dumps(entry).encode()
+            offset = self._file.tell()
+            self._file.write(_RECORD.pack(key, len(payload)) + payload)
+            self._file.flush()
+            self._offsets[key] = (offset + _RECORD.size, len(payload))
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self),
+            "in_memory": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "saved_seconds": round(self.saved_seconds, 3),
+        }
+
+
+def _digest(*parts) -> bytes:
+    return hashlib.blake2b(json.dumps(parts).encode(), digest_size=16).digest()
+
+def analysis_key(orientation: Orientation, think_time: float) -> bytes:
+    return _digest("analysis", orientation.key, think_time)
+
+def explanation_key(orientation: Orientation, move: Move, question: str = "", generator: str = "") -> bytes:
+    """Key of the explanation of `move` in the position `orientation` was taken from. The
+    move and any squares or pieces the question names are keyed in the canonical frame."""
+    question = to_template(" ".join(question.lower().split()), orientation)
+    return _digest("explanation", PROMPT_VERSION, generator, orientation.key, orientation.move(move), question)
+
+
+# Text is cached with the squares ("row,col") and piece descriptions ("tall dark
+# pieces") it mentions replaced by markers in the canonical frame, then rendered back
+# in the orientation of whoever asks
+_WORD_ATTRIBUTES = {
+    name: (3 - index, value) for index, names in enumerate(ATTRIBUTE_NAMES) for value, name in enumerate(names)
+}
+_SQUARE = re.compile(r"\b([0-3]),([0-3])\b")
+_PHRASE = re.compile(r"\b((?:(?:%s)\s+)+)(?=pieces?\b)" % "|".join(_WORD_ATTRIBUTES), re.IGNORECASE)
+_SQUARE_MARK = re.compile(r"⟦s(\d+)⟧")
+_PHRASE_MARK = re.compile(r"⟦([pP])([0-9=,]+)⟧")
+
+
+def to_template(text: str, orientation: Orientation) -> str:
+    def square(match: re.Match) -> str:
+        return f"⟦s{orientation.square(square_index(int(match[1]), int(match[2])))}⟧"
+
+    def phrase(match: re.Match) -> str:
+        pairs = []
+        for word in match[1].split():
+            bit, value = _WORD_ATTRIBUTES[word.lower()]
+            target = orientation.order[bit]
+            pairs.append(f"{target}={value ^ (orientation.flip >> target & 1)}")
+        return f"⟦{'P' if match[1][0].isupper() else 'p'}{','.join(pairs)}⟧ "
+
+    return _PHRASE.sub(phrase, _SQUARE.sub(square, text))
+
+def from_template(template: str, orientation: Orientation) -> str:
+    def square(match: re.Match) -> str:
+        return describe_square(orientation.square_back(int(match[1])))
+
+    def phrase(match: re.Match) -> str:
+        attributes = []
+        for pair in match[2].split(","):
+            target, value = map(int, pair.split("="))
+            attributes.append((orientation.order.index(target), value ^ (orientation.flip >> target & 1)))
+        # Highest bit first, the order describe_piece uses
+        text = " ".join(ATTRIBUTE_NAMES[3 - bit][value] for bit, value in sorted(attributes, reverse=True))
+        return text.capitalize() if match[1] == "P" else text
+
+    return _PHRASE_MARK.sub(phrase, _SQUARE_MARK.sub(square, template))
@@ -0,0 +1,66 @@
+import asyncio
+import re
+from typing import AsyncIterator, Protocol
+
+# How the stub paces its output by default, roughly a small model on local hardware
+STUB_FIRST_TOKEN_DELAY = 0.2
+STUB_TOKEN_DELAY = 0.02
+
+_TOKEN = re.compile(r"\S+\s*")
+
+
+class Generator(Protocol):
+    """A language model that streams its answer to a prompt as text pieces."""
+
+    name: str
+
+    def stream(self, prompt: str) -> AsyncIterator[str]:
+        ...
+
+
+async def generate(generator: Generator, prompt: str) -> str:
+    return "".join([piece async for piece in generator.stream(prompt)])
+
+
+def _field(prompt: str, label: str) -> str:
+    for line in prompt.splitlines():
+        if line.startswith(f"{label}: "):
+            return line[len(label) + 2:]
+    return ""
+
+
+class StubGenerator:
+    """A deterministic local stand-in for the explanation model.
+
+    It answers from the facts the prompt states (the recommended move, the engine's
+    assessment and the first strategy note) and streams word by word after a fixed
+    first-token delay, so the pipeline around it can be run and timed offline with
+    repeatable output.
+    """
+
+    name = "stub"
+
+    def __init__(self, first_token_delay: float = STUB_FIRST_TOKEN_DELAY, token_delay: float = STUB_TOKEN_DELAY):
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.calls = 0
+
+    def answer(self, prompt: str) -> str:
+        sentences = [f"The engine recommends to {_field(prompt, 'Recommended move') or 'play on'}."]
+        assessment = _field(prompt, "Engine assessment")
+        if assessment:
+            sentences.append(f"It judges the position {assessment}.")
+        notes = [line[2:] for line in prompt.splitlines() if line.startswith("- ")]
+        if notes:
+            title, _, text = notes[0].partition(": ")
+            first = re.split(r"(?<=[.!?])\s", text, maxsplit=1)[0].rstrip(".!?")
+            sentences.append(f"As the notes on {title.lower()} put it: {first}.")
+        return " ".join(sentences)
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        self.calls += 1
+        await asyncio.sleep(self.first_token_delay)
+        for i, token in enumerate(_TOKEN.findall(self.answer(prompt))):
+            if i:
+                await asyncio.sleep(self.token_delay)
+            yield token
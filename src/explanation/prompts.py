@@ -0,0 +1,69 @@
+from typing import Sequence
+
+from src.engine.bitboard import EMPTY, BitState, square_coords
+from src.knowledge.store import Chunk
+from src.strategy.evaluation import WIN_THRESHOLD
+from src.strategy.minimax import Move
+
+# Bump whenever a change to the prompt changes what a model would be asked
+PROMPT_VERSION = 1
+
+# Names of each attribute's unset and set value, from the piece id's highest bit down
+ATTRIBUTE_NAMES = (("short", "tall"), ("dark", "light"), ("round", "square"), ("solid", "hollow"))
+
+
+def describe_piece(piece: int) -> str:
+    return " ".join(names[piece >> (3 - bit) & 1] for bit, names in enumerate(ATTRIBUTE_NAMES))
+
+def describe_square(square: int) -> str:
+    return "{},{}".format(*square_coords(square))
+
+def describe_move(move: Move) -> str:
+    square, give = move
+    parts = []
+    if square != EMPTY:
+        parts.append(f"place the held piece on {describe_square(square)}")
+    if give != EMPTY:
+        parts.append(f"give the {describe_piece(give)} piece")
+    return " and ".join(parts)
+
+def describe_score(score: int) -> str:
+    if score >= WIN_THRESHOLD:
+        return "a forced win"
+    if score <= -WIN_THRESHOLD:
+        return "lost against best play whatever is chosen"
+    if abs(score) < 50:
+        return "roughly balanced"
+    return "better for the player to move" if score > 0 else "worse for the player to move"
+
+
+def explanation_prompt(
+    state: BitState,
+    move: Move,
+    score: int,
+    knowledge: Sequence[Chunk] = (),
+    question: str = ""
+) -> str:
+    """The prompt asking a model to explain `move`, the engine's choice in `state`,
+    grounded in the retrieved `knowledge`."""
+    lines = [
+        "You are a Quarto coach. In 2-3 sentences, explain why the recommended move is good.",
+        "Use only the position and the strategy notes below; do not invent rules.",
+        "",
+        "Board (row,col: piece):",
+    ]
+    placed = [square for square in range(16) if state.cells[square] != EMPTY]
+    lines += [f"  {describe_square(square)}: {describe_piece(state.cells[square])}" for square in placed]
+    if not placed:
+        lines.append("  (empty)")
+    if state.selected != EMPTY:
+        lines.append(f"Piece to place: {describe_piece(state.selected)}")
+    lines.append(f"Pieces left to give: {state.remaining.bit_count()}")
+    lines.append(f"Recommended move: {describe_move(move)}")
+    lines.append(f"Engine assessment: {describe_score(score)}")
+    if knowledge:
+        lines.append("Strategy notes:")
+        lines += [f"- {chunk.title or chunk.source}: {' '.join(chunk.text.split())}" for chunk in knowledge]
+    if question:
+        lines.append(f"Question: {question}")
+    return "\n".join(lines)
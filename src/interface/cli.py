@@ -1,14 +1,22 @@
-from itertools import product
+import argparse
+from typing import Iterable, Iterator
 
-from src.engine.models import GameState, Piece, Board, GamePhase
+from src.engine.models import GameState, Piece, Board, GamePhase, PIECES, all_pieces, piece_id
+from src.engine.bitboard import BitState, square_coords, square_index
 from src.engine.game import (
     get_legal_placements,
     get_legal_piece_selections,
     make_move,
+    unmake_move,
     check_winner
 )
+from src.engine.records import GameRecord, read_records, record_game, replay, write_records
+from src.strategy.endgame import WIN, LOSS, Tablebase, load_tablebase
+from src.strategy.minimax import move_to_game, open_session_table, think
+from src.strategy.instrumentation import SearchStats
+from src.strategy.ponder import Ponderer
 
-def piece_to_code(p: Piece) -> str:
+def _build_piece_code(p: Piece) -> str:
     coded_piece = ""
     if p.height:
         coded_piece = f"{coded_piece}T"
@@ -32,6 +40,13 @@ def piece_to_code(p: Piece) -> str:
 
     return coded_piece
 
+# Codes for the catalog pieces, indexed by piece_id, and the reverse lookup
+_PIECE_CODES = tuple(_build_piece_code(p) for p in PIECES)
+_PIECES_BY_CODE = {code: piece for code, piece in zip(_PIECE_CODES, PIECES)}
+
+def piece_to_code(p: Piece) -> str:
+    return _PIECE_CODES[piece_id(p)]
+
 def show_board(state: GameState) -> None:
     grid = state.board.grid
 
@@ -46,28 +61,21 @@ def show_board(state: GameState) -> None:
                 row = f"{row} {piece_to_code(grid[i][j])}"
         print(row)
 
-# Letter → bool for each position: 0=height, 1=color, 2=shape, 3=top (matches piece_to_code order)
-_PIECE_LETTERS = (
-    {"T": True, "S": False},  # Tall / Short
-    {"L": True, "D": False},  # Light / Dark
-    {"S": True, "R": False},  # Square / Round
-    {"H": True, "S": False},  # Hollow / Solid
-)
-
 def _parse_piece_string(s: str) -> Piece | None:
-    """Parse a 4-letter code to a Piece, or None if invalid."""
-    if len(s) != 4:
-        return None
-    values = []
-    for i, mapping in enumerate(_PIECE_LETTERS):
-        if s[i] not in mapping:
-            return None
-        values.append(mapping[s[i]])
-    return Piece(height=values[0], color=values[1], shape=values[2], top=values[3])
+    """Parse a 4-letter code (T/S, L/D, S/R, H/S) to its catalog Piece, or None if invalid."""
+    return _PIECES_BY_CODE.get(s)
 
-def parse_piece(legal_pieces: list[Piece]) -> Piece:
+_UNDO_COMMANDS = ("U", "UNDO")
+
+def _is_undo(s: str) -> bool:
+    return s.strip().upper() in _UNDO_COMMANDS
+
+def parse_piece(legal_pieces: list[Piece]) -> Piece | None:
+    """Read a piece code from input; None means the player asked to undo."""
     while True:
         raw = input().strip().upper()
+        if _is_undo(raw):
+            return None
         piece = _parse_piece_string(raw)
         if piece is None:
             print("Please choose a valid piece.")
@@ -90,9 +98,12 @@ def _parse_placement_string(s: str) -> tuple[int, int] | None:
         return None
     return (row, col)
 
-def parse_placement(legal_placements: list[tuple[int, int]]) -> tuple[int, int]:
+def parse_placement(legal_placements: list[tuple[int, int]]) -> tuple[int, int] | None:
+    """Read a 'row,col' placement from input; None means the player asked to undo."""
     while True:
         raw = input().strip()
+        if _is_undo(raw):
+            return None
         placement = _parse_placement_string(raw)
         if placement is None:
             print("Please choose a valid placement in the format: row, col (0-3, 0-3)")
@@ -101,6 +112,47 @@ def parse_placement(legal_placements: list[tuple[int, int]]) -> tuple[int, int]:
             return placement
         print("That placement is not available.")
 
+def ply_to_text(ply: int, give: bool) -> str:
+    """A ply as the CLI writes it: the piece code for a give, 'row,col' for a placement."""
+    if give:
+        return _PIECE_CODES[ply]
+    return "{},{}".format(*square_coords(ply))
+
+def parse_ply(token: str, give: bool) -> int:
+    """Parse ply_to_text output back to a piece id or square; raises ValueError if malformed."""
+    if give:
+        piece = _parse_piece_string(token.upper())
+        if piece is None:
+            raise ValueError(f"{token!r} is not a piece code.")
+        return piece_id(piece)
+    placement = _parse_placement_string(token)
+    if placement is None:
+        raise ValueError(f"{token!r} is not a placement.")
+    return square_index(*placement)
+
+def game_to_text(record: GameRecord) -> str:
+    """A game record as the CLI writes moves: piece codes for gives, 'row,col' for placements."""
+    return " ".join(ply_to_text(ply, i % 2 == 0) for i, ply in enumerate(record.plies))
+
+def game_from_text(text: str) -> GameRecord:
+    """Parse game_to_text output; raises ValueError on a malformed or illegal move."""
+    plies = []
+    for i, token in enumerate(text.split()):
+        try:
+            plies.append(parse_ply(token, i % 2 == 0))
+        except ValueError as error:
+            raise ValueError(f"Move {i + 1}: {error}") from None
+    return record_game(replay(GameRecord(tuple(plies), 0)))
+
+def export_games(path: str) -> Iterator[str]:
+    """Text lines for the games in a record file."""
+    for record in read_records(path):
+        yield game_to_text(record)
+
+def import_games(lines: Iterable[str], path: str) -> int:
+    """Append games written as text, one per line, to a record file."""
+    return write_records(path, (game_from_text(line) for line in lines if line.strip()))
+
 def show_turn(state: GameState) -> None:
     if state.current_phase == GamePhase.SELECT_PIECE:
         remaining = "\nRemaining: "
@@ -110,13 +162,90 @@ def show_turn(state: GameState) -> None:
         print(f"\nPlayer {state.current_player}: choose a piece to give.")
     else:
         print(f"\nPlayer {state.current_player}: choose where to place [{piece_to_code(state.selected_piece)}].")
+    print("(type 'undo' to take back the last move)")
+
+def show_endgame(state: GameState, tablebase: Tablebase | None) -> None:
+    """Print the perfect-play result once the position is covered by the tablebase."""
+    if tablebase is None:
+        return
+    outcome = tablebase.probe(BitState.from_game_state(state))
+    if outcome is None:
+        return
+    if outcome == WIN:
+        print(f"Tablebase: Player {state.current_player} wins with perfect play.")
+    elif outcome == LOSS:
+        print(f"Tablebase: Player {1 - state.current_player} wins with perfect play.")
+    else:
+        print("Tablebase: draw with perfect play.")
+
+def take_back(state: GameState, ai_player: int | None = None) -> None:
+    """Undo the last ply, and any AI plies before it, so the human is to move again."""
+    if not state.history:
+        print("Nothing to undo.")
+        return
+    unmake_move(state)
+    while ai_player is not None and state.history and state.current_player == ai_player:
+        unmake_move(state)
+    print("Took back the last move.")
+
+def ai_turn(
+    state: GameState,
+    think_time: float,
+    show_stats: bool = False,
+    profile_path: str | None = None
+) -> tuple[tuple[int, int] | None, Piece | None]:
+    stats = SearchStats() if show_stats else None
+    result = think(state, think_time=think_time, stats=stats, profile_path=profile_path)
+    print(f"(searched {result.depth} turns deep, {result.nodes} nodes, score {result.score})")
+    if stats is not None:
+        print(stats.report())
+    return move_to_game(result.move)
+
+def stop_pondering(ponderer: Ponderer | None, show_stats: bool = False) -> None:
+    if ponderer is None:
+        return
+    result = ponderer.stop()
+    if show_stats and result is not None:
+        print(f"(pondered {result.depth} turns deep, {result.nodes} nodes)")
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Play Quarto in the terminal.")
+    parser.add_argument("--ai", type=int, choices=(0, 1), default=None,
+                        help="let the AI play this player (default: two humans)")
+    parser.add_argument("--think-time", type=float, default=2.0,
+                        help="seconds the AI may think per move")
+    parser.add_argument("--stats", action="store_true",
+                        help="print search statistics after each AI move")
+    parser.add_argument("--profile", metavar="PATH", default=None,
+                        help="dump a cProfile of the AI's most recent search to PATH")
+    parser.add_argument("--ponder", action="store_true",
+                        help="let the AI keep searching while you choose your move")
+    parser.add_argument("--tt-file", metavar="PATH", default=None,
+                        help="keep the AI's transposition table in this file across runs")
+    parser.add_argument("--save", metavar="PATH", default=None,
+                        help="append the finished game to this game record file")
+    parser.add_argument("--export-games", metavar="PATH", default=None,
+                        help="print the games in a record file as text and exit")
+    parser.add_argument("--import-games", metavar="PATH", default=None,
+                        help="append text games from PATH, one per line, to the --save file and exit")
+    args = parser.parse_args(argv)
+    if args.import_games and not args.save:
+        parser.error("--import-games needs --save to name the record file")
+    return args
 
 
 if __name__ == "__main__":
-    remaining_pieces = [
-        Piece(height=h, color=c, shape=s, top=t)
-        for h, c, s, t in product([True, False], repeat=4)
-    ]
+    args = parse_args()
+    if args.export_games:
+        for line in export_games(args.export_games):
+            print(line)
+        raise SystemExit
+    if args.import_games:
+        with open(args.import_games) as f:
+            print(f"Imported {import_games(f, args.save)} games into {args.save}.")
+        raise SystemExit
+
+    remaining_pieces = all_pieces()
     board = Board.empty()
     state = GameState(
         board=board,
@@ -125,18 +254,47 @@ if __name__ == "__main__":
         selected_piece=None,
         current_player=0
     )
+    tablebase = load_tablebase()
+    if args.tt_file:
+        open_session_table(args.tt_file)
+    # piece the AI decided to give when it searched its placement
+    planned_piece = None
+    ponderer = Ponderer() if args.ponder and args.ai is not None else None
 
     while True:
         show_board(state)
+        show_endgame(state, tablebase)
         show_turn(state)
+        ai_to_move = state.current_player == args.ai
+        if ponderer is not None and not ai_to_move:
+            ponderer.start(BitState.from_game_state(state))
 
         if state.current_phase == GamePhase.SELECT_PIECE:
-            legal_pieces = get_legal_piece_selections(state)
-            piece = parse_piece(legal_pieces)
+            if ai_to_move:
+                piece = planned_piece if planned_piece is not None else ai_turn(state, args.think_time, args.stats, args.profile)[1]
+                planned_piece = None
+                print(f"AI gives {piece_to_code(piece)}.")
+            else:
+                legal_pieces = get_legal_piece_selections(state)
+                piece = parse_piece(legal_pieces)
+                stop_pondering(ponderer, args.stats)
+                if piece is None:
+                    take_back(state, args.ai)
+                    planned_piece = None
+                    continue
             make_move(state=state, piece_to_give=piece)
         else:
-            legal_placements = get_legal_placements(state)
-            placement = parse_placement(legal_placements)
+            if ai_to_move:
+                placement, planned_piece = ai_turn(state, args.think_time, args.stats, args.profile)
+                print(f"AI places at {placement[0]},{placement[1]}.")
+            else:
+                legal_placements = get_legal_placements(state)
+                placement = parse_placement(legal_placements)
+                stop_pondering(ponderer, args.stats)
+                if placement is None:
+                    take_back(state, args.ai)
+                    planned_piece = None
+                    continue
             make_move(state=state, placement=placement)
 
             winner = check_winner(state)
@@ -150,4 +308,8 @@ if __name__ == "__main__":
                 print("\n")
                 show_board(state)
                 print(f"\nPlayer {winner} has won!\n")
-                break
\ No newline at end of file
+                break
+
+    if args.save:
+        write_records(args.save, [record_game(BitState.from_game_state(state))])
+        print(f"Saved the game to {args.save}.")
\ No newline at end of file
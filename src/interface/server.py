@@ -0,0 +1,441 @@
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Callable, Optional
+
+from src.engine.bitboard import EMPTY, BitState, make_move
+from src.engine.models import GamePhase
+from src.engine.records import DRAW, UNFINISHED, record_game
+from src.interface.cli import parse_ply, ply_to_text
+from src.strategy.endgame import load_tablebase
+from src.strategy.minimax import MAX_DEPTH, Move, SearchResult, Searcher, book_result
+from src.strategy.transposition import TranspositionTable
+
+# Protocol: one JSON object per line each way. A request names a command in "cmd" and
+# may carry an "id", which its response echoes along with "ok" (and "error" when false).
+# Moves are written as in the CLI: a piece code for a give, "row,col" for a placement.
+#
+#   new       [game]                      start a game; the id is made up if not given
+#   position  game, moves                 reset the game to the start, then play moves
+#   move      game, moves                 play moves from the current position
+#   go        game, [depth, time, nodes]  search the position; answered when it ends
+#   stop      game                        end the game's search early
+#   stats     [game]                      server counters, and the game's position
+#   close     game                        stop the game's search and forget it
+#   quit                                  stop every search and end the session
+#
+# A go without any limit runs until stopped.
+DEFAULT_MAX_SEARCHES = 64
+
+
+# Per-process state, set up once by _init_worker
+_searcher: Optional[Searcher] = None
+_stop_flags = None
+
+
+class _StopFlag:
+    """One slot of the shared stop array, seen as the Event Searcher.stop_event expects."""
+
+    def __init__(self, slot: int):
+        self.slot = slot
+
+    def is_set(self) -> bool:
+        return bool(_stop_flags[self.slot])
+
+
+def _init_worker(stop_flags) -> None:
+    global _searcher, _stop_flags
+    _stop_flags = stop_flags
+    _searcher = Searcher(table=TranspositionTable(1 << 20), tablebase=load_tablebase())
+
+def _go(
+    packed: bytes,
+    slot: int,
+    depth: Optional[int],
+    time_limit: Optional[float],
+    node_limit: Optional[int]
+) -> SearchResult:
+    state = BitState.from_bytes(packed)
+    booked = book_result(state)
+    if booked is not None:
+        return booked
+    return _searcher.iterative_search(
+        state,
+        max_depth=MAX_DEPTH if depth is None else depth,
+        time_limit=time_limit,
+        node_limit=node_limit,
+        stop_event=_StopFlag(slot)
+    )
+
+
+def move_to_text(move: Move) -> str:
+    """A whole turn as "row,col CODE", leaving out a half that does not happen."""
+    square, give = move
+    parts = []
+    if square != EMPTY:
+        parts.append(ply_to_text(square, give=False))
+    if give != EMPTY:
+        parts.append(ply_to_text(give, give=True))
+    return " ".join(parts)
+
+
+class Game:
+    def __init__(self):
+        self.state = BitState.initial()
+        self.result = UNFINISHED
+        self.search: Optional[asyncio.Task] = None
+        self.slot: Optional[int] = None
+        # Whether the running search has no limit, so only a stop ends it
+        self.unbounded = False
+
+    def play(self, text: str) -> None:
+        """Play the moves in `text`; on a bad move none of them are played."""
+        state = self.state.copy()
+        result = self.result
+        for token in text.split():
+            if result != UNFINISHED:
+                raise ValueError("The game is over.")
+            give = state.phase == GamePhase.SELECT_PIECE
+            ply = parse_ply(token, give)
+            if give:
+                make_move(state, piece_to_give=ply)
+            else:
+                make_move(state, placement=ply)
+                result = record_game(state).result
+        self.state = state
+        self.result = result
+
+    def view(self) -> dict:
+        state = self.state
+        moves = " ".join(
+            ply_to_text(piece if square == EMPTY else square, square == EMPTY) for square, piece in state.history
+        )
+        return {
+            "moves": moves,
+            "phase": "give" if state.phase == GamePhase.SELECT_PIECE else "place",
+            "player": state.player,
+            "held": None if state.selected == EMPTY else ply_to_text(state.selected, give=True),
+            "over": self.result != UNFINISHED,
+            "winner": self.result if self.result not in (DRAW, UNFINISHED) else None
+        }
+
+
+class EngineServer:
+    """Searches for any number of sessions on one process pool.
+
+    Each search gets a slot in a shared byte array that its worker polls, which is how
+    a stop reaches a search running in another process.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_searches: int = DEFAULT_MAX_SEARCHES):
+        self._stop_flags = multiprocessing.RawArray("b", max_searches)
+        self._free_slots = list(range(max_searches))
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self._stop_flags,)
+        )
+        self.started = time.monotonic()
+        self.sessions = 0
+        self.searches = 0
+        self.nodes = 0
+        self.search_seconds = 0.0
+
+    def __enter__(self) -> "EngineServer":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for slot in range(len(self._stop_flags)):
+            self._stop_flags[slot] = 1
+        self._pool.shutdown(cancel_futures=True)
+
+    @property
+    def running(self) -> int:
+        return len(self._stop_flags) - len(self._free_slots)
+
+    def stats(self) -> dict:
+        return {
+            "sessions": self.sessions,
+            "running": self.running,
+            "searches": self.searches,
+            "nodes": self.nodes,
+            "nodes_per_second": round(self.nodes / self.search_seconds) if self.search_seconds else 0,
+            "uptime": round(time.monotonic() - self.started, 3)
+        }
+
+    def take_slot(self) -> int:
+        if not self._free_slots:
+            raise ValueError(f"Too many searches running (at most {len(self._stop_flags)}).")
+        slot = self._free_slots.pop()
+        self._stop_flags[slot] = 0
+        return slot
+
+    def stop(self, slot: int) -> None:
+        self._stop_flags[slot] = 1
+
+    async def search(
+        self,
+        state: BitState,
+        slot: int,
+        depth: Optional[int],
+        time_limit: Optional[float],
+        node_limit: Optional[int]
+    ) -> tuple[SearchResult, float]:
+        """(result, seconds) of a search run on the pool; frees `slot` when it ends."""
+        start = time.monotonic()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self._pool, _go, state.to_bytes(), slot, depth, time_limit, node_limit
+            )
+        finally:
+            self._free_slots.append(slot)
+        seconds = time.monotonic() - start
+        self.searches += 1
+        self.nodes += result.nodes
+        self.search_seconds += seconds
+        return result, seconds
+
+    async def serve(self, lines: AsyncIterator[bytes], send: Callable[[dict], None]) -> None:
+        """Run one session: answer requests read from `lines` through `send`."""
+        self.sessions += 1
+        await Session(self, send).run(lines)
+
+    async def serve_stdio(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        async def lines() -> AsyncIterator[bytes]:
+            # A thread does the blocking read, so stdin may be a terminal, pipe or file
+            while line := await loop.run_in_executor(None, sys.stdin.buffer.readline):
+                yield line
+
+        def send(message: dict) -> None:
+            sys.stdout.write(json.dumps(message) + "\n")
+            sys.stdout.flush()
+
+        await self.serve(lines(), send)
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        def send(message: dict) -> None:
+            if not writer.is_closing():
+                writer.write(json.dumps(message).encode() + b"\n")
+
+        try:
+            await self.serve(reader, send)
+        finally:
+            writer.close()
+
+    async def serve_socket(self, port: Optional[int] = None, path: Optional[str] = None) -> None:
+        """Accept sessions on a localhost TCP port or a Unix socket until cancelled."""
+        if path is not None:
+            server = await asyncio.start_unix_server(self._serve_connection, path)
+        else:
+            server = await asyncio.start_server(self._serve_connection, "127.0.0.1", port)
+        async with server:
+            await server.serve_forever()
+
+
+def _moves(request: dict) -> str:
+    moves = request.get("moves", "")
+    if not isinstance(moves, str):
+        raise ValueError("'moves' must be a string of moves separated by spaces.")
+    return moves
+
+
+class Session:
+    """The games of one client. Requests are handled in order as they arrive; a go is
+    answered whenever its search ends, so other requests keep being served meanwhile."""
+
+    def __init__(self, server: EngineServer, send: Callable[[dict], None]):
+        self.server = server
+        self.send = send
+        self.games: dict[str, Game] = {}
+        self._ids = itertools.count(1)
+        self._commands = {
+            "new": self._new,
+            "position": self._position,
+            "move": self._move,
+            "go": self._go,
+            "stop": self._stop,
+            "stats": self._stats,
+            "close": self._close,
+        }
+
+    async def run(self, lines: AsyncIterator[bytes]) -> None:
+        try:
+            async for line in lines:
+                if not line.strip():
+                    continue
+                if not self.handle(line):
+                    break
+        finally:
+            # Searches nobody can stop any more are cut short; the rest run to their limit
+            searches = []
+            for game in self.games.values():
+                if game.search is not None:
+                    if game.unbounded:
+                        self.server.stop(game.slot)
+                    searches.append(game.search)
+            await asyncio.gather(*searches, return_exceptions=True)
+
+    def handle(self, line: bytes) -> bool:
+        """Answer one request line; False once the client has asked to quit."""
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("A request must be a JSON object.")
+            request_id = request.get("id")
+            command = request.get("cmd")
+            if command == "quit":
+                for game in self.games.values():
+                    if game.search is not None:
+                        self.server.stop(game.slot)
+                self._reply(request_id, {})
+                return False
+            if command not in self._commands:
+                raise ValueError(f"Unknown command {command!r}.")
+            reply = self._commands[command](request, request_id)
+        except (ValueError, TypeError, OverflowError) as error:
+            # json.JSONDecodeError is a ValueError too; the others come from fields of the
+            # wrong type that slipped past the checks
+            self.send({"id": request_id, "ok": False, "error": str(error)})
+            return True
+        if reply is not None:
+            self._reply(request_id, reply)
+        return True
+
+    def _reply(self, request_id, reply: dict) -> None:
+        self.send({"id": request_id, "ok": True, **reply})
+
+    def _game(self, request: dict, idle: bool = False) -> tuple[str, Game]:
+        name = request.get("game")
+        if not isinstance(name, str) or name not in self.games:
+            raise ValueError(f"No game {name!r}.")
+        game = self.games[name]
+        if idle and game.search is not None:
+            raise ValueError(f"Game {name!r} is searching; stop it first.")
+        return name, game
+
+    def _new(self, request: dict, request_id) -> dict:
+        name = request.get("game")
+        if name is None:
+            while (name := f"g{next(self._ids)}") in self.games:
+                pass
+        elif not isinstance(name, str):
+            raise ValueError("'game' must be a string.")
+        if name in self.games:
+            raise ValueError(f"Game {name!r} already exists.")
+        self.games[name] = game = Game()
+        return {"game": name, **game.view()}
+
+    def _position(self, request: dict, request_id) -> dict:
+        name, game = self._game(request, idle=True)
+        fresh = Game()
+        fresh.play(_moves(request))
+        self.games[name] = fresh
+        return {"game": name, **fresh.view()}
+
+    def _move(self, request: dict, request_id) -> dict:
+        name, game = self._game(request, idle=True)
+        game.play(_moves(request))
+        return {"game": name, **game.view()}
+
+    def _go(self, request: dict, request_id) -> None:
+        name, game = self._game(request, idle=True)
+        if game.result != UNFINISHED:
+            raise ValueError("The game is over.")
+        limits = []
+        for field, kind in (("depth", int), ("time", float), ("nodes", int)):
+            value = request.get(field)
+            if value is not None:
+                if not isinstance(value, (int, float)) or isinstance(value, bool) or not 0 < value < math.inf:
+                    raise ValueError(f"{field!r} must be a positive number.")
+                if kind is int and value != int(value):
+                    raise ValueError(f"{field!r} must be a whole number.")
+                value = kind(value)
+            limits.append(value)
+        game.slot = self.server.take_slot()
+        game.unbounded = not any(limits)
+        game.search = asyncio.create_task(self._run_search(name, game, request_id, *limits))
+        return None
+
+    async def _run_search(
+        self,
+        name: str,
+        game: Game,
+        request_id,
+        depth: Optional[int],
+        time_limit: Optional[float],
+        node_limit: Optional[int]
+    ) -> None:
+        try:
+            result, seconds = await self.server.search(game.state, game.slot, depth, time_limit, node_limit)
+        except Exception as error:
+            self.send({"id": request_id, "ok": False, "game": name, "error": f"Search failed: {error}"})
+            return
+        finally:
+            game.search = None
+            game.slot = None
+        self._reply(request_id, {
+            "game": name,
+            "move": move_to_text(result.move),
+            "score": result.score,
+            "depth": result.depth,
+            "nodes": result.nodes,
+            "seconds": round(seconds, 3),
+            "pv": [move_to_text(move) for move in result.pv]
+        })
+
+    def _stop(self, request: dict, request_id) -> dict:
+        name, game = self._game(request)
+        searching = game.search is not None
+        if searching:
+            self.server.stop(game.slot)
+        return {"game": name, "stopping": searching}
+
+    def _stats(self, request: dict, request_id) -> dict:
+        reply = {"games": len(self.games), **self.server.stats()}
+        if request.get("game") is not None:
+            name, game = self._game(request)
+            reply.update(game=name, searching=game.search is not None, **game.view())
+        return reply
+
+    def _close(self, request: dict, request_id) -> dict:
+        name, game = self._game(request)
+        if game.search is not None:
+            self.server.stop(game.slot)
+        del self.games[name]
+        return {"game": name}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the engine over newline-delimited JSON.")
+    where = parser.add_mutually_exclusive_group()
+    where.add_argument("--port", type=int, default=None, help="listen on this localhost TCP port")
+    where.add_argument("--socket", metavar="PATH", default=None, help="listen on this Unix socket")
+    parser.add_argument("--workers", type=int, default=None, help="search processes (default: one per CPU)")
+    parser.add_argument("--max-searches", type=int, default=DEFAULT_MAX_SEARCHES,
+                        help="searches that may be running or queued at once")
+    args = parser.parse_args()
+
+    with EngineServer(args.workers, args.max_searches) as server:
+        if args.port is None and args.socket is None:
+            asyncio.run(server.serve_stdio())
+        else:
+            try:
+                asyncio.run(server.serve_socket(args.port, args.socket))
+            except KeyboardInterrupt:
+                pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import re
+import zlib
+from typing import Optional, Protocol
+
+import numpy as np
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+class Embedder(Protocol):
+    """Anything that turns texts into fixed-size rows; an index records `name` and `dim`
+    so it is never queried with vectors from a different model."""
+
+    name: str
+    dim: int
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """A (len(texts), dim) float32 array of unit-length rows."""
+        ...
+
+
+class HashingEmbedder:
+    """Dependency-free embedder: words and word pairs hashed into `dim` signed buckets.
+
+    It captures shared vocabulary and short phrases rather than meaning, but needs no
+    model download, is deterministic across processes and runs anywhere the index does.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        rows = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in zip(rows, texts):
+            words = _WORD.findall(text.lower())
+            for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                # crc32 rather than hash(), which is salted per process for strings
+                bucket = zlib.crc32(feature.encode())
+                row[bucket % self.dim] += 1.0 if bucket >> 31 else -1.0
+        norms = np.linalg.norm(rows, axis=1, keepdims=True)
+        return rows / np.where(norms == 0, 1, norms)
+
+
+def embedder_for(name: Optional[str]) -> Optional[Embedder]:
+    """The built-in embedder an index records by `name`, or None if it is not one."""
+    if name and name.startswith("hashing-") and name[8:].isdigit():
+        return HashingEmbedder(int(name[8:]))
+    return None
@@ -0,0 +1,133 @@
+import argparse
+import os
+import re
+from pathlib import Path
+from typing import Iterator, Optional
+
+from src.knowledge.embeddings import HashingEmbedder
+from src.knowledge.store import Chunk, KnowledgeIndex
+
+DEFAULT_INDEX_PATH = Path(__file__).resolve().parents[2] / "data" / "knowledge"
+DEFAULT_SOURCE_PATH = Path(__file__).resolve().parents[2] / "knowledge_base" / "processed"
+
+# Paragraphs under one heading are packed into chunks of at most about this many words
+MAX_CHUNK_WORDS = 120
+
+_HEADING = re.compile(r"^#{1,6}\s+(.*?)\s*#*\s*$")
+
+
+def chunk_text(text: str, source: str = "", max_words: int = MAX_CHUNK_WORDS) -> Iterator[Chunk]:
+    """Split markdown into chunks that each stay under one heading, breaking between
+    paragraphs once a chunk reaches `max_words`. A chunk's title is its heading."""
+    title = ""
+    paragraphs: list[str] = []
+
+    def flush() -> Iterator[Chunk]:
+        words = 0
+        packed: list[str] = []
+        for paragraph in paragraphs:
+            length = len(paragraph.split())
+            if packed and words + length > max_words:
+                yield Chunk("\n\n".join(packed), source, title)
+                packed, words = [], 0
+            packed.append(paragraph)
+            words += length
+        if packed:
+            yield Chunk("\n\n".join(packed), source, title)
+        paragraphs.clear()
+
+    lines: list[str] = []
+    for line in text.splitlines() + [""]:
+        heading = _HEADING.match(line)
+        if heading or not line.strip():
+            if lines:
+                paragraphs.append(" ".join(lines))
+                lines = []
+            if heading:
+                yield from flush()
+                title = heading.group(1)
+        else:
+            lines.append(line.strip())
+    yield from flush()
+
+
+def source_chunks(source_dir: str | os.PathLike) -> Iterator[Chunk]:
+    """Chunks of every .md and .txt file under `source_dir`, in path order."""
+    source_dir = Path(source_dir)
+    for path in sorted(source_dir.rglob("*")):
+        if path.suffix in (".md", ".txt") and path.is_file():
+            yield from chunk_text(path.read_text(encoding="utf-8"), str(path.relative_to(source_dir)))
+
+
+_default_index: Optional[KnowledgeIndex] = None
+
+def load_index(path: Optional[str | os.PathLike] = None) -> Optional[KnowledgeIndex]:
+    """The index at `path` (default: $QUARTO_KNOWLEDGE or data/knowledge), or None if missing.
+
+    The default index is opened on first use and shared.
+    """
+    global _default_index
+    if path is None:
+        if _default_index is not None:
+            return _default_index
+        path = Path(os.environ.get("QUARTO_KNOWLEDGE", DEFAULT_INDEX_PATH))
+        if not (path / "index.json").exists():
+            return None
+        _default_index = KnowledgeIndex(path)
+        return _default_index
+    path = Path(path)
+    if not (path / "index.json").exists():
+        return None
+    return KnowledgeIndex(path)
+
+
+def retrieve_strategy(query: str, k: int = 5, index: Optional[KnowledgeIndex] = None) -> list[Chunk]:
+    """The `k` strategy chunks most relevant to `query`, best first; none without an index."""
+    if index is None:
+        index = load_index()
+        if index is None:
+            return []
+    return [hit.chunk for hit in index.search(query, k)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build and query the local strategy knowledge index.")
+    parser.add_argument("--index", default=str(DEFAULT_INDEX_PATH), help="index directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="chunk and index text files as a new segment")
+    add.add_argument("sources", nargs="*", default=[str(DEFAULT_SOURCE_PATH)], help="files or directories")
+    add.add_argument("--embed", type=int, metavar="DIM", help="store hashed embeddings of DIM buckets (new index only)")
+    commands.add_parser("rebuild", help="merge every segment into one")
+    query = commands.add_parser("query", help="print the best chunks for a query")
+    query.add_argument("text")
+    query.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == "add":
+        embedder = HashingEmbedder(args.embed) if args.embed else None
+        with KnowledgeIndex(args.index, embedder) as index:
+            chunks = []
+            for source in map(Path, args.sources):
+                if source.is_dir():
+                    chunks.extend(source_chunks(source))
+                else:
+                    chunks.extend(chunk_text(source.read_text(encoding="utf-8"), source.name))
+            added = index.add(chunks)
+            print(f"Added {added} chunks; {args.index} holds {len(index)}")
+    elif args.command == "rebuild":
+        with KnowledgeIndex(args.index) as index:
+            index.rebuild()
+            print(f"Merged {args.index} into one segment of {len(index)} chunks")
+    else:
+        index = load_index(args.index)
+        if index is None:
+            parser.error(f"No knowledge index at {args.index}")
+        with index:
+            for hit in index.search(args.text, args.k):
+                heading = f" — {hit.chunk.title}" if hit.chunk.title else ""
+                print(f"[{hit.score:.3f}] {hit.chunk.source}{heading}")
+                print(f"    {hit.chunk.text[:200]}")
+
+
+if __name__ == "__main__":
+    main()
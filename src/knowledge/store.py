@@ -0,0 +1,283 @@
+import bisect
+import json
+import mmap
+import os
+import re
+import shutil
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, NamedTuple, Optional
+
+import numpy as np
+
+from src.knowledge.embeddings import Embedder, embedder_for
+
+INDEX_VERSION = 1
+
+# BM25 term-frequency saturation and document-length normalization
+K1 = 1.2
+B = 0.75
+
+# Share of a hybrid score that comes from embedding similarity, the rest being BM25
+# normalized by the best BM25 score of the query
+DEFAULT_VECTOR_WEIGHT = 0.3
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do for from has have how i if in into is it its "
+    "not of on or so than that the their them then there these they this to was what "
+    "when which while who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class Chunk(NamedTuple):
+    text: str
+    source: str = ""
+    title: str = ""
+
+
+class SearchHit(NamedTuple):
+    id: int
+    score: float
+    chunk: Chunk
+
+
+def _indexed_text(chunk: Chunk) -> str:
+    return f"{chunk.title}\n{chunk.text}" if chunk.title else chunk.text
+
+def _load_array(path: Path) -> np.ndarray:
+    try:
+        return np.load(path, mmap_mode="r")
+    except ValueError:
+        # Zero-length arrays cannot be mapped
+        return np.load(path)
+
+
+class _Segment:
+    """One immutable batch of chunks with its own vocabulary, postings, lengths, texts and
+    optional embeddings. Everything but the vocabulary stays on disk, mapped."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.vocab: dict[str, int] = json.loads((path / "vocab.json").read_text())
+        self.term_offsets = _load_array(path / "term_offsets.npy")
+        self.postings = _load_array(path / "postings.npy")
+        self.frequencies = _load_array(path / "frequencies.npy")
+        self.lengths = _load_array(path / "lengths.npy")
+        self.chunk_offsets = _load_array(path / "chunk_offsets.npy")
+        with open(path / "chunks.bin", "rb") as f:
+            self._texts = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        embeddings = path / "embeddings.npy"
+        self.embeddings = _load_array(embeddings) if embeddings.exists() else None
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def close(self) -> None:
+        self._texts.close()
+
+    def postings_for(self, term: str) -> Optional[tuple[np.ndarray, np.ndarray]]:
+        """(chunk ids, term frequencies) of the chunks containing `term`."""
+        term_id = self.vocab.get(term)
+        if term_id is None:
+            return None
+        start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+        return self.postings[start:end], self.frequencies[start:end]
+
+    def chunk(self, index: int) -> Chunk:
+        start, end = self.chunk_offsets[index], self.chunk_offsets[index + 1]
+        return Chunk(*json.loads(self._texts[start:end]))
+
+    @staticmethod
+    def write(path: Path, chunks: list[Chunk], embeddings: Optional[np.ndarray]) -> None:
+        counts = [Counter(tokenize(_indexed_text(chunk))) for chunk in chunks]
+        vocab = {term: term_id for term_id, term in enumerate(sorted(set().union(*counts)))}
+        postings: list[list[tuple[int, int]]] = [[] for _ in vocab]
+        for index, terms in enumerate(counts):
+            for term, frequency in terms.items():
+                postings[vocab[term]].append((index, frequency))
+        records = [json.dumps(list(chunk)).encode() for chunk in chunks]
+
+        path.mkdir(parents=True)
+        (path / "vocab.json").write_text(json.dumps(vocab))
+        np.save(path / "term_offsets.npy", np.cumsum([0] + [len(p) for p in postings], dtype=np.int64))
+        np.save(path / "postings.npy", np.array([i for p in postings for i, _ in p], dtype=np.int32))
+        np.save(path / "frequencies.npy", np.array([f for p in postings for _, f in p], dtype=np.float32))
+        np.save(path / "lengths.npy", np.array([sum(terms.values()) for terms in counts], dtype=np.float32))
+        np.save(path / "chunk_offsets.npy", np.cumsum([0] + [len(r) for r in records], dtype=np.int64))
+        (path / "chunks.bin").write_bytes(b"".join(records))
+        if embeddings is not None:
+            np.save(path / "embeddings.npy", embeddings.astype(np.float32))
+
+
+class KnowledgeIndex:
+    """Strategy text chunks searchable by BM25 and, optionally, embedding similarity.
+
+    The index is a directory of immutable segments listed in index.json. add() writes a
+    new segment and leaves the others alone; rebuild() merges them all into one. Opening
+    reads only the manifest and vocabularies: postings, texts and embeddings are mapped,
+    so a query reads just the pages it touches.
+
+    An index made with an embedder stores a vector per chunk and must be added to with
+    the same one. Built-in embedders are picked up from the manifest; without the one it
+    was made with, an index can still be searched by BM25 alone.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike,
+        embedder: Optional[Embedder] = None,
+        vector_weight: float = DEFAULT_VECTOR_WEIGHT
+    ):
+        self.path = Path(path)
+        self.embedder = embedder
+        self.vector_weight = vector_weight
+        manifest = self.path / "index.json"
+        if manifest.exists():
+            self._manifest = json.loads(manifest.read_text())
+            if self._manifest.get("version") != INDEX_VERSION:
+                raise ValueError(f"{self.path} is not a version {INDEX_VERSION} knowledge index.")
+        else:
+            self.path.mkdir(parents=True, exist_ok=True)
+            self._manifest = {
+                "version": INDEX_VERSION,
+                "embedder": None if embedder is None else embedder.name,
+                "next_segment": 1,
+                "segments": [],
+            }
+            self._write_manifest()
+        if embedder is None:
+            self.embedder = embedder_for(self._manifest["embedder"])
+        elif embedder.name != self._manifest["embedder"]:
+            raise ValueError(
+                f"{self.path} was built with embedder {self._manifest['embedder']!r}, not {embedder.name!r}."
+            )
+        self._segments = [_Segment(self.path / name) for name in self._manifest["segments"]]
+        self._update_totals()
+
+    def __len__(self) -> int:
+        return self._bases[-1]
+
+    @property
+    def embedder_name(self) -> Optional[str]:
+        return self._manifest["embedder"]
+
+    def __enter__(self) -> "KnowledgeIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for segment in self._segments:
+            segment.close()
+
+    def _update_totals(self) -> None:
+        self._bases = [0]
+        total_length = 0.0
+        for segment in self._segments:
+            self._bases.append(self._bases[-1] + len(segment))
+            total_length += float(np.sum(segment.lengths))
+        self._average_length = total_length / len(self) if len(self) else 0.0
+
+    def _write_manifest(self) -> None:
+        # Replaced in one step, so a reader sees the old segment list or the new one
+        temporary = self.path / "index.json.tmp"
+        temporary.write_text(json.dumps(self._manifest, indent=2) + "\n")
+        os.replace(temporary, self.path / "index.json")
+
+    def _new_segment(self, chunks: list[Chunk], embeddings: Optional[np.ndarray]) -> str:
+        name = f"segment-{self._manifest['next_segment']:06d}"
+        self._manifest["next_segment"] += 1
+        _Segment.write(self.path / name, chunks, embeddings)
+        return name
+
+    def add(self, chunks: Iterable[Chunk]) -> int:
+        """Index `chunks` as a new segment; returns how many were added."""
+        chunks = [Chunk(*chunk) for chunk in chunks]
+        if not chunks:
+            return 0
+        embeddings = None
+        if self._manifest["embedder"] is not None:
+            if self.embedder is None:
+                raise ValueError(f"{self.path} stores embeddings; open it with its embedder to add chunks.")
+            embeddings = self.embedder.embed([_indexed_text(chunk) for chunk in chunks])
+        name = self._new_segment(chunks, embeddings)
+        self._manifest["segments"].append(name)
+        self._write_manifest()
+        self._segments.append(_Segment(self.path / name))
+        self._update_totals()
+        return len(chunks)
+
+    def rebuild(self) -> None:
+        """Merge every segment into one, which keeps queries fast after many small adds."""
+        if len(self._segments) < 2:
+            return
+        chunks = [segment.chunk(i) for segment in self._segments for i in range(len(segment))]
+        embeddings = None
+        if self._manifest["embedder"] is not None:
+            embeddings = np.concatenate([segment.embeddings for segment in self._segments])
+        name = self._new_segment(chunks, embeddings)
+        old = self._segments
+        self._manifest["segments"] = [name]
+        self._write_manifest()
+        self._segments = [_Segment(self.path / name)]
+        self._update_totals()
+        for segment in old:
+            segment.close()
+            shutil.rmtree(segment.path)
+
+    def chunk(self, chunk_id: int) -> Chunk:
+        if not 0 <= chunk_id < len(self):
+            raise ValueError(f"No chunk {chunk_id} in an index of {len(self)}.")
+        segment = bisect.bisect_right(self._bases, chunk_id) - 1
+        return self._segments[segment].chunk(chunk_id - self._bases[segment])
+
+    def bm25_scores(self, query: str) -> np.ndarray:
+        """The BM25 score of every chunk for `query`."""
+        scores = np.zeros(len(self), dtype=np.float32)
+        terms = Counter(tokenize(query))
+        if not terms or not len(self):
+            return scores
+        for term, query_count in terms.items():
+            found = [
+                (base, segment, segment.postings_for(term))
+                for base, segment in zip(self._bases, self._segments)
+            ]
+            found = [(base, segment, hit) for base, segment, hit in found if hit is not None]
+            frequency = sum(len(ids) for _, _, (ids, _) in found)
+            if not frequency:
+                continue
+            idf = np.log(1 + (len(self) - frequency + 0.5) / (frequency + 0.5))
+            for base, segment, (ids, counts) in found:
+                norm = K1 * (1 - B + B * segment.lengths[ids] / self._average_length)
+                scores[base + ids] += query_count * idf * counts * (K1 + 1) / (counts + norm)
+        return scores
+
+    def vector_scores(self, query: str) -> Optional[np.ndarray]:
+        """Cosine similarity of every chunk to `query`, or None without embeddings."""
+        if self.embedder is None or self._manifest["embedder"] is None or not len(self):
+            return None
+        vector = self.embedder.embed([query])[0]
+        return np.concatenate([segment.embeddings @ vector for segment in self._segments])
+
+    def search(self, query: str, k: int = 5) -> list[SearchHit]:
+        """The `k` best chunks for `query`, best first; BM25 blended with embedding
+        similarity when the index has embeddings and an embedder to use them."""
+        scores = self.bm25_scores(query)
+        similarity = self.vector_scores(query)
+        if similarity is not None:
+            best = scores.max()
+            if best > 0:
+                scores /= best
+            scores = (1 - self.vector_weight) * scores + self.vector_weight * np.maximum(similarity, 0)
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        # Best first, and the lower id on a tie so results are stable
+        order = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return [SearchHit(int(i), float(scores[i]), self.chunk(int(i))) for i in order]
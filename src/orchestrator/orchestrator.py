@@ -0,0 +1,342 @@
+import argparse
+import asyncio
+import time
+from typing import Any, AsyncIterator, NamedTuple, Optional
+
+from src.engine.bitboard import FULL_BOARD, BitState, check_winner
+from src.engine.models import GamePhase
+from src.explanation.cache import ExplanationCache, analysis_key, explanation_key, from_template, to_template
+from src.explanation.generator import STUB_FIRST_TOKEN_DELAY, STUB_TOKEN_DELAY, Generator, StubGenerator
+from src.explanation.prompts import explanation_prompt
+from src.interface.server import EngineServer, Game, move_to_text
+from src.knowledge.retrieval import load_index
+from src.knowledge.store import Chunk, KnowledgeIndex
+from src.strategy.minimax import Move, SearchResult
+from src.strategy.symmetry import Orientation, canonical_orientation
+
+DEFAULT_THINK_TIME = 1.0
+DEFAULT_SEARCH_TIMEOUT = 5.0
+DEFAULT_KNOWLEDGE_TIMEOUT = 0.5
+DEFAULT_EXPLANATION_TIMEOUT = 10.0
+DEFAULT_CHUNKS = 3
+
+
+class Update(NamedTuple):
+    # "move" (a SearchResult), "knowledge" (a list of Chunks), "token" (explanation
+    # text), "timeout" (the agent that ran out of time) or, last, "done" (timings)
+    kind: str
+    value: Any
+    elapsed: float  # seconds since the request started
+
+
+class Advice(NamedTuple):
+    result: SearchResult
+    knowledge: list[Chunk]
+    explanation: str
+    timeouts: list[str]
+    timings: dict[str, float]
+
+
+def strategy_query(state: BitState, question: str = "") -> str:
+    """What to ask the knowledge index about `state`: the decision at hand, the stage of
+    the game and whatever the user asked."""
+    if state.phase == GamePhase.SELECT_PIECE:
+        words = ["which piece to give", "safe pieces"]
+    else:
+        words = ["where to place the piece", "threats lines"]
+    empty = 16 - state.occupied.bit_count()
+    if empty >= 12:
+        words.append("opening")
+    elif empty <= 6:
+        words.append("endgame parity")
+    if question:
+        words.append(question)
+    return " ".join(words)
+
+
+class Orchestrator:
+    """Answers "what should I do?" by running the agents concurrently.
+
+    The search runs on the engine's process pool while the knowledge index is queried
+    on a thread, so a request costs the slower of the two rather than their sum. The
+    best move is streamed as soon as the search ends, then the explanation token by
+    token as the generator produces it.
+
+    Each agent has its own timeout. A search that runs past its timeout is stopped and
+    its best move so far is used, a retrieval that does the same is dropped, and an
+    explanation is cut off where it got to; each is reported as a "timeout" update.
+
+    With a `cache`, finished searches and explanations are kept by canonical position,
+    so a position met again in any rotation, reflection or relabeling of the pieces is
+    answered from it, with its moves and text translated to the asker's orientation.
+    """
+
+    def __init__(
+        self,
+        engine: Optional[EngineServer] = None,
+        index: Optional[KnowledgeIndex] = None,
+        generator: Optional[Generator] = None,
+        think_time: float = DEFAULT_THINK_TIME,
+        search_timeout: float = DEFAULT_SEARCH_TIMEOUT,
+        knowledge_timeout: float = DEFAULT_KNOWLEDGE_TIMEOUT,
+        explanation_timeout: float = DEFAULT_EXPLANATION_TIMEOUT,
+        chunks: int = DEFAULT_CHUNKS,
+        cache: Optional[ExplanationCache] = None
+    ):
+        self._owns_engine = engine is None
+        self.engine = EngineServer(workers=1) if engine is None else engine
+        self.index = load_index() if index is None else index
+        self.generator = StubGenerator() if generator is None else generator
+        self.think_time = think_time
+        self.search_timeout = search_timeout
+        self.knowledge_timeout = knowledge_timeout
+        self.explanation_timeout = explanation_timeout
+        self.chunks = chunks
+        self.cache = cache
+
+    def __enter__(self) -> "Orchestrator":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._owns_engine:
+            self.engine.close()
+
+    async def _search(self, state: BitState, slot: int) -> tuple[SearchResult, bool]:
+        """(result, whether the timeout stopped it)."""
+        search = asyncio.ensure_future(self.engine.search(state, slot, None, self.think_time, None))
+        try:
+            result, _ = await asyncio.wait_for(asyncio.shield(search), self.search_timeout)
+            return result, False
+        except asyncio.TimeoutError:
+            # A stopped search still answers with the best move it has found
+            self.engine.stop(slot)
+            result, _ = await search
+            return result, True
+
+    async def _retrieve(self, query: str) -> tuple[list[Chunk], bool]:
+        """(chunks, whether the timeout dropped them)."""
+        if self.index is None:
+            return [], False
+        try:
+            hits = await asyncio.wait_for(
+                asyncio.to_thread(self.index.search, query, self.chunks), self.knowledge_timeout
+            )
+        except asyncio.TimeoutError:
+            return [], True
+        return [hit.chunk for hit in hits], False
+
+    def _cached_result(self, orientation: Optional[Orientation]) -> Optional[SearchResult]:
+        if orientation is None:
+            return None
+        cached = self.cache.get(analysis_key(orientation, self.think_time))
+        if cached is None:
+            return None
+        move, score, depth, pv = cached
+        pv = tuple(orientation.move_back(tuple(step)) for step in pv)
+        return SearchResult(orientation.move_back(tuple(move)), score, depth, 0, pv)
+
+    def _store_result(self, orientation: Orientation, result: SearchResult, seconds: float) -> None:
+        pv = [orientation.move(step) for step in result.pv]
+        value = [orientation.move(result.move), result.score, result.depth, pv]
+        self.cache.put(analysis_key(orientation, self.think_time), value, seconds)
+
+    def _cached_explanation(
+        self,
+        orientation: Optional[Orientation],
+        move: Move,
+        question: str
+    ) -> Optional[tuple[list[Chunk], str]]:
+        if orientation is None:
+            return None
+        cached = self.cache.get(explanation_key(orientation, move, question, self.generator.name))
+        if cached is None:
+            return None
+        return [Chunk(*chunk) for chunk in cached["knowledge"]], from_template(cached["text"], orientation)
+
+    async def advise(self, state: BitState, question: str = "") -> AsyncIterator[Update]:
+        """Stream the move for the player to move in `state`, the strategy retrieved for it
+        and an explanation, as each becomes available. Whatever the cache holds for the
+        position, in any orientation, is streamed at once instead."""
+        # Judged from the board alone, since `state` may come without its history
+        if check_winner(state) is not None or state.occupied == FULL_BOARD:
+            raise ValueError("The game is over.")
+        start = time.monotonic()
+
+        def update(kind: str, value: Any) -> Update:
+            return Update(kind, value, time.monotonic() - start)
+
+        timings: dict[str, float] = {}
+        orientation = None if self.cache is None else canonical_orientation(state)
+        result = self._cached_result(orientation)
+        explained = None
+        if result is not None:
+            timings["search"] = time.monotonic() - start
+            yield update("move", result)
+            explained = self._cached_explanation(orientation, result.move, question)
+            if explained is not None:
+                knowledge, text = explained
+                timings["knowledge"] = timings["first_token"] = time.monotonic() - start
+                yield update("knowledge", knowledge)
+                yield update("token", text)
+                timings["total"] = time.monotonic() - start
+                yield update("done", timings)
+                return
+
+        searched = result is None
+        slot = self.engine.take_slot() if searched else None
+        search = asyncio.create_task(self._search(state, slot)) if searched else None
+        retrieval = asyncio.create_task(self._retrieve(strategy_query(state, question)))
+        tasks = [task for task in (search, retrieval) if task is not None]
+        knowledge: list[Chunk] = []
+        try:
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Report the move first when both finish together
+                for task in sorted(done, key=lambda task: task is not search):
+                    if task is search:
+                        result, timed_out = task.result()
+                        timings["search"] = time.monotonic() - start
+                        if timed_out:
+                            yield update("timeout", "search")
+                        elif orientation is not None:
+                            self._store_result(orientation, result, timings["search"])
+                        yield update("move", result)
+                    else:
+                        knowledge, timed_out = task.result()
+                        timings["knowledge"] = time.monotonic() - start
+                        if timed_out:
+                            yield update("timeout", "knowledge")
+                        yield update("knowledge", knowledge)
+        finally:
+            # The search is still running only if the caller stopped listening or retrieval failed
+            if search is not None and not search.done():
+                self.engine.stop(slot)
+            retrieval.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        if searched:
+            explained = self._cached_explanation(orientation, result.move, question)
+        if explained is not None:
+            timings["first_token"] = time.monotonic() - start
+            yield update("token", explained[1])
+            timings["total"] = time.monotonic() - start
+            yield update("done", timings)
+            return
+
+        prompt = explanation_prompt(state, result.move, result.score, knowledge, question)
+        loop = asyncio.get_running_loop()
+        generation_start = loop.time()
+        deadline = generation_start + self.explanation_timeout
+        tokens = self.generator.stream(prompt)
+        text: list[str] = []
+        finished = False
+        try:
+            while True:
+                try:
+                    token = await asyncio.wait_for(anext(tokens), deadline - loop.time())
+                except StopAsyncIteration:
+                    finished = True
+                    break
+                except asyncio.TimeoutError:
+                    yield update("timeout", "explanation")
+                    break
+                if "first_token" not in timings:
+                    timings["first_token"] = time.monotonic() - start
+                text.append(token)
+                yield update("token", token)
+        finally:
+            await tokens.aclose()
+        if finished and orientation is not None:
+            # Only whole explanations are kept, with the notes they were grounded in
+            self.cache.put(
+                explanation_key(orientation, result.move, question, self.generator.name),
+                {"text": to_template("".join(text), orientation), "knowledge": [list(chunk) for chunk in knowledge]},
+                loop.time() - generation_start
+            )
+        timings["total"] = time.monotonic() - start
+        yield update("done", timings)
+
+    async def answer(self, state: BitState, question: str = "") -> Advice:
+        """advise() collected into one result."""
+        result = None
+        knowledge: list[Chunk] = []
+        tokens: list[str] = []
+        timeouts: list[str] = []
+        timings: dict[str, float] = {}
+        async for kind, value, _ in self.advise(state, question):
+            if kind == "move":
+                result = value
+            elif kind == "knowledge":
+                knowledge = value
+            elif kind == "token":
+                tokens.append(value)
+            elif kind == "timeout":
+                timeouts.append(value)
+            else:
+                timings = value
+        return Advice(result, knowledge, "".join(tokens), timeouts, timings)
+
+
+async def _run(args: argparse.Namespace) -> None:
+    game = Game()
+    game.play(args.moves)
+    generator = StubGenerator(args.first_token_delay, args.token_delay)
+    cache = None
+    if args.cache is not None:
+        cache = ExplanationCache(None if args.cache == "memory" else args.cache)
+    with Orchestrator(
+        generator=generator,
+        think_time=args.think_time,
+        search_timeout=args.search_timeout,
+        knowledge_timeout=args.knowledge_timeout,
+        explanation_timeout=args.explanation_timeout,
+        cache=cache
+    ) as orchestrator:
+        totals: dict[str, list[float]] = {}
+        for run in range(args.runs):
+            async for kind, value, elapsed in orchestrator.advise(game.state, args.question):
+                if run == 0 and kind == "move":
+                    print(f"[{elapsed:6.3f}s] move {move_to_text(value.move)} (score {value.score}, depth {value.depth})")
+                elif run == 0 and kind == "knowledge":
+                    print(f"[{elapsed:6.3f}s] {len(value)} strategy notes")
+                elif run == 0 and kind == "token":
+                    print(value, end="", flush=True)
+                elif kind == "timeout":
+                    print(f"\n[{elapsed:6.3f}s] {value} timed out")
+                elif kind == "done":
+                    for name, seconds in value.items():
+                        totals.setdefault(name, []).append(seconds)
+            if run == 0:
+                print()
+        for name, samples in totals.items():
+            print(f"{name:12s} mean {sum(samples) / len(samples):7.3f}s  best {min(samples):7.3f}s")
+    if cache is not None:
+        print("cache " + ", ".join(f"{name}={value}" for name, value in cache.stats().items()))
+        cache.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Advise on a position with every agent, timing each stage.")
+    parser.add_argument("--moves", default="", help="moves from the start, as the CLI writes them")
+    parser.add_argument("--question", default="", help="what the user asked")
+    parser.add_argument("--runs", type=int, default=1, help="repeat the request to average the timings")
+    parser.add_argument("--think-time", type=float, default=DEFAULT_THINK_TIME)
+    parser.add_argument("--search-timeout", type=float, default=DEFAULT_SEARCH_TIMEOUT)
+    parser.add_argument("--knowledge-timeout", type=float, default=DEFAULT_KNOWLEDGE_TIMEOUT)
+    parser.add_argument("--explanation-timeout", type=float, default=DEFAULT_EXPLANATION_TIMEOUT)
+    parser.add_argument("--cache", metavar="PATH", help="explanation cache file, or 'memory' for one that is not kept")
+    parser.add_argument("--first-token-delay", type=float, default=STUB_FIRST_TOKEN_DELAY, help="stub model latency")
+    parser.add_argument("--token-delay", type=float, default=STUB_TOKEN_DELAY, help="stub model seconds per token")
+    args = parser.parse_args()
+    try:
+        asyncio.run(_run(args))
+    except ValueError as error:
+        parser.error(str(error))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+import argparse
+import json
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+from src.engine.bitboard import EMPTY, BitState, get_legal_placements, make_move, placement_wins, wins_with
+from src.engine.records import GameRecord, read_records
+from src.strategy.book import BookEntry, child_key, find_move
+from src.strategy.endgame import KEY_BYTES, load_tablebase
+from src.strategy.evaluation import WIN_SCORE, evaluate_batch, position_arrays
+from src.strategy.minimax import Move, Searcher
+from src.strategy.symmetry import canonical_key
+
+# A played move scoring this far below the best move is flagged as a blunder. Missing a
+# win or walking into a forced loss always is; heuristic scores rarely move this much.
+BLUNDER_MARGIN = 300
+
+# Cache file: the magic, then records appended as results come in. A best-move record
+# holds a position's best child key and score; a played-move record holds the score of
+# the move leading to the given child, searched as deep as the position's best move
+_MAGIC = b"QAC2"
+_ENTRY = struct.Struct(f"<{KEY_BYTES}s{KEY_BYTES}shBB")  # key, child key, score, depth, kind
+_BEST, _PLAYED = 0, 1
+
+
+class Annotation(NamedTuple):
+    game: int
+    turn: int
+    player: int
+    move: Move
+    best: Move
+    score: int  # of the best move, for the player to move
+    played_score: int
+    blunder: bool
+    static: int  # heuristic evaluation of the position before the move
+
+
+class AnalysisCache:
+    """Search results by canonical position key, kept in an append-only file.
+
+    The file is read into memory when opened; every new result is appended and
+    flushed at once, so an interrupted run keeps what it finished. Besides each
+    position's best move it keeps the scores of the moves actually played there.
+    """
+
+    def __init__(self, path: Optional[str | os.PathLike] = None):
+        self.entries: dict[int, BookEntry] = {}
+        self.played: dict[tuple[int, int, int], int] = {}
+        self._file = None
+        if path is None:
+            return
+        path = Path(path)
+        if path.exists() and path.stat().st_size:
+            data = path.read_bytes()
+            if data[:len(_MAGIC)] != _MAGIC:
+                raise ValueError(f"{path} is not an analysis cache of this version.")
+            # A partial trailing record from an interrupted write is ignored
+            end = len(data) - (len(data) - len(_MAGIC)) % _ENTRY.size
+            for key, child, score, depth, kind in _ENTRY.iter_unpack(data[len(_MAGIC):end]):
+                key, child = int.from_bytes(key, "little"), int.from_bytes(child, "little")
+                if kind == _PLAYED:
+                    self.played[key, child, depth] = score
+                else:
+                    self._keep(key, BookEntry(child, score, depth))
+            self._file = open(path, "r+b")
+            self._file.truncate(end)
+            self._file.seek(end)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(path, "wb")
+            self._file.write(_MAGIC)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _keep(self, key: int, entry: BookEntry) -> None:
+        known = self.entries.get(key)
+        if known is None or entry.depth >= known.depth:
+            self.entries[key] = entry
+
+    def get(self, key: int, depth: int) -> Optional[BookEntry]:
+        """The stored result for `key` if it was searched at least `depth` deep."""
+        entry = self.entries.get(key)
+        return entry if entry is not None and entry.depth >= depth else None
+
+    def played_score(self, key: int, child: int, depth: int) -> Optional[int]:
+        """The stored score of the move from `key` to `child`, searched exactly `depth` deep."""
+        return self.played.get((key, child, depth))
+
+    def put(self, key: int, entry: BookEntry) -> None:
+        self._keep(key, entry)
+        self._write(key, entry.child, entry.score, entry.depth, _BEST)
+
+    def put_played(self, key: int, child: int, score: int, depth: int) -> None:
+        self.played[key, child, depth] = score
+        self._write(key, child, score, depth, _PLAYED)
+
+    def _write(self, key: int, child: int, score: int, depth: int, kind: int) -> None:
+        if self._file is not None:
+            self._file.write(_ENTRY.pack(
+                key.to_bytes(KEY_BYTES, "little"), child.to_bytes(KEY_BYTES, "little"), score, depth, kind
+            ))
+            self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+
+def game_positions(record: GameRecord) -> list[tuple[BitState, Optional[Move]]]:
+    """(position, move played there) for every turn of a game, replayed with make_move.
+
+    The first turn only gives a piece and the last may only place. A game the record
+    leaves unfinished ends with the position to move next, paired with None.
+    """
+    plies = record.plies
+    state = BitState.initial()
+    if not plies:
+        return [(state, None)]
+    positions = [(state.copy(), (EMPTY, plies[0]))]
+    make_move(state, piece_to_give=plies[0])
+    for i in range(1, len(plies), 2):
+        square = plies[i]
+        give = plies[i + 1] if i + 1 < len(plies) else EMPTY
+        positions.append((state.copy(), (square, give)))
+        make_move(state, placement=square)
+        if give == EMPTY:
+            if not placement_wins(state, square) and state.remaining:
+                raise ValueError("Game record stops between a placement and a give.")
+            return positions
+        make_move(state, piece_to_give=give)
+    positions.append((state, None))
+    return positions
+
+def _ending_move(state: BitState) -> Move:
+    # The best move ends the game: a winning placement, or the last empty square
+    empties = get_legal_placements(state)
+    for square in empties:
+        if wins_with(state, square, state.selected):
+            return square, EMPTY
+    return empties[0], EMPTY
+
+
+# Per-process searcher, set up once by _init_worker
+_searcher: Optional[Searcher] = None
+
+def _init_worker() -> None:
+    global _searcher
+    _searcher = Searcher(tablebase=load_tablebase())
+
+def _analyze_position(
+    packed: bytes,
+    depth: int,
+    entry: Optional[BookEntry],
+    played: dict[int, tuple[bytes, Move]]
+) -> tuple[int, BookEntry, list[tuple[int, int]]]:
+    """Search the position unless its `entry` is known, then score the moves played there
+    (by child key, each with the position it was played from) that differ from the best
+    one at the same depth. Returns (key, entry, [(child key, score)])."""
+    state = BitState.from_bytes(packed)
+    if entry is None:
+        result = _searcher.search(state, depth)
+        # A move that ends the game is stored with child key 0 and found again by _ending_move
+        child = 0 if result.move[1] == EMPTY else child_key(state, result.move)
+        entry = BookEntry(child, result.score, depth)
+    scores = []
+    for child, (position, move) in played.items():
+        if child != entry.child:
+            scores.append((child, _searcher.score_move(BitState.from_bytes(position), move, entry.depth)))
+    return canonical_key(state), entry, scores
+
+
+class Analyzer:
+    """Annotates games with the engine's best move and score for every turn."""
+
+    def __init__(
+        self,
+        depth: int = 3,
+        cache: Optional[AnalysisCache] = None,
+        workers: Optional[int] = None,
+        margin: int = BLUNDER_MARGIN
+    ):
+        self.depth = depth
+        self.cache = AnalysisCache() if cache is None else cache
+        self.margin = margin
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+        self.searched = 0
+
+    def __enter__(self) -> "Analyzer":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.pool.shutdown()
+
+    def _fill_cache(self, games: list[list[tuple[BitState, Optional[Move]]]]) -> None:
+        # Each distinct position not yet in the cache is searched once, in parallel, along
+        # with the moves played there that have no score yet. The position an unfinished
+        # game stops at has no move to annotate and is left out.
+        packed: dict[int, bytes] = {}
+        played: dict[int, dict[int, tuple[bytes, Move]]] = {}
+        for positions in games:
+            for state, move in positions:
+                if move is None:
+                    continue
+                key = canonical_key(state)
+                if key not in packed:
+                    packed[key] = state.to_bytes()
+                    played[key] = {}
+                if move[1] == EMPTY:
+                    continue
+                entry = self.cache.get(key, self.depth)
+                child = child_key(state, move)
+                if entry is None or (child != entry.child and self.cache.played_score(key, child, entry.depth) is None):
+                    played[key][child] = (state.to_bytes(), move)
+        keys = [key for key in packed if played[key] or self.cache.get(key, self.depth) is None]
+        entries = [self.cache.get(key, self.depth) for key in keys]
+        results = self.pool.map(
+            _analyze_position,
+            [packed[key] for key in keys], [self.depth] * len(keys), entries, [played[key] for key in keys]
+        )
+        for known, (key, entry, scores) in zip(entries, results):
+            if known is None:
+                self.cache.put(key, entry)
+            for child, score in scores:
+                self.cache.put_played(key, child, score, entry.depth)
+        self.searched += len(keys)
+
+    def _annotate(
+        self,
+        index: int,
+        positions: list[tuple[BitState, Optional[Move]]],
+        static: list[int]
+    ) -> list[Annotation]:
+        annotations = []
+        for turn, (state, move) in enumerate(positions):
+            if move is None:
+                break
+            key = canonical_key(state)
+            entry = self.cache.get(key, self.depth)
+            best = _ending_move(state) if entry.child == 0 else find_move(state, entry.child)
+            square, give = move
+            if give == EMPTY:
+                make_move(state, placement=square)
+                played_score = WIN_SCORE if placement_wins(state, square) else 0
+            else:
+                # Scored on the same terms as the best move, which keeps its own score
+                child = child_key(state, move)
+                played_score = entry.score if child == entry.child else self.cache.played_score(key, child, entry.depth)
+            annotations.append(Annotation(
+                index, turn, state.player, move, best, entry.score, played_score,
+                entry.score - played_score >= self.margin, static[turn]
+            ))
+        return annotations
+
+    def analyze(self, games: Iterable[GameRecord], batch: int = 64) -> Iterator[Annotation]:
+        """Annotations for every turn of every game, a batch of games at a time."""
+        pending: list[GameRecord] = []
+        index = 0
+        for record in games:
+            pending.append(record)
+            if len(pending) == batch:
+                yield from self._run_batch(index, pending)
+                index += len(pending)
+                pending = []
+        if pending:
+            yield from self._run_batch(index, pending)
+
+    def _run_batch(self, first: int, games: list[GameRecord]) -> Iterator[Annotation]:
+        positions = [game_positions(record) for record in games]
+        self._fill_cache(positions)
+        # Static evaluations of every position in the batch come from one vectorized pass
+        static = evaluate_batch(*position_arrays(state for game in positions for state, _ in game)).tolist()
+        start = 0
+        for offset, game in enumerate(positions):
+            yield from self._annotate(first + offset, game, static[start:start + len(game)])
+            start += len(game)
+
+
+def analyze_file(
+    games_path: str | os.PathLike,
+    output: str | os.PathLike,
+    depth: int = 3,
+    cache_path: Optional[str | os.PathLike] = None,
+    workers: Optional[int] = None,
+    margin: int = BLUNDER_MARGIN
+) -> tuple[int, int]:
+    """Write one JSON line per turn of every game in `games_path` to `output`.
+    Returns (annotations written, positions searched)."""
+    cache = AnalysisCache(cache_path)
+    written = 0
+    game = 0
+    try:
+        with Analyzer(depth, cache, workers, margin) as analyzer, open(output, "w") as out:
+            for annotation in analyzer.analyze(read_records(games_path)):
+                if annotation.game != game:
+                    # Each game reaches the file once all of its turns are written
+                    out.flush()
+                    game = annotation.game
+                out.write(json.dumps(annotation._asdict()) + "\n")
+                written += 1
+            searched = analyzer.searched
+    finally:
+        cache.close()
+    return written, searched
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Annotate every move of a game record file.")
+    parser.add_argument("games", help="game record file (.qgr)")
+    parser.add_argument("output", help="JSON-lines file of per-move annotations")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--cache", default=None, help="analysis cache file shared between runs")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--margin", type=int, default=BLUNDER_MARGIN, help="score loss that counts as a blunder")
+    args = parser.parse_args()
+
+    written, searched = analyze_file(args.games, args.output, args.depth, args.cache, args.workers, args.margin)
+    print(f"Wrote {written} annotations to {args.output} ({searched} positions searched)")
+
+
+if __name__ == "__main__":
+    main()
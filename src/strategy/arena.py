@@ -0,0 +1,280 @@
+import argparse
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from src.engine.bitboard import (
+    EMPTY,
+    BitState,
+    get_legal_piece_selections,
+    get_legal_placements,
+    make_move,
+    placement_wins,
+    wins_with,
+)
+from src.engine.models import GamePhase
+from src.engine.records import GameRecord, RecordWriter, record_game
+from src.strategy.endgame import load_tablebase
+from src.strategy.evaluation import deadly_after
+from src.strategy.mcts import MCTS
+from src.strategy.minimax import Move, Searcher
+
+# Player specs: "random", "minimax:<depth>", "think:<seconds>" or "mcts:<iterations>"
+PLAYER_KINDS = ("random", "minimax", "think", "mcts")
+
+
+def parse_player(spec: str) -> tuple[str, float]:
+    """(kind, budget) for a player spec; the budget is 0 for the random player."""
+    kind, _, budget = spec.partition(":")
+    if kind not in PLAYER_KINDS:
+        raise ValueError(f"Unknown player {spec!r}; expected one of {', '.join(PLAYER_KINDS)}.")
+    if kind == "random":
+        return kind, 0
+    try:
+        value = float(budget) if kind == "think" else int(budget)
+    except ValueError:
+        raise ValueError(f"Player {spec!r} needs a numeric budget, e.g. {kind}:2.") from None
+    if value <= 0:
+        raise ValueError(f"Player {spec!r} needs a positive budget.")
+    return kind, value
+
+
+class Player:
+    """One side of an arena game, built from a spec string."""
+
+    def __init__(self, spec: str, seed: int):
+        self.kind, self.budget = parse_player(spec)
+        self.rng = random.Random(seed)
+        if self.kind in ("minimax", "think"):
+            self.searcher = Searcher(tablebase=load_tablebase())
+        elif self.kind == "mcts":
+            self.mcts = MCTS(seed=seed)
+
+    def choose(self, state: BitState) -> Move:
+        if self.kind == "random":
+            return self.rng.choice(legal_moves(state))
+        if self.kind == "minimax":
+            return self.searcher.search(state, self.budget).move
+        if self.kind == "think":
+            return self.searcher.iterative_search(state, time_limit=self.budget).move
+        return self.mcts.search(state, iterations=self.budget).move
+
+
+class MatchResult(NamedTuple):
+    game: int
+    a_first: bool
+    result: int  # for player A: 1 win, 0 draw, -1 loss
+    plies: int
+    seconds: float
+
+
+class ArenaSummary(NamedTuple):
+    games: int
+    wins: int
+    draws: int
+    losses: int
+    score: float  # A's mean points per game, win = 1 and draw = 1/2
+    margin: float  # half-width of the 95% confidence interval on score
+    elo: float
+    games_per_second: float
+
+
+def legal_moves(state: BitState) -> list[Move]:
+    if state.phase == GamePhase.SELECT_PIECE:
+        return [(EMPTY, give) for give in get_legal_piece_selections(state)]
+    gives = get_legal_piece_selections(state) or [EMPTY]
+    return [(square, give) for square in get_legal_placements(state) for give in gives]
+
+def opening(seed: int, turns: int) -> BitState:
+    """A random start of `turns` place+give turns that never wins or hands over a winning piece
+    when it can avoid it."""
+    rng = random.Random(seed)
+    state = BitState.initial()
+    make_move(state, piece_to_give=rng.choice(get_legal_piece_selections(state)))
+    for _ in range(turns):
+        squares = [s for s in get_legal_placements(state) if not wins_with(state, s, state.selected)]
+        if not squares or state.remaining.bit_count() < 2:
+            break
+        square = rng.choice(squares)
+        safe = state.remaining & ~deadly_after(state, square, state.selected)
+        make_move(state, placement=square)
+        gives = get_legal_piece_selections(state)
+        make_move(state, piece_to_give=rng.choice([g for g in gives if safe >> g & 1] or gives))
+    return state
+
+def play_game(players: tuple[Player, Player], state: BitState) -> tuple[Optional[int], int]:
+    """Play `state` out; players[i] moves for engine player i. Returns (winner or None, plies)."""
+    plies = 0
+    while True:
+        square, give = players[state.player].choose(state)
+        if square != EMPTY:
+            make_move(state, placement=square)
+            plies += 1
+            if placement_wins(state, square):
+                return state.player, plies
+            if not state.remaining:
+                return None, plies
+        make_move(state, piece_to_give=give)
+        plies += 1
+
+def _play_arena_game(
+    game: int,
+    spec_a: str,
+    spec_b: str,
+    opening_turns: int,
+    seed: int
+) -> tuple[MatchResult, GameRecord]:
+    # Games come in pairs that share an opening, with A moving first in the even one
+    start = time.perf_counter()
+    a_first = game % 2 == 0
+    state = opening(seed * 1_000_003 + game // 2, opening_turns)
+    a = Player(spec_a, seed + 2 * game)
+    b = Player(spec_b, seed + 2 * game + 1)
+    # The engine's player 0 made the first give, so "first" means engine player 0
+    players = (a, b) if a_first else (b, a)
+    winner, plies = play_game(players, state)
+    if winner is None:
+        result = 0
+    else:
+        result = 1 if (winner == 0) == a_first else -1
+    return MatchResult(game, a_first, result, plies, time.perf_counter() - start), record_game(state)
+
+
+def summarize(records: list[MatchResult], played: int = 0, seconds: float = 0.0) -> ArenaSummary:
+    """Totals for A over `records`; throughput is `played` games in `seconds`."""
+    games = len(records)
+    wins = sum(record.result == 1 for record in records)
+    draws = sum(record.result == 0 for record in records)
+    losses = games - wins - draws
+    if not games:
+        return ArenaSummary(0, 0, 0, 0, 0.0, 0.0, 0.0, 0.0)
+    points = [(record.result + 1) / 2 for record in records]
+    score = sum(points) / games
+    variance = sum((p - score) ** 2 for p in points) / (games - 1) if games > 1 else 0.25
+    margin = 1.96 * math.sqrt(variance / games)
+    clamped = min(max(score, 1e-3), 1 - 1e-3)
+    elo = -400 * math.log10(1 / clamped - 1)
+    return ArenaSummary(games, wins, draws, losses, score, margin, elo, played / seconds if seconds else 0.0)
+
+def _read_results(path: Path, header: dict) -> list[MatchResult]:
+    with open(path) as f:
+        lines = [line for line in f.read().split("\n") if line.strip()]
+    if json.loads(lines[0]) != header:
+        raise ValueError(f"{path} holds results for a different match: {lines[0]}")
+    records = []
+    for number, line in enumerate(lines[1:], start=2):
+        try:
+            records.append(MatchResult(**json.loads(line)))
+        except json.JSONDecodeError:
+            # A run killed mid-write leaves a partial last line; that game is replayed
+            if number != len(lines):
+                raise
+    return records
+
+def run_arena(
+    spec_a: str,
+    spec_b: str,
+    games: int,
+    output: Optional[str | os.PathLike] = None,
+    workers: Optional[int] = None,
+    opening_turns: int = 2,
+    seed: int = 0,
+    on_game=None,
+    record_path: Optional[str | os.PathLike] = None
+) -> ArenaSummary:
+    """Play `games` games of A against B across a process pool.
+
+    With `output` each finished game is written to that file as a JSON line under a
+    header line describing the match; rerunning with the same file rewrites it with the
+    games it already holds and skips them. With `record_path` the moves of every game played are appended to
+    that game record file. `on_game(record, summary)` is called as each game finishes.
+    """
+    # Fail on a bad spec here rather than in every worker
+    parse_player(spec_a)
+    parse_player(spec_b)
+    header = {"a": spec_a, "b": spec_b, "opening_turns": opening_turns, "seed": seed}
+    results: list[MatchResult] = []
+    stream = None
+    if output is not None:
+        path = Path(output)
+        if path.exists() and path.stat().st_size:
+            results = _read_results(path, header)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Rewritten rather than appended to, which drops a partial line left by a killed run
+        stream = open(path, "w")
+        stream.write("".join(json.dumps(line) + "\n" for line in [header] + [r._asdict() for r in results]))
+        stream.flush()
+
+    done = {record.game for record in results}
+    pending = [game for game in range(games) if game not in done]
+    start = time.perf_counter()
+    played = 0
+    writer = None if record_path is None else RecordWriter(record_path)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_play_arena_game, game, spec_a, spec_b, opening_turns, seed) for game in pending
+            ]
+            for future in as_completed(futures):
+                record, moves = future.result()
+                results.append(record)
+                played += 1
+                if stream is not None:
+                    stream.write(json.dumps(record._asdict()) + "\n")
+                    stream.flush()
+                if writer is not None:
+                    writer.write(moves)
+                if on_game is not None:
+                    on_game(record, summarize(results, played, time.perf_counter() - start))
+    finally:
+        if stream is not None:
+            stream.close()
+        if writer is not None:
+            writer.close()
+
+    # Throughput counts only the games played in this run, not resumed ones
+    return summarize(results, played, time.perf_counter() - start)
+
+
+def format_summary(summary: ArenaSummary) -> str:
+    return (
+        f"{summary.games} games: +{summary.wins} ={summary.draws} -{summary.losses}, "
+        f"score {summary.score:.3f} ± {summary.margin:.3f} (Elo {summary.elo:+.0f}), "
+        f"{summary.games_per_second:.2f} games/s"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Play two engine configurations against each other.")
+    parser.add_argument("a", help="player A: random, minimax:<depth>, think:<seconds> or mcts:<iterations>")
+    parser.add_argument("b", help="player B, same forms as A")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--opening-turns", type=int, default=2, help="random turns played before the engines take over")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results here as JSON lines; rerun with the same file to resume")
+    parser.add_argument("--record", metavar="PATH", help="append the moves of every game to this game record file")
+    args = parser.parse_args()
+
+    def progress(record: MatchResult, summary: ArenaSummary) -> None:
+        print(f"game {record.game}: {('loss', 'draw', 'win')[record.result + 1]} | {format_summary(summary)}")
+
+    summary = run_arena(
+        args.a, args.b, args.games,
+        output=args.output,
+        workers=args.workers,
+        opening_turns=args.opening_turns,
+        seed=args.seed,
+        on_game=progress,
+        record_path=args.record
+    )
+    print(format_summary(summary))
+
+
+if __name__ == "__main__":
+    main()
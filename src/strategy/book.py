@@ -0,0 +1,213 @@
+import argparse
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from src.engine.bitboard import (
+    EMPTY,
+    BitState,
+    get_legal_piece_selections,
+    get_legal_placements,
+    make_move,
+    unmake_move,
+    wins_with,
+)
+from src.engine.models import GamePhase
+from src.strategy.endgame import KEY_BYTES, key_slot
+from src.strategy.symmetry import canonical_key
+from src.strategy.transposition import TranspositionTable
+
+# (square, piece to give) as in minimax.Move
+Move = tuple[int, int]
+
+DEFAULT_BOOK_PATH = Path(__file__).resolve().parents[2] / "data" / "opening.qbk"
+
+# File layout: header, then open-addressed slots of the position's canonical key, the
+# canonical key of the position after the book move, the score for the player to move
+# and the depth it was searched to. A zero key marks an empty slot. Storing the move as
+# the child position's key keeps it valid in every symmetric orientation of the position.
+_MAGIC = b"QBK1"
+_HEADER = struct.Struct("<4sHHII")  # magic, version, turns covered, slots, entries
+_VERSION = 1
+_TAIL = struct.Struct("<hB")  # score, depth
+_RECORD_BYTES = 2 * KEY_BYTES + _TAIL.size
+
+
+class BookEntry(NamedTuple):
+    child: int
+    score: int
+    depth: int
+
+
+def turn_moves(state: BitState) -> list[Move]:
+    """Every whole-turn move: a give in SELECT_PIECE, else each placement with each give."""
+    gives = get_legal_piece_selections(state)
+    if state.phase == GamePhase.SELECT_PIECE:
+        return [(EMPTY, give) for give in gives]
+    return [(square, give) for square in get_legal_placements(state) for give in gives]
+
+def child_key(state: BitState, move: Move) -> int:
+    """Canonical key of the position `move` leads to."""
+    square, give = move
+    if square != EMPTY:
+        make_move(state, placement=square)
+    make_move(state, piece_to_give=give)
+    key = canonical_key(state)
+    unmake_move(state)
+    if square != EMPTY:
+        unmake_move(state)
+    return key
+
+def find_move(state: BitState, child: int) -> Optional[Move]:
+    """The move from `state` to a position with canonical key `child`, if there is one."""
+    for move in turn_moves(state):
+        if child_key(state, move) == child:
+            return move
+    return None
+
+
+class OpeningBook:
+    """Read-only opening book mapped into memory; nothing is read until a probe needs it."""
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.turns, self.slots, self.entries = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self._map.close()
+            raise ValueError(f"{self.path} is not a version {_VERSION} opening book.")
+
+    def __len__(self) -> int:
+        return self.entries
+
+    def close(self) -> None:
+        self._map.close()
+
+    def probe_key(self, key: int) -> Optional[BookEntry]:
+        slots = self.slots
+        index = key_slot(key, slots)
+        data = self._map
+        for _ in range(slots):
+            offset = _HEADER.size + index * _RECORD_BYTES
+            stored = int.from_bytes(data[offset:offset + KEY_BYTES], "little")
+            if stored == key:
+                child = int.from_bytes(data[offset + KEY_BYTES:offset + 2 * KEY_BYTES], "little")
+                score, depth = _TAIL.unpack_from(data, offset + 2 * KEY_BYTES)
+                return BookEntry(child, score, depth)
+            if stored == 0:
+                return None
+            index = index + 1 if index + 1 < slots else 0
+        return None
+
+    def lookup(self, state: BitState) -> Optional[tuple[Move, BookEntry]]:
+        """The book move for the player to move in `state`, or None if it is out of book."""
+        if state.occupied.bit_count() > self.turns:
+            return None
+        entry = self.probe_key(canonical_key(state))
+        if entry is None:
+            return None
+        move = find_move(state, entry.child)
+        return None if move is None else (move, entry)
+
+
+def write_book(path: str | os.PathLike, entries: dict[int, BookEntry], turns: int) -> None:
+    """Write canonical key -> BookEntry pairs as an open-addressed table at half load."""
+    slots = max(2 * len(entries), 1)
+    buffer = bytearray(_HEADER.size + slots * _RECORD_BYTES)
+    _HEADER.pack_into(buffer, 0, _MAGIC, _VERSION, turns, slots, len(entries))
+    for key, entry in entries.items():
+        index = key_slot(key, slots)
+        while True:
+            offset = _HEADER.size + index * _RECORD_BYTES
+            if not any(buffer[offset:offset + KEY_BYTES]):
+                break
+            index = index + 1 if index + 1 < slots else 0
+        buffer[offset:offset + KEY_BYTES] = key.to_bytes(KEY_BYTES, "little")
+        buffer[offset + KEY_BYTES:offset + 2 * KEY_BYTES] = entry.child.to_bytes(KEY_BYTES, "little")
+        _TAIL.pack_into(buffer, offset + 2 * KEY_BYTES, entry.score, entry.depth)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(buffer)
+
+
+_default_book: Optional[OpeningBook] = None
+
+def load_book(path: Optional[str | os.PathLike] = None) -> Optional[OpeningBook]:
+    """The book at `path` (default: $QUARTO_BOOK or data/opening.qbk), or None if missing.
+
+    The default book is opened on first use and shared.
+    """
+    global _default_book
+    if path is None:
+        if _default_book is not None:
+            return _default_book
+        path = Path(os.environ.get("QUARTO_BOOK", DEFAULT_BOOK_PATH))
+        if not path.exists():
+            return None
+        _default_book = OpeningBook(path)
+        return _default_book
+    return OpeningBook(path)
+
+
+def book_positions(turns: int) -> list[BitState]:
+    """One representative of every canonical position with at most `turns` pieces on the
+    board, reached from the start without either side passing up an immediate win."""
+    level = [BitState.initial()]
+    positions = list(level)
+    for _ in range(turns + 1):
+        reached: dict[int, BitState] = {}
+        for state in level:
+            if state.phase == GamePhase.PLACE_PIECE and any(
+                wins_with(state, square, state.selected) for square in get_legal_placements(state)
+            ):
+                continue
+            for square, give in turn_moves(state):
+                if square != EMPTY:
+                    make_move(state, placement=square)
+                make_move(state, piece_to_give=give)
+                key = canonical_key(state)
+                if key not in reached:
+                    child = state.copy()
+                    child.history.clear()
+                    reached[key] = child
+                unmake_move(state)
+                if square != EMPTY:
+                    unmake_move(state)
+        level = list(reached.values())
+        positions.extend(level)
+    return positions
+
+def build_book(path: str | os.PathLike, turns: int, depth: int) -> int:
+    """Search every book position to `depth` and write the results to `path`.
+    Returns the number of entries written."""
+    # minimax consults the book, so the searcher is imported only when building one
+    from src.strategy.minimax import Searcher
+
+    searcher = Searcher(table=TranspositionTable(1 << 20))
+    entries: dict[int, BookEntry] = {}
+    for state in book_positions(turns):
+        result = searcher.search(state, depth)
+        if result.move[1] != EMPTY:
+            # A move that ends the game is found instantly by search; keep it out of the book
+            entries[canonical_key(state)] = BookEntry(child_key(state, result.move), result.score, depth)
+    write_book(path, entries, turns)
+    return len(entries)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build an opening book by searching early positions deeply.")
+    parser.add_argument("output", nargs="?", default=str(DEFAULT_BOOK_PATH))
+    parser.add_argument("--turns", type=int, default=2, help="cover positions with up to this many pieces placed")
+    parser.add_argument("--depth", type=int, default=3, help="search depth in turns for each position")
+    args = parser.parse_args()
+
+    entries = build_book(args.output, args.turns, args.depth)
+    print(f"Wrote {entries} positions to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
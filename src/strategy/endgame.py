@@ -0,0 +1,316 @@
+import argparse
+import mmap
+import os
+import random
+import struct
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+from src.engine.bitboard import (
+    EMPTY,
+    BitState,
+    get_legal_piece_selections,
+    get_legal_placements,
+    make_move,
+    unmake_move,
+    wins_with,
+)
+from src.engine.models import GamePhase
+from src.strategy.evaluation import WIN_SCORE, deadly_pieces
+from src.strategy.symmetry import canonical_key
+from src.strategy.transposition import LOWER_BOUND, UPPER_BOUND
+
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+# Positions with at most this many empty squares are solved exactly by search
+SOLVE_EMPTY = 8
+
+DEFAULT_TABLEBASE_PATH = Path(__file__).resolve().parents[2] / "data" / "endgame.qtb"
+
+# File layout: header, then open-addressed slots of an 11-byte little-endian canonical
+# key and one outcome byte (outcome + 1). A zero key marks an empty slot.
+_MAGIC = b"QTB1"
+_HEADER = struct.Struct("<4sHHII")  # magic, version, max empty squares, slots, entries
+_VERSION = 1
+KEY_BYTES = 11
+_RECORD_BYTES = KEY_BYTES + 1
+
+
+def outcome_to_score(outcome: int, ply: int) -> int:
+    """Search score for a solved outcome: below any immediate win, above any heuristic."""
+    if outcome == WIN:
+        return WIN_SCORE - 50 - ply
+    if outcome == LOSS:
+        return -(WIN_SCORE - 50 - ply)
+    return 0
+
+def empty_squares(key: int) -> int:
+    # The top 17 bits of a canonical key are occupancy plus the selected-piece flag
+    return 16 - (key >> 68 & 0xFFFF).bit_count()
+
+def key_slot(key: int, slots: int) -> int:
+    # Stable across processes, unlike hash() on strings; ints are fine but spread poorly
+    mixed = (key ^ key >> 29 ^ key >> 59) * 0x9E3779B97F4A7C15 & 0xFFFFFFFFFFFFFFFF
+    return (mixed >> 16) % slots
+
+
+class Tablebase:
+    """Read-only endgame table mapped into memory; probing touches a few pages at most."""
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.max_empty, self.slots, self.entries = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self._map.close()
+            raise ValueError(f"{self.path} is not a version {_VERSION} tablebase.")
+
+    def __len__(self) -> int:
+        return self.entries
+
+    def close(self) -> None:
+        self._map.close()
+
+    def probe_key(self, key: int) -> Optional[int]:
+        slots = self.slots
+        index = key_slot(key, slots)
+        data = self._map
+        for _ in range(slots):
+            offset = _HEADER.size + index * _RECORD_BYTES
+            stored = int.from_bytes(data[offset:offset + KEY_BYTES], "little")
+            if stored == key:
+                return data[offset + KEY_BYTES] - 1
+            if stored == 0:
+                return None
+            index = index + 1 if index + 1 < slots else 0
+        return None
+
+    def probe(self, state: BitState) -> Optional[int]:
+        """Outcome for the player to move, or None if the position is not in the table."""
+        if 16 - state.occupied.bit_count() > self.max_empty:
+            return None
+        if state.phase == GamePhase.PLACE_PIECE:
+            return self.probe_key(canonical_key(state))
+
+        # Choosing a piece: the best give is the one whose placement phase is worst for the opponent
+        gives = get_legal_piece_selections(state)
+        if not gives:
+            return None
+        best = LOSS
+        complete = True
+        for give in gives:
+            make_move(state, piece_to_give=give)
+            outcome = self.probe_key(canonical_key(state))
+            unmake_move(state)
+            if outcome == LOSS:
+                return WIN
+            if outcome is None:
+                complete = False
+            else:
+                best = max(best, -outcome)
+        return best if complete else None
+
+
+def write_tablebase(path: str | os.PathLike, results: dict[int, int], max_empty: int) -> None:
+    """Write canonical key -> outcome pairs as an open-addressed table at half load."""
+    slots = max(2 * len(results), 1)
+    buffer = bytearray(_HEADER.size + slots * _RECORD_BYTES)
+    _HEADER.pack_into(buffer, 0, _MAGIC, _VERSION, max_empty, slots, len(results))
+    for key, outcome in results.items():
+        index = key_slot(key, slots)
+        while True:
+            offset = _HEADER.size + index * _RECORD_BYTES
+            if not any(buffer[offset:offset + KEY_BYTES]):
+                break
+            index = index + 1 if index + 1 < slots else 0
+        buffer[offset:offset + KEY_BYTES] = key.to_bytes(KEY_BYTES, "little")
+        buffer[offset + KEY_BYTES] = outcome + 1
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(buffer)
+
+
+_default_tablebase: Optional[Tablebase] = None
+
+def load_tablebase(path: Optional[str | os.PathLike] = None) -> Optional[Tablebase]:
+    """The tablebase at `path` (default: $QUARTO_TABLEBASE or data/endgame.qtb), or None if missing.
+
+    The default table is opened once and shared.
+    """
+    global _default_tablebase
+    if path is None:
+        if _default_tablebase is not None:
+            return _default_tablebase
+        path = Path(os.environ.get("QUARTO_TABLEBASE", DEFAULT_TABLEBASE_PATH))
+        if not path.exists():
+            return None
+        _default_tablebase = Tablebase(path)
+        return _default_tablebase
+    return Tablebase(path)
+
+
+class EndgameSolver:
+    """Exact win/draw/loss solver for PLACE_PIECE positions.
+
+    Outcomes are for the player holding state.selected. Every canonical position solved
+    exactly is remembered in `results`, which is what a tablebase is built from.
+
+    A `check` callable, if given, is called every 256 nodes and may raise to abandon the
+    solve; the state is then left mid-search for the caller to unwind.
+    """
+
+    def __init__(self, tablebase: Optional[Tablebase] = None, check: Optional[Callable[[], None]] = None):
+        self.tablebase = tablebase
+        self.check = check
+        self.bounds: dict[int, tuple[int, int]] = {}
+        self.results: dict[int, int] = {}
+        self.nodes = 0
+
+    def solve(self, state: BitState) -> int:
+        return self._solve(state, LOSS, WIN)
+
+    def _solve(self, state: BitState, alpha: int, beta: int) -> int:
+        self.nodes += 1
+        if self.check is not None and self.nodes & 255 == 0:
+            self.check()
+        piece = state.selected
+        empties = get_legal_placements(state)
+        for square in empties:
+            if wins_with(state, square, piece):
+                return WIN
+        if not state.remaining:
+            return DRAW
+
+        key = canonical_key(state)
+        if key in self.results:
+            return self.results[key]
+        if self.tablebase is not None and len(empties) <= self.tablebase.max_empty:
+            outcome = self.tablebase.probe_key(key)
+            if outcome is not None:
+                return outcome
+        bound = self.bounds.get(key)
+        if bound is not None:
+            flag, value = bound
+            if flag == LOWER_BOUND and value >= beta:
+                return value
+            if flag == UPPER_BOUND and value <= alpha:
+                return value
+
+        alpha_orig = alpha
+        best = LOSS
+        gives = get_legal_piece_selections(state)
+        remaining = state.remaining
+        for square in empties:
+            make_move(state, placement=square)
+            # A give that completes an open line loses; try one only when all of them do
+            safe = remaining & ~deadly_pieces(state)
+            candidates = [give for give in gives if safe >> give & 1] if safe else gives[:1]
+            for give in candidates:
+                make_move(state, piece_to_give=give)
+                outcome = -self._solve(state, -beta, -alpha)
+                unmake_move(state)
+                if outcome > best:
+                    best = outcome
+                    alpha = max(alpha, outcome)
+                if alpha >= beta:
+                    break
+            unmake_move(state)
+            if alpha >= beta:
+                break
+
+        # With outcomes limited to -1..1 a result is exact unless it sits on a bound
+        # narrower than the full range
+        if best <= alpha_orig and alpha_orig > LOSS:
+            self.bounds[key] = (UPPER_BOUND, best)
+        elif best >= beta and beta < WIN:
+            self.bounds[key] = (LOWER_BOUND, best)
+        else:
+            self.results[key] = best
+            self.bounds.pop(key, None)
+        return best
+
+    def best_move(self, state: BitState) -> tuple[tuple[int, int], int]:
+        """Perfect-play ((square, give), outcome) for the player to move in either phase."""
+        if state.phase == GamePhase.PLACE_PIECE:
+            empties = get_legal_placements(state)
+            for square in empties:
+                if wins_with(state, square, state.selected):
+                    return (square, EMPTY), WIN
+            if not state.remaining:
+                return (empties[0], EMPTY), DRAW
+            squares = empties
+        else:
+            squares = [EMPTY]
+
+        best_move = None
+        best = LOSS - 1
+        for square in squares:
+            if square != EMPTY:
+                make_move(state, placement=square)
+            for give in get_legal_piece_selections(state):
+                make_move(state, piece_to_give=give)
+                outcome = -self._solve(state, LOSS, -best if best >= LOSS else WIN)
+                unmake_move(state)
+                if outcome > best:
+                    best = outcome
+                    best_move = (square, give)
+                if best == WIN:
+                    break
+            if square != EMPTY:
+                unmake_move(state)
+            if best == WIN:
+                break
+        return best_move, best
+
+
+def sample_positions(count: int, empty: int, seed: int = 0) -> list[BitState]:
+    """Random PLACE_PIECE positions with `empty` empty squares and no immediate win."""
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        state = BitState.initial()
+        make_move(state, piece_to_give=rng.choice(get_legal_piece_selections(state)))
+        while 16 - state.occupied.bit_count() > empty:
+            squares = [s for s in get_legal_placements(state) if not wins_with(state, s, state.selected)]
+            if not squares:
+                break
+            make_move(state, placement=rng.choice(squares))
+            make_move(state, piece_to_give=rng.choice(get_legal_piece_selections(state)))
+        if 16 - state.occupied.bit_count() != empty:
+            continue
+        if any(wins_with(state, s, state.selected) for s in get_legal_placements(state)):
+            continue
+        state.history.clear()
+        positions.append(state)
+    return positions
+
+def build_tablebase(path: str | os.PathLike, positions: Iterable[BitState], max_empty: int) -> int:
+    """Solve `positions` and write every exactly solved position with at most
+    `max_empty` empty squares to `path`. Returns the number of entries written."""
+    solver = EndgameSolver()
+    for state in positions:
+        solver.solve(state)
+    results = {key: outcome for key, outcome in solver.results.items() if empty_squares(key) <= max_empty}
+    write_tablebase(path, results, max_empty)
+    return len(results)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build an endgame tablebase from sampled positions.")
+    parser.add_argument("output", nargs="?", default=str(DEFAULT_TABLEBASE_PATH))
+    parser.add_argument("--positions", type=int, default=200, help="number of root positions to solve")
+    parser.add_argument("--max-empty", type=int, default=8, help="deepest positions to sample and store")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    positions = sample_positions(args.positions, args.max_empty, args.seed)
+    entries = build_tablebase(args.output, positions, args.max_empty)
+    print(f"Wrote {entries} positions to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import json
+import os
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+from src.engine.bitboard import ATTRIBUTE_BITS, EMPTY, LINE_MASKS, BitState
+
+# Scores are from the point of view of the player about to place state.selected.
+# Anything at or above WIN_THRESHOLD is a forced result found by search, not a heuristic.
+WIN_SCORE = 10_000
+WIN_THRESHOLD = WIN_SCORE - 100
+
+# Names of the features() columns, in order
+FEATURES = ("can_win", "open_threes", "deadly_pieces", "safe_pieces")
+DEFAULT_WEIGHTS = (900, 2, -6, 3)
+
+DEFAULT_WEIGHTS_PATH = Path(__file__).resolve().parents[2] / "data" / "weights.json"
+WEIGHTS_VERSION = 1
+
+
+def load_weights(path: Optional[str | os.PathLike] = None) -> tuple[int, ...]:
+    """Weights from a tuning file (default: $QUARTO_WEIGHTS or data/weights.json), or
+    DEFAULT_WEIGHTS when there is no default file."""
+    if path is None:
+        path = Path(os.environ.get("QUARTO_WEIGHTS", DEFAULT_WEIGHTS_PATH))
+        if not path.exists():
+            return DEFAULT_WEIGHTS
+    data = json.loads(Path(path).read_text())
+    if data.get("version") != WEIGHTS_VERSION or data.get("features") != list(FEATURES):
+        raise ValueError(f"{path} is not a version {WEIGHTS_VERSION} weights file for {', '.join(FEATURES)}.")
+    return tuple(int(weight) for weight in data["weights"])
+
+# Read once at import, so every module that imports WEIGHTS sees the tuned values
+WEIGHTS = load_weights()
+
+# _WITH[i] / _WITHOUT[i]: piece codes that have / lack attribute ATTRIBUTE_BITS[i], as 16-bit masks
+_WITH = tuple(sum(1 << code for code in range(16) if code & bit) for bit in ATTRIBUTE_BITS)
+_WITHOUT = tuple(0xFFFF & ~mask for mask in _WITH)
+
+# (19, 4) square indices of every line, for gathering piece codes line by line
+LINE_SQUARES = np.array(
+    [[square for square in range(16) if line >> square & 1] for line in LINE_MASKS], dtype=np.intp
+)
+# Batch evaluation tables. _CELL_COUNTS[code + 1] is what a square holding `code` (-1 for
+# empty) adds to a line: 1 for being filled, then 1 per attribute in ATTRIBUTE_BITS order.
+# They are float32 so the per-line sums run as one BLAS product; the counts stay exact.
+_CELL_COUNTS = np.array(
+    [[0] * 5] + [[1] + [int(code & bit != 0) for bit in ATTRIBUTE_BITS] for code in range(16)],
+    dtype=np.float32
+)
+_LINE_INCIDENCE = np.array(
+    [[line >> square & 1 for line in LINE_MASKS] for square in range(16)], dtype=np.float32
+)
+_WITH_MASKS = np.array(_WITH, dtype=np.int64)
+_WITHOUT_MASKS = np.array(_WITHOUT, dtype=np.int64)
+_POPCOUNT = np.array([mask.bit_count() for mask in range(1 << 16)], dtype=np.uint8)
+
+
+def open_threes(state: BitState) -> list[tuple[int, int, int]]:
+    """Lines one piece short of a win, as (empty square, bits a completing piece must have,
+    bits it must lack)."""
+    threes = []
+    occupied = state.occupied
+    for line in LINE_MASKS:
+        filled = occupied & line
+        if filled.bit_count() != 3:
+            continue
+        must_have = 0
+        must_lack = 0
+        for mask, bit in zip(state.attrs, ATTRIBUTE_BITS):
+            shared = mask & line
+            if shared == filled:
+                must_have |= bit
+            elif shared == 0:
+                must_lack |= bit
+        if must_have or must_lack:
+            threes.append(((line & ~occupied).bit_length() - 1, must_have, must_lack))
+    return threes
+
+def threat_mask(occupied: int, attrs: list[int]) -> int:
+    """Piece codes that would complete one of the open three-piece lines, as a 16-bit mask."""
+    top, shape, color, height = attrs
+    deadly = 0
+    for line in LINE_MASKS:
+        filled = occupied & line
+        if filled.bit_count() != 3:
+            continue
+        shared = top & line
+        if shared == filled:
+            deadly |= _WITH[0]
+        elif not shared:
+            deadly |= _WITHOUT[0]
+        shared = shape & line
+        if shared == filled:
+            deadly |= _WITH[1]
+        elif not shared:
+            deadly |= _WITHOUT[1]
+        shared = color & line
+        if shared == filled:
+            deadly |= _WITH[2]
+        elif not shared:
+            deadly |= _WITHOUT[2]
+        shared = height & line
+        if shared == filled:
+            deadly |= _WITH[3]
+        elif not shared:
+            deadly |= _WITHOUT[3]
+    return deadly
+
+def deadly_pieces(state: BitState) -> int:
+    """Pieces it would lose to give in `state`, as a mask over piece codes."""
+    return threat_mask(state.occupied, state.attrs)
+
+def deadly_after(state: BitState, square: int, code: int) -> int:
+    """deadly_pieces once piece `code` is placed on the empty `square`, without making the move."""
+    bit = 1 << square
+    attrs = [mask | bit if code & attr else mask for mask, attr in zip(state.attrs, ATTRIBUTE_BITS)]
+    return threat_mask(state.occupied | bit, attrs)
+
+def completes_three(code: int, threes: list[tuple[int, int, int]]) -> bool:
+    for _, must_have, must_lack in threes:
+        if code & must_have or ~code & must_lack:
+            return True
+    return False
+
+def features(state: BitState) -> tuple[int, int, int, int]:
+    threes = open_threes(state)
+    can_win = int(state.selected != EMPTY and completes_three(state.selected, threes))
+    deadly = 0
+    safe = 0
+    remaining = state.remaining
+    for code in range(16):
+        if remaining >> code & 1:
+            if completes_three(code, threes):
+                deadly += 1
+            else:
+                safe += 1
+    return can_win, len(threes), deadly, safe
+
+def evaluate(state: BitState) -> int:
+    return sum(w * f for w, f in zip(WEIGHTS, features(state)))
+
+
+def position_arrays(states: Iterable[BitState]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(cells, remaining, selected) rows for evaluate_batch: the piece code on every square
+    (-1 for empty), the mask of pieces still to be given, and the held piece (-1 for none)."""
+    states = list(states)
+    cells = np.array([state.cells for state in states], dtype=np.int8).reshape(len(states), 16)
+    remaining = np.array([state.remaining for state in states], dtype=np.int64)
+    selected = np.array([state.selected for state in states], dtype=np.int8)
+    return cells, remaining, selected
+
+def batch_features(cells: np.ndarray, remaining: np.ndarray, selected: np.ndarray) -> np.ndarray:
+    """features() of every position at once, as an (N, 4) array."""
+    # Per line, how many squares are filled and how many of their pieces have each
+    # attribute, as one product with the square-by-line incidence matrix
+    counts = np.matmul(_CELL_COUNTS[cells + 1].transpose(0, 2, 1), _LINE_INCIDENCE)
+    three = counts[:, 0] == 3
+    shared = counts[:, 1:]
+    must_have = three[:, None] & (shared == 3)
+    must_lack = three[:, None] & (shared == 0)
+    threes = (must_have | must_lack).any(axis=1).sum(axis=1)
+    # A piece completes an open three if it has an attribute one needs or lacks one another
+    # needs, so the lines can be merged per attribute before testing pieces
+    deadly = np.bitwise_or.reduce(
+        np.where(must_have.any(axis=2), _WITH_MASKS, 0) | np.where(must_lack.any(axis=2), _WITHOUT_MASKS, 0),
+        axis=1
+    )
+    dangerous = _POPCOUNT[deadly & remaining]
+    safe = _POPCOUNT[remaining] - dangerous
+    can_win = (selected >= 0) & (deadly >> np.maximum(selected, 0) & 1 == 1)
+    return np.stack([can_win, threes, dangerous, safe], axis=1).astype(np.int64)
+
+def evaluate_batch(cells: np.ndarray, remaining: np.ndarray, selected: np.ndarray) -> np.ndarray:
+    """evaluate() of every position, from position_arrays() rows."""
+    return batch_features(cells, remaining, selected) @ np.array(WEIGHTS, dtype=np.int64)
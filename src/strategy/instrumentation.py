@@ -0,0 +1,97 @@
+import cProfile
+import io
+import pstats
+from contextlib import contextmanager
+from typing import Iterator, NamedTuple, Optional
+
+
+class IterationStats(NamedTuple):
+    depth: int
+    nodes: int
+    seconds: float
+
+
+class SearchStats:
+    """Counters filled in by a Searcher whose `stats` attribute is set.
+
+    The searcher only touches these behind an `is not None` check, so leaving
+    `stats` unset keeps the search at full speed.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.nodes = 0
+        self.cutoffs = 0
+        self.tt_hits = 0
+        self.tt_misses = 0
+        self.tt_cutoffs = 0
+        self.tablebase_hits = 0
+        self.win_checks = 0
+        self.evaluations = 0
+        self.solver_nodes = 0
+        # ply -> interior nodes expanded there, and the children they searched
+        self.expanded: dict[int, int] = {}
+        self.children: dict[int, int] = {}
+        self.iterations: list[IterationStats] = []
+
+    def expand(self, ply: int, children: int) -> None:
+        self.expanded[ply] = self.expanded.get(ply, 0) + 1
+        self.children[ply] = self.children.get(ply, 0) + children
+
+    def branching_factor(self, ply: int) -> float:
+        expanded = self.expanded.get(ply, 0)
+        return self.children.get(ply, 0) / expanded if expanded else 0.0
+
+    @property
+    def seconds(self) -> float:
+        return sum(iteration.seconds for iteration in self.iterations)
+
+    def as_dict(self) -> dict:
+        return {
+            "nodes": self.nodes,
+            "cutoffs": self.cutoffs,
+            "tt_hits": self.tt_hits,
+            "tt_misses": self.tt_misses,
+            "tt_cutoffs": self.tt_cutoffs,
+            "tablebase_hits": self.tablebase_hits,
+            "win_checks": self.win_checks,
+            "evaluations": self.evaluations,
+            "solver_nodes": self.solver_nodes,
+            "branching": {ply: self.branching_factor(ply) for ply in sorted(self.expanded)},
+            "iterations": [iteration._asdict() for iteration in self.iterations],
+        }
+
+    def report(self) -> str:
+        probes = self.tt_hits + self.tt_misses
+        hit_rate = self.tt_hits / probes if probes else 0.0
+        lines = [
+            f"nodes {self.nodes}, cutoffs {self.cutoffs}, evaluations {self.evaluations}, "
+            f"win checks {self.win_checks}",
+            f"table hits {self.tt_hits}/{probes} ({hit_rate:.0%}), table cutoffs {self.tt_cutoffs}, "
+            f"tablebase hits {self.tablebase_hits}, solver nodes {self.solver_nodes}",
+        ]
+        if self.expanded:
+            lines.append("branching by ply: " + ", ".join(
+                f"{ply}:{self.branching_factor(ply):.1f}" for ply in sorted(self.expanded)
+            ))
+        for iteration in self.iterations:
+            lines.append(f"depth {iteration.depth}: {iteration.nodes} nodes in {iteration.seconds:.3f}s")
+        return "\n".join(lines)
+
+
+@contextmanager
+def profiled(path: Optional[str] = None, sort: str = "cumulative", limit: int = 25) -> Iterator[io.StringIO]:
+    """cProfile the body. The raw profile is dumped to `path` if given (for snakeviz or
+    pstats), and the top `limit` entries are written to the yielded buffer on exit."""
+    profiler = cProfile.Profile()
+    summary = io.StringIO()
+    profiler.enable()
+    try:
+        yield summary
+    finally:
+        profiler.disable()
+        if path is not None:
+            profiler.dump_stats(path)
+        pstats.Stats(profiler, stream=summary).sort_stats(sort).print_stats(limit)
@@ -0,0 +1,241 @@
+import math
+import time
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from src.engine.bitboard import (
+    EMPTY,
+    BitState,
+    get_legal_piece_selections,
+    get_legal_placements,
+    make_move,
+    placement_wins,
+    unmake_move,
+    wins_with,
+)
+from src.engine.models import GamePhase, GameState, Piece
+from src.strategy.evaluation import LINE_SQUARES
+from src.strategy.minimax import Move, move_to_game
+
+
+def random_playouts(states: list[BitState], playouts: int, rng: np.random.Generator) -> np.ndarray:
+    """Play `playouts` uniformly random games from each PLACE_PIECE state, all in lockstep.
+
+    Every game is a row of piece codes (-1 for empty) plus a remaining-pieces row; each
+    step places the held piece on a random empty square, checks all 19 lines of every
+    game at once and hands a random remaining piece to the other side. Returns, per
+    state, the summed results (+1 win, 0 draw, -1 loss) for the player to move there.
+    """
+    cells = np.repeat(np.array([s.cells for s in states], dtype=np.int8), playouts, axis=0)
+    remaining = np.repeat(
+        np.array([[s.remaining >> code & 1 for code in range(16)] for s in states], dtype=bool),
+        playouts,
+        axis=0
+    )
+    selected = np.repeat(np.array([s.selected for s in states], dtype=np.int8), playouts)
+
+    games = cells.shape[0]
+    result = np.zeros(games, dtype=np.int8)
+    sign = np.ones(games, dtype=np.int8)  # +1 while the starting player is the one placing
+    active = np.arange(games)
+
+    while active.size:
+        board = cells[active]
+        keys = rng.random((active.size, 16))
+        keys[board >= 0] = -1.0
+        squares = keys.argmax(axis=1)
+        board[np.arange(active.size), squares] = selected[active]
+        cells[active] = board
+
+        codes = board[:, LINE_SQUARES]
+        full = (codes >= 0).all(axis=2)
+        common = np.bitwise_and.reduce(codes, axis=2)
+        absent = np.bitwise_and.reduce(~codes, axis=2)
+        won = (full & ((common | absent) & 0xF != 0)).any(axis=1)
+        result[active[won]] = sign[active[won]]
+
+        pool = remaining[active]
+        going = ~won & pool.any(axis=1)
+        active = active[going]
+        pool = pool[going]
+
+        keys = rng.random((active.size, 16))
+        keys[~pool] = -1.0
+        gives = keys.argmax(axis=1)
+        remaining[active, gives] = False
+        selected[active] = gives
+        sign[active] = -sign[active]
+
+    return result.reshape(len(states), playouts).sum(axis=1, dtype=np.int64)
+
+
+class MCTSResult(NamedTuple):
+    move: Move
+    value: float  # mean result of the chosen move for the player to move, in [-1, 1]
+    visits: int
+    playouts: int
+    iterations: int
+
+
+class Node:
+    __slots__ = ("move", "parent", "children", "untried", "visits", "value", "terminal")
+
+    def __init__(self, move: Optional[Move], parent: Optional["Node"]):
+        self.move = move
+        self.parent = parent
+        self.children: list[Node] = []
+        self.untried: Optional[list[Move]] = None
+        self.visits = 0
+        # summed results for the player who made `move`
+        self.value = 0.0
+        # result for that player if `move` ended the game, else None
+        self.terminal: Optional[int] = None
+
+
+def _moves(state: BitState) -> list[Move]:
+    """Legal whole-turn moves, collapsed to the single winning move when there is one."""
+    if state.phase == GamePhase.SELECT_PIECE:
+        return [(EMPTY, give) for give in get_legal_piece_selections(state)]
+    empties = get_legal_placements(state)
+    for square in empties:
+        if wins_with(state, square, state.selected):
+            return [(square, EMPTY)]
+    if not state.remaining:
+        return [(empties[0], EMPTY)]
+    gives = get_legal_piece_selections(state)
+    return [(square, give) for square in empties for give in gives]
+
+
+class MCTS:
+    """UCT over whole turns with leaf-batched NumPy rollouts.
+
+    Each iteration selects `leaves_per_batch` leaves (virtual visits keep them apart),
+    then runs `playouts_per_leaf` random games from every leaf in one random_playouts call.
+    """
+
+    def __init__(
+        self,
+        exploration: float = 1.4,
+        playouts_per_leaf: int = 32,
+        leaves_per_batch: int = 32,
+        seed: Optional[int] = None
+    ):
+        self.exploration = exploration
+        self.playouts_per_leaf = playouts_per_leaf
+        self.leaves_per_batch = leaves_per_batch
+        self.rng = np.random.default_rng(seed)
+        self.playouts = 0
+
+    def _select_child(self, node: Node) -> Node:
+        log_visits = math.log(node.visits)
+        c = self.exploration
+        return max(
+            node.children,
+            key=lambda child: child.value / child.visits + c * math.sqrt(log_visits / child.visits)
+        )
+
+    def _descend(self, root: Node, state: BitState) -> tuple[Node, int]:
+        """Walk to a leaf, expanding one new child, and mark the path with a virtual visit.
+        Leaves `state` at the leaf and returns it with the number of plies made."""
+        node = root
+        plies = 0
+        while True:
+            node.visits += 1
+            if node.terminal is not None:
+                return node, plies
+            if node.untried is None:
+                node.untried = _moves(state)
+                self.rng.shuffle(node.untried)
+            if node.untried:
+                move = node.untried.pop()
+                child = Node(move, node)
+                node.children.append(child)
+                plies += self._play(state, move)
+                child.terminal = self._terminal_result(state, move)
+                child.visits += 1
+                return child, plies
+            node = self._select_child(node)
+            plies += self._play(state, node.move)
+
+    @staticmethod
+    def _play(state: BitState, move: Move) -> int:
+        square, give = move
+        plies = 0
+        if square != EMPTY:
+            make_move(state, placement=square)
+            plies += 1
+        if give != EMPTY:
+            make_move(state, piece_to_give=give)
+            plies += 1
+        return plies
+
+    @staticmethod
+    def _terminal_result(state: BitState, move: Move) -> Optional[int]:
+        square, give = move
+        if give != EMPTY or square == EMPTY:
+            return None
+        # A placement with nothing to give ended the game: a win, or the draw on a full board
+        return 1 if placement_wins(state, square) else 0
+
+    def search(
+        self,
+        state: BitState,
+        iterations: Optional[int] = None,
+        time_limit: Optional[float] = None
+    ) -> MCTSResult:
+        """Best move by visit count; at least one of `iterations` and `time_limit` should be set."""
+        if iterations is None and time_limit is None:
+            iterations = 200
+        deadline = None if time_limit is None else time.monotonic() + time_limit
+        root = Node(None, None)
+        self.playouts = 0
+        done = 0
+        work = state.copy()
+
+        while (iterations is None or done < iterations) and (deadline is None or time.monotonic() < deadline):
+            leaves = []
+            for _ in range(self.leaves_per_batch):
+                leaf, plies = self._descend(root, work)
+                leaves.append((leaf, work.copy() if leaf.terminal is None else None))
+                for _ in range(plies):
+                    unmake_move(work)
+
+            rollout_states = [leaf_state for _, leaf_state in leaves if leaf_state is not None]
+            totals = iter(random_playouts(rollout_states, self.playouts_per_leaf, self.rng)) if rollout_states else iter(())
+            for leaf, leaf_state in leaves:
+                if leaf_state is None:
+                    count = 1
+                    total = leaf.terminal
+                else:
+                    count = self.playouts_per_leaf
+                    # playouts score the player to move at the leaf; the leaf's value is for the mover
+                    total = -int(next(totals))
+                    self.playouts += count
+                self._backpropagate(leaf, total, count)
+            done += 1
+
+        best = max(root.children, key=lambda child: child.visits)
+        return MCTSResult(best.move, best.value / best.visits, best.visits, self.playouts, done)
+
+    @staticmethod
+    def _backpropagate(node: Node, total: float, count: int) -> None:
+        # Each node on the path already holds one virtual visit from _descend
+        while node is not None:
+            node.visits += count - 1
+            node.value += total
+            total = -total
+            node = node.parent
+
+
+def get_mcts_move(
+    state: GameState,
+    iterations: Optional[int] = None,
+    time_limit: Optional[float] = None,
+    exploration: float = 1.4,
+    seed: Optional[int] = None
+) -> tuple[Optional[tuple[int, int]], Optional[Piece]]:
+    result = MCTS(exploration=exploration, seed=seed).search(
+        BitState.from_game_state(state), iterations=iterations, time_limit=time_limit
+    )
+    return move_to_game(result.move)
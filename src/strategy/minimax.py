@@ -0,0 +1,593 @@
+import os
+import threading
+import time
+from typing import Callable, NamedTuple, Optional
+
+import numpy as np
+
+from src.engine.bitboard import (
+    EMPTY,
+    BitState,
+    bits_to_piece,
+    get_legal_piece_selections,
+    get_legal_placements,
+    make_move,
+    square_coords,
+    unmake_move,
+    wins_with,
+)
+from src.engine.models import GamePhase, GameState, Piece
+from src.strategy.book import load_book
+from src.strategy.endgame import SOLVE_EMPTY, EndgameSolver, Tablebase, load_tablebase, outcome_to_score
+from src.strategy.evaluation import (
+    WEIGHTS,
+    WIN_SCORE,
+    WIN_THRESHOLD,
+    batch_features,
+    deadly_after,
+    deadly_pieces,
+    evaluate,
+)
+from src.strategy.instrumentation import IterationStats, SearchStats, profiled
+from src.strategy.symmetry import canonical_key
+from src.strategy.transposition import (
+    EXACT,
+    LOWER_BOUND,
+    UPPER_BOUND,
+    MappedTranspositionTable,
+    TranspositionTable,
+)
+
+INFINITY = WIN_SCORE + 1
+
+# (square, piece to give) in bitboard terms; either may be EMPTY when that half of the
+# turn does not happen (a select-only first turn, or a placement that ends the game)
+Move = tuple[int, int]
+
+
+# Iterative deepening never needs more turns than there are squares
+MAX_DEPTH = 16
+
+# Nodes one turn from the horizon with at least this many children score them all with
+# one batch evaluation; below it the fixed cost of the array work outweighs the savings
+BATCH_MIN_CHILDREN = 12
+
+
+class SearchResult(NamedTuple):
+    move: Move
+    score: int
+    depth: int
+    nodes: int
+    pv: tuple[Move, ...] = ()
+
+
+class SearchAborted(Exception):
+    """Raised inside the tree once a time, node or stop limit is hit."""
+
+
+def _score_to_table(score: int, ply: int) -> int:
+    # Win scores encode distance from the root; the table stores distance from the node
+    if score >= WIN_THRESHOLD:
+        return score + ply
+    if score <= -WIN_THRESHOLD:
+        return score - ply
+    return score
+
+def _score_from_table(score: int, ply: int) -> int:
+    if score >= WIN_THRESHOLD:
+        return score - ply
+    if score <= -WIN_THRESHOLD:
+        return score + ply
+    return score
+
+
+class Searcher:
+    """Negamax alpha-beta over whole Quarto turns (place the held piece, then give one).
+
+    Depth counts turns. Every node is a PLACE_PIECE position scored for the player
+    holding state.selected, and positions are shared through the transposition table
+    under their symmetry-canonical key.
+
+    Once a position has `solve_empty` or fewer empty squares the search hands it to the
+    exact endgame solver, and the tablebase (if any) is probed inside the tree. Under
+    the limits of iterative_search the solver is checked like the rest of the search;
+    if it is cut short, the heuristic result at the same depth is returned instead.
+    """
+
+    def __init__(
+        self,
+        table: Optional[TranspositionTable] = None,
+        tablebase: Optional[Tablebase] = None,
+        solve_empty: int = SOLVE_EMPTY,
+        stats: Optional[SearchStats] = None,
+        batch_leaves: bool = True
+    ):
+        self.table = TranspositionTable() if table is None else table
+        self.tablebase = tablebase
+        self.solve_empty = solve_empty
+        self.batch_leaves = batch_leaves
+        self.nodes = 0
+        # Instrumentation is skipped entirely while this is None
+        self.stats = stats
+
+        # Limits checked every few hundred nodes; only set while iterative_search runs
+        self.deadline: Optional[float] = None
+        self.node_limit: Optional[int] = None
+        self.stop_event: Optional[threading.Event] = None
+        self._limited = False
+        self._node_base = 0
+
+        # Principal variation of the previous iteration, tried first at each ply,
+        # and the triangular table the current iteration builds its own in
+        self.pv_moves: list[Move] = []
+        self._pv: list[list[Move]] = [[] for _ in range(MAX_DEPTH + 2)]
+        self._root_best: Optional[tuple[Move, int]] = None
+        self.clear_ordering()
+
+    def clear_ordering(self) -> None:
+        """Forget killer moves and history scores."""
+        # Two most recent cutoff moves per ply, and cutoff bonuses by (square, give) and square
+        self._killers: list[list[Move]] = [[] for _ in range(MAX_DEPTH + 2)]
+        self._history = [0] * 256
+        self._square_history = [0] * 16
+
+    def _check_limits(self, extra_nodes: int = 0) -> None:
+        if self.node_limit is not None and self._node_base + self.nodes + extra_nodes >= self.node_limit:
+            raise SearchAborted()
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise SearchAborted()
+        if self.stop_event is not None and self.stop_event.is_set():
+            raise SearchAborted()
+
+    def _ordered(self, state: BitState, empties: list[int], ply: int) -> list[tuple[int, list[int]]]:
+        """(square, gives) groups in search order.
+
+        A give that completes an open line loses at once, so those are pruned unless
+        nothing else is left. Squares go PV first, then killers, then by how many of the
+        remaining pieces they make deadly, with the history table breaking ties; gives
+        go PV, killer, then history order.
+        """
+        gives = get_legal_piece_selections(state)
+        remaining = state.remaining
+        piece = state.selected
+        history = self._history
+        preferred = self._killers[ply]
+        if ply < len(self.pv_moves):
+            preferred = [self.pv_moves[ply]] + preferred
+
+        ranked = []
+        for square in empties:
+            safe = remaining & ~deadly_after(state, square, piece)
+            if safe:
+                square_gives = [give for give in gives if safe >> give & 1]
+                threats = remaining.bit_count() - safe.bit_count()
+            else:
+                square_gives = gives[:1]
+                threats = -1
+            base = square << 4
+            square_gives.sort(key=lambda give: history[base | give], reverse=True)
+            # Walk the preferred moves from the back so the first of them ends up in front
+            rank = 0
+            for i in range(len(preferred) - 1, -1, -1):
+                move_square, move_give = preferred[i]
+                if move_square == square:
+                    rank = len(preferred) - i
+                    if move_give in square_gives:
+                        square_gives.remove(move_give)
+                        square_gives.insert(0, move_give)
+            ranked.append(((rank, threats, self._square_history[square]), square, square_gives))
+        ranked.sort(key=lambda item: item[0], reverse=True)
+        return [(square, square_gives) for _, square, square_gives in ranked]
+
+    def _record_cutoff(self, ply: int, depth: int, move: Move) -> None:
+        killers = self._killers[ply]
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
+        bonus = depth * depth
+        square, give = move
+        self._history[square << 4 | give] += bonus
+        self._square_history[square] += bonus
+
+    def negamax(self, state: BitState, depth: int, alpha: int, beta: int, ply: int) -> int:
+        self.nodes += 1
+        if self._limited and self.nodes & 255 == 0:
+            self._check_limits()
+        self._pv[ply] = []
+        stats = self.stats
+        piece = state.selected
+        empties = get_legal_placements(state)
+        for square in empties:
+            if wins_with(state, square, piece):
+                if stats is not None:
+                    stats.win_checks += empties.index(square) + 1
+                return WIN_SCORE - ply
+        if stats is not None:
+            stats.win_checks += len(empties)
+        if not state.remaining:
+            # the held piece is the last one and it does not complete a line
+            return 0
+        key = None
+        if self.tablebase is not None and len(empties) <= self.tablebase.max_empty:
+            key = canonical_key(state)
+            outcome = self.tablebase.probe_key(key)
+            if outcome is not None:
+                if stats is not None:
+                    stats.tablebase_hits += 1
+                return outcome_to_score(outcome, ply)
+        if depth == 0:
+            if stats is not None:
+                stats.evaluations += 1
+            return evaluate(state)
+
+        if key is None:
+            key = canonical_key(state)
+        entry = self.table.probe(key)
+        if stats is not None:
+            if entry is None:
+                stats.tt_misses += 1
+            else:
+                stats.tt_hits += 1
+        if entry is not None and entry.depth >= depth:
+            score = _score_from_table(entry.score, ply)
+            if (
+                entry.flag == EXACT
+                or entry.flag == LOWER_BOUND and score >= beta
+                or entry.flag == UPPER_BOUND and score <= alpha
+            ):
+                if stats is not None:
+                    stats.tt_cutoffs += 1
+                return score
+
+        alpha_orig = alpha
+        best = -INFINITY
+        searched = 0
+        ordered = self._ordered(state, empties, ply)
+        if depth == 1 and self._batches(ordered, len(empties)):
+            best, alpha, searched = self._batch_children(state, ordered, ply, alpha, beta)
+        else:
+            for square, gives in ordered:
+                make_move(state, placement=square)
+                for give in gives:
+                    make_move(state, piece_to_give=give)
+                    score = -self.negamax(state, depth - 1, -beta, -alpha, ply + 1)
+                    unmake_move(state)
+                    searched += 1
+                    if score > best:
+                        best = score
+                        if score > alpha:
+                            alpha = score
+                            self._pv[ply] = [(square, give)] + self._pv[ply + 1]
+                            if alpha >= beta:
+                                self._record_cutoff(ply, depth, (square, give))
+                                break
+                unmake_move(state)
+                if alpha >= beta:
+                    break
+        if stats is not None:
+            stats.expand(ply, searched)
+            if alpha >= beta:
+                stats.cutoffs += 1
+
+        if best <= alpha_orig:
+            flag = UPPER_BOUND
+        elif best >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self.table.store(key, depth, flag, _score_to_table(best, ply))
+        return best
+
+    def _batches(self, ordered: list[tuple[int, list[int]]], empties: int) -> bool:
+        if not self.batch_leaves:
+            return False
+        # Children the tablebase covers are probed one by one instead
+        if self.tablebase is not None and empties - 1 <= self.tablebase.max_empty:
+            return False
+        return sum(len(gives) for _, gives in ordered) >= BATCH_MIN_CHILDREN
+
+    def _batch_children(
+        self,
+        state: BitState,
+        ordered: list[tuple[int, list[int]]],
+        ply: int,
+        alpha: int,
+        beta: int
+    ) -> tuple[int, int, int]:
+        """The child loop of a depth-1 node with every child scored by one batch evaluation.
+
+        A child's own win check and last-piece draw come out of the same features, so
+        scores match what negamax would return for each. They are then walked in search
+        order exactly as the loop does, which keeps cutoffs, the PV and node counts the same.
+        Returns (best, alpha, children searched).
+        """
+        moves = [(square, give) for square, gives in ordered for give in gives]
+        squares = np.array([square for square, _ in moves], dtype=np.intp)
+        gives = np.array([give for _, give in moves], dtype=np.int8)
+        cells = np.repeat(np.array([state.cells], dtype=np.int8), len(moves), axis=0)
+        cells[np.arange(len(moves)), squares] = state.selected
+        remaining = state.remaining & ~(1 << gives.astype(np.int64))
+        features = batch_features(cells, remaining, gives)
+        scores = np.where(
+            features[:, 0] == 1,
+            WIN_SCORE - (ply + 1),
+            np.where(remaining == 0, 0, features @ np.array(WEIGHTS, dtype=np.int64))
+        )
+        if self.stats is not None:
+            self.stats.evaluations += len(moves)
+
+        self._pv[ply + 1] = []
+        best = -INFINITY
+        searched = 0
+        for move, score in zip(moves, (-scores).tolist()):
+            searched += 1
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    self._pv[ply] = [move]
+                    if alpha >= beta:
+                        self._record_cutoff(ply, 1, move)
+                        break
+        nodes = self.nodes
+        self.nodes += searched
+        if self._limited and nodes >> 8 != self.nodes >> 8:
+            self._check_limits()
+        return best, alpha, searched
+
+    def root_moves(self, state: BitState) -> list[Move]:
+        """Legal moves less gives that lose at once (unless every give does), PV move first."""
+        gives = get_legal_piece_selections(state)
+        remaining = state.remaining
+        if state.phase == GamePhase.SELECT_PIECE:
+            safe = remaining & ~deadly_pieces(state)
+            moves = [(EMPTY, give) for give in gives if safe >> give & 1 or not safe]
+        else:
+            moves = []
+            for square in get_legal_placements(state):
+                safe = remaining & ~deadly_after(state, square, state.selected)
+                moves += [(square, give) for give in gives if safe >> give & 1 or not safe]
+        if self.pv_moves and self.pv_moves[0] in moves:
+            moves.remove(self.pv_moves[0])
+            moves.insert(0, self.pv_moves[0])
+        return moves
+
+    def search(self, state: BitState, depth: int) -> SearchResult:
+        """Best move for the player to move in `state`, which is left unchanged."""
+        depth = max(depth, 1)
+        if self.stats is None:
+            return self._search(state, depth)
+        start = time.perf_counter()
+        try:
+            return self._search(state, depth)
+        finally:
+            self.stats.nodes += self.nodes
+            self.stats.iterations.append(IterationStats(depth, self.nodes, time.perf_counter() - start))
+
+    def _search(self, state: BitState, depth: int) -> SearchResult:
+        self.nodes = 1
+        self._root_best = None
+
+        if state.phase == GamePhase.PLACE_PIECE:
+            empties = get_legal_placements(state)
+            for square in empties:
+                if wins_with(state, square, state.selected):
+                    return SearchResult((square, EMPTY), WIN_SCORE, depth, self.nodes, ((square, EMPTY),))
+            if not state.remaining:
+                return SearchResult((empties[0], EMPTY), 0, depth, self.nodes, ((empties[0], EMPTY),))
+
+        if 16 - state.occupied.bit_count() > self.solve_empty:
+            return self._root_search(state, depth)
+        if not self._limited:
+            return self._solve_root(state, depth)
+        # Under a limit the heuristic result comes first, so that running out of time,
+        # nodes or permission while solving still leaves a move to play
+        fallback = self._root_search(state, depth)
+        history_length = len(state.history)
+        try:
+            return self._solve_root(state, depth)
+        except SearchAborted:
+            while len(state.history) > history_length:
+                unmake_move(state)
+            return fallback._replace(nodes=self.nodes)
+
+    def _solve_root(self, state: BitState, depth: int) -> SearchResult:
+        solver = EndgameSolver(self.tablebase)
+        if self._limited:
+            solver.check = lambda: self._check_limits(solver.nodes)
+        try:
+            move, outcome = solver.best_move(state)
+        finally:
+            self.nodes += solver.nodes
+            if self.stats is not None:
+                self.stats.solver_nodes += solver.nodes
+        return SearchResult(move, outcome_to_score(outcome, 0), depth, self.nodes, (move,))
+
+    def _root_search(self, state: BitState, depth: int) -> SearchResult:
+        best_move = None
+        best = -INFINITY
+        pv: tuple[Move, ...] = ()
+        for square, give in self.root_moves(state):
+            if square != EMPTY:
+                make_move(state, placement=square)
+            make_move(state, piece_to_give=give)
+            score = -self.negamax(state, depth - 1, -INFINITY, -best, 1)
+            unmake_move(state)
+            if square != EMPTY:
+                unmake_move(state)
+            if score > best:
+                best = score
+                best_move = (square, give)
+                pv = (best_move,) + tuple(self._pv[1])
+                self._root_best = (best_move, best)
+        return SearchResult(best_move, best, depth, self.nodes, pv)
+
+    def score_move(self, state: BitState, move: Move, depth: int) -> int:
+        """Score of playing `move` in `state` on the same terms search(state, depth) scores
+        its best move: solved exactly where the search hands the root to the solver,
+        otherwise searched `depth` turns deep with a full window. `state` is left unchanged."""
+        depth = max(depth, 1)
+        square, give = move
+        if give == EMPTY:
+            return WIN_SCORE if wins_with(state, square, state.selected) else 0
+        self.nodes = 1
+        solve = 16 - state.occupied.bit_count() <= self.solve_empty
+        if square != EMPTY:
+            make_move(state, placement=square)
+        make_move(state, piece_to_give=give)
+        if solve:
+            solver = EndgameSolver(self.tablebase)
+            score = outcome_to_score(-solver.solve(state), 0)
+            self.nodes += solver.nodes
+        else:
+            score = -self.negamax(state, depth - 1, -INFINITY, INFINITY, 1)
+        unmake_move(state)
+        if square != EMPTY:
+            unmake_move(state)
+        return score
+
+    def iterative_search(
+        self,
+        state: BitState,
+        max_depth: int = MAX_DEPTH,
+        time_limit: Optional[float] = None,
+        node_limit: Optional[int] = None,
+        stop_event: Optional[threading.Event] = None,
+        on_iteration: Optional[Callable[[SearchResult], None]] = None
+    ) -> SearchResult:
+        """Search depth 1, 2, ... until a limit is hit, returning the best move found so far.
+
+        Each iteration tries the previous principal variation first. When a limit
+        interrupts an iteration, its best root move is kept if at least one root move
+        finished (the PV move goes first, so it is never worse than the last complete
+        iteration); `depth` in the result is the last depth searched to completion.
+        """
+        self.deadline = None if time_limit is None else time.monotonic() + time_limit
+        self.node_limit = node_limit
+        self.stop_event = stop_event
+        self._limited = time_limit is not None or node_limit is not None or stop_event is not None
+        self._node_base = 0
+        self.pv_moves = []
+        self.clear_ordering()
+        self.table.new_search()
+        history_length = len(state.history)
+        turns_left = 16 - state.occupied.bit_count()
+
+        result = None
+        try:
+            for depth in range(1, max(max_depth, 1) + 1):
+                try:
+                    current = self.search(state, depth)
+                except SearchAborted:
+                    while len(state.history) > history_length:
+                        unmake_move(state)
+                    self._node_base += self.nodes
+                    if self._root_best is not None:
+                        move, score = self._root_best
+                        completed = 0 if result is None else result.depth
+                        pv = result.pv if result is not None and result.move == move else (move,)
+                        result = SearchResult(move, score, completed, self._node_base, pv)
+                    break
+
+                self._node_base += self.nodes
+                result = current._replace(nodes=self._node_base)
+                self.pv_moves = list(current.pv)
+                if on_iteration is not None:
+                    on_iteration(result)
+                if abs(current.score) >= WIN_THRESHOLD or depth >= turns_left:
+                    break
+                if 16 - state.occupied.bit_count() <= self.solve_empty:
+                    break
+        finally:
+            self.deadline = None
+            self.node_limit = None
+            self.stop_event = None
+            self._limited = False
+
+        if result is None:
+            # Interrupted before any root move finished: fall back to the first legal move
+            move = self.root_moves(state)[0]
+            if state.phase == GamePhase.PLACE_PIECE and not state.remaining:
+                move = (move[0], EMPTY)
+            result = SearchResult(move, 0, 0, self._node_base, (move,))
+        # Counts the work of an iteration cut short before any root move finished, too
+        return result._replace(nodes=self._node_base)
+
+
+def move_to_game(move: Move) -> tuple[Optional[tuple[int, int]], Optional[Piece]]:
+    square, give = move
+    return (
+        None if square == EMPTY else square_coords(square),
+        None if give == EMPTY else bits_to_piece(give)
+    )
+
+_session_table: Optional[TranspositionTable | MappedTranspositionTable] = None
+
+def session_table() -> TranspositionTable | MappedTranspositionTable:
+    """The table think and get_best_move share, so knowledge carries over between moves
+    and games in this process."""
+    global _session_table
+    if _session_table is None:
+        _session_table = TranspositionTable(1 << 20)
+    return _session_table
+
+def open_session_table(path: str | os.PathLike, size: int = 1 << 20) -> MappedTranspositionTable:
+    """Back the session table with a file, which persists it across runs and lets other
+    processes share it."""
+    global _session_table
+    _session_table = MappedTranspositionTable(path, size)
+    return _session_table
+
+def book_result(state: BitState) -> Optional[SearchResult]:
+    """The opening book's move for `state` as a search result, or None when out of book."""
+    book = load_book()
+    if book is None:
+        return None
+    hit = book.lookup(state)
+    if hit is None:
+        return None
+    move, entry = hit
+    return SearchResult(move, entry.score, entry.depth, 0, (move,))
+
+def get_best_move(
+    state: GameState,
+    depth: int,
+    stats: Optional[SearchStats] = None,
+    profile_path: Optional[str] = None
+) -> tuple[Optional[tuple[int, int]], Optional[Piece]]:
+    """(placement, piece_to_give) for the player to move; either half is None when it does not apply.
+
+    `stats` collects search counters; `profile_path` dumps a cProfile of the call there.
+    """
+    bits = BitState.from_game_state(state)
+    booked = book_result(bits)
+    if booked is not None:
+        return move_to_game(booked.move)
+    searcher = Searcher(table=session_table(), tablebase=load_tablebase(), stats=stats)
+    searcher.table.new_search()
+    if profile_path is None:
+        result = searcher.search(bits, depth)
+    else:
+        with profiled(profile_path):
+            result = searcher.search(bits, depth)
+    return move_to_game(result.move)
+
+def think(
+    state: GameState,
+    think_time: Optional[float] = None,
+    node_limit: Optional[int] = None,
+    max_depth: int = MAX_DEPTH,
+    stats: Optional[SearchStats] = None,
+    profile_path: Optional[str] = None
+) -> SearchResult:
+    """Iterative-deepening search within a wall-clock and/or node budget, skipped while
+    the position is in the opening book."""
+    bits = BitState.from_game_state(state)
+    booked = book_result(bits)
+    if booked is not None:
+        return booked
+    searcher = Searcher(table=session_table(), tablebase=load_tablebase(), stats=stats)
+    if profile_path is None:
+        return searcher.iterative_search(bits, max_depth=max_depth, time_limit=think_time, node_limit=node_limit)
+    with profiled(profile_path):
+        return searcher.iterative_search(bits, max_depth=max_depth, time_limit=think_time, node_limit=node_limit)
@@ -0,0 +1,165 @@
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Optional
+
+from src.engine.bitboard import EMPTY, BitState, make_move, wins_with
+from src.engine.models import GamePhase
+from src.strategy.endgame import DEFAULT_TABLEBASE_PATH, Tablebase, sample_positions
+from src.strategy.minimax import INFINITY, Move, SearchResult, Searcher
+from src.strategy.transposition import MappedTranspositionTable
+
+# Per-process state, set up once by _init_worker
+_searcher: Optional[Searcher] = None
+_shared_alpha = None
+
+
+def _init_worker(shared_alpha, tablebase_path: Optional[str], table_path: Optional[str]) -> None:
+    global _searcher, _shared_alpha
+    _shared_alpha = shared_alpha
+    tablebase = Tablebase(tablebase_path) if tablebase_path else None
+    table = MappedTranspositionTable(table_path) if table_path else None
+    _searcher = Searcher(table=table, tablebase=tablebase)
+
+def _search_root_move(packed: bytes, move: Move, depth: int) -> tuple[Move, int, bool, int]:
+    """Score one root move against the best score any worker has proven so far.
+
+    Returns (move, score, exact, nodes); a score that is not exact is only an upper
+    bound, at most the score of a move some worker already finished.
+    """
+    state = BitState.from_bytes(packed)
+    square, give = move
+    if square != EMPTY:
+        make_move(state, placement=square)
+    make_move(state, piece_to_give=give)
+
+    _searcher.nodes = 0
+    alpha = _shared_alpha.value
+    # Anything at or below alpha is only an upper bound, which is all a losing move needs
+    score = -_searcher.negamax(state, depth - 1, -INFINITY, -alpha, 1)
+    exact = score > alpha
+    with _shared_alpha.get_lock():
+        if score > _shared_alpha.value:
+            _shared_alpha.value = score
+    return move, score, exact, _searcher.nodes
+
+
+class ParallelSearcher:
+    """Root-parallel search: each (placement, piece to give) pair at the root is a task.
+
+    Workers keep their own transposition tables between tasks and searches, or all map
+    the file at `table_path` to share one, and share the best root score found so far
+    as the alpha bound for every move they start.
+    Positions cross the process boundary as BitState.to_bytes() rather than pickled
+    pydantic models.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        tablebase_path: Optional[str] = None,
+        table_path: Optional[str] = None
+    ):
+        if tablebase_path is None and DEFAULT_TABLEBASE_PATH.exists():
+            tablebase_path = str(DEFAULT_TABLEBASE_PATH)
+        self.workers = workers or os.cpu_count() or 1
+        self._alpha = multiprocessing.Value("i", -INFINITY)
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self._alpha, tablebase_path, table_path)
+        )
+        # Serial searcher for trivial roots (immediate wins, solver range); with a shared
+        # table it also ages the entries for every worker
+        self._local = Searcher(
+            table=MappedTranspositionTable(table_path) if table_path else None,
+            tablebase=Tablebase(tablebase_path) if tablebase_path else None
+        )
+
+    def __enter__(self) -> "ParallelSearcher":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._pool.shutdown(cancel_futures=True)
+
+    def search(self, state: BitState, depth: int) -> SearchResult:
+        depth = max(depth, 1)
+        empty = 16 - state.occupied.bit_count()
+        if empty <= self._local.solve_empty or state.phase == GamePhase.PLACE_PIECE and (
+            not state.remaining
+            or any(wins_with(state, square, state.selected) for square in range(16) if not state.occupied >> square & 1)
+        ):
+            return self._local.search(state, depth)
+
+        self._alpha.value = -INFINITY
+        self._local.table.new_search()
+        packed = state.to_bytes()
+        futures = [
+            self._pool.submit(_search_root_move, packed, move, depth)
+            for move in self._local.root_moves(state)
+        ]
+
+        best_move = None
+        best = -INFINITY
+        nodes = 1
+        for future in as_completed(futures):
+            move, score, exact, searched = future.result()
+            nodes += searched
+            # Ties go to the lower move so the choice does not depend on completion order
+            if exact and (score > best or score == best and move < best_move):
+                best = score
+                best_move = move
+        return SearchResult(best_move, best, depth, nodes, (best_move,))
+
+
+def compare(state: BitState, depth: int, workers: Optional[int] = None) -> dict:
+    """Time the same fixed-depth search single-threaded and root-parallel."""
+    start = time.perf_counter()
+    serial = Searcher().search(state.copy(), depth)
+    serial_time = time.perf_counter() - start
+
+    with ParallelSearcher(workers=workers) as searcher:
+        # Let the pool start its processes before timing
+        searcher.search(state.copy(), 1)
+        start = time.perf_counter()
+        parallel = searcher.search(state.copy(), depth)
+        parallel_time = time.perf_counter() - start
+        used = searcher.workers
+
+    return {
+        "depth": depth,
+        "workers": used,
+        "serial_seconds": serial_time,
+        "parallel_seconds": parallel_time,
+        "speedup": serial_time / parallel_time if parallel_time else float("inf"),
+        "serial_nodes": serial.nodes,
+        "parallel_nodes": parallel.nodes,
+        "serial_score": serial.score,
+        "parallel_score": parallel.score,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare single-process and root-parallel search.")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--pieces", type=int, default=4, help="pieces already on the board")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    state = sample_positions(1, empty=16 - args.pieces, seed=args.seed)[0]
+    report = compare(state, args.depth, args.workers)
+    print(
+        f"depth {report['depth']}, {report['workers']} workers: "
+        f"serial {report['serial_seconds']:.2f}s ({report['serial_nodes']} nodes), "
+        f"parallel {report['parallel_seconds']:.2f}s ({report['parallel_nodes']} nodes), "
+        f"speedup {report['speedup']:.2f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
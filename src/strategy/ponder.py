@@ -0,0 +1,63 @@
+import threading
+from typing import Optional
+
+from src.engine.bitboard import BitState
+from src.strategy.endgame import load_tablebase
+from src.strategy.minimax import MAX_DEPTH, SearchResult, Searcher, session_table
+
+
+class Ponderer:
+    """Searches on the opponent's time.
+
+    While the opponent decides, a background thread runs an open-ended iterative search
+    of their position: every placement of the piece they hold and every give after it.
+    The positions they can hand back are then already in the searcher's table, which by
+    default is the session table think() uses, when the engine's own turn comes.
+
+    Only one search runs at a time; start() and stop() both cancel the current one and
+    wait for its thread, which checks for cancellation every few hundred nodes.
+    """
+
+    def __init__(self, searcher: Optional[Searcher] = None):
+        if searcher is None:
+            searcher = Searcher(table=session_table(), tablebase=load_tablebase())
+        self.searcher = searcher
+        self.result: Optional[SearchResult] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+
+    @property
+    def active(self) -> bool:
+        return self._thread is not None
+
+    def start(self, state: BitState, max_depth: int = MAX_DEPTH) -> bool:
+        """Ponder `state` until stopped or `max_depth` is searched. Returns False, without
+        starting, when the position is in solver range, where the solver's results are not
+        kept in the table for think() to reuse."""
+        self.stop()
+        self.result = None
+        if 16 - state.occupied.bit_count() <= self.searcher.solve_empty:
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(state.copy(), max_depth), daemon=True)
+        self._thread.start()
+        return True
+
+    def _run(self, state: BitState, max_depth: int) -> None:
+        try:
+            self.result = self.searcher.iterative_search(state, max_depth=max_depth, stop_event=self._stop)
+        except BaseException as error:
+            self._error = error
+
+    def stop(self) -> Optional[SearchResult]:
+        """Cancel pondering; returns the deepest result it reached, if it was running."""
+        if self._thread is None:
+            return None
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+        return self.result
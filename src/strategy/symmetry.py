@@ -0,0 +1,154 @@
+from typing import NamedTuple
+
+from src.engine.bitboard import ATTRIBUTE_BITS, EMPTY, BitState, square_index
+
+# Bit 16 of every mask below stands for the selected piece, so it is canonicalized together
+# with the board (the remaining pieces follow from the two, since the set of 16 is fixed).
+SELECTED_BIT = 1 << 16
+
+
+def _build_board_symmetries() -> tuple[tuple[int, ...], ...]:
+    # The 8 rotations/reflections of the square. With the 2x2 squares counted as lines
+    # these are the only square permutations mapping all 19 lines onto lines: the
+    # row/column permutations that keep rows, columns and diagonals (e.g. swapping the
+    # two middle rows and columns) break up the 2x2 squares.
+    maps = (
+        lambda r, c: (r, c),
+        lambda r, c: (c, 3 - r),
+        lambda r, c: (3 - r, 3 - c),
+        lambda r, c: (3 - c, r),
+        lambda r, c: (r, 3 - c),
+        lambda r, c: (3 - r, c),
+        lambda r, c: (c, r),
+        lambda r, c: (3 - c, 3 - r),
+    )
+    return tuple(
+        tuple(square_index(*f(r, c)) for r in range(4) for c in range(4))
+        for f in maps
+    )
+
+# BOARD_SYMMETRIES[k][square] is the image of square under symmetry k (index 0 is identity)
+BOARD_SYMMETRIES = _build_board_symmetries()
+
+
+def _byte_tables(perm: tuple[int, ...]) -> tuple[tuple[int, ...], tuple[int, ...]]:
+    # Permuting the bits of a 16-bit mask as two 256-entry lookups
+    low = tuple(
+        sum(1 << perm[bit] for bit in range(8) if byte >> bit & 1) for byte in range(256)
+    )
+    high = tuple(
+        sum(1 << perm[bit + 8] for bit in range(8) if byte >> bit & 1) for byte in range(256)
+    )
+    return low, high
+
+_MASK_TABLES = tuple(_byte_tables(perm) for perm in BOARD_SYMMETRIES)
+
+
+def permute_mask(mask: int, symmetry: int) -> int:
+    low, high = _MASK_TABLES[symmetry]
+    return low[mask & 0xFF] | high[mask >> 8 & 0xFF]
+
+def canonical_key(state: BitState) -> int:
+    """Exact key shared by every position equivalent under board and attribute symmetries.
+
+    A position is four attribute columns over the 16 squares plus the selected piece.
+    Attribute permutations reorder the columns and attribute complements flip a column
+    on the occupied squares, so sorting the columns after taking min(column, complement)
+    is a complete invariant for them. The key is the smallest such form over the 8
+    board symmetries, packed into one integer (17 bits for occupancy, 17 per column).
+    """
+    selected = state.selected
+    top, shape, color, height = state.attrs
+    extra = (0, 0, 0, 0)
+    if selected != EMPTY:
+        extra = tuple(SELECTED_BIT if selected & bit else 0 for bit in ATTRIBUTE_BITS)
+    selected_bit = 0 if selected == EMPTY else SELECTED_BIT
+
+    best = -1
+    for low, high in _MASK_TABLES:
+        occupied = low[state.occupied & 0xFF] | high[state.occupied >> 8] | selected_bit
+        columns = []
+        for mask, bit in zip((top, shape, color, height), extra):
+            column = low[mask & 0xFF] | high[mask >> 8] | bit
+            flipped = column ^ occupied
+            columns.append(column if column < flipped else flipped)
+        columns.sort()
+        key = ((((occupied << 17 | columns[0]) << 17 | columns[1]) << 17 | columns[2]) << 17) | columns[3]
+        if best < 0 or key < best:
+            best = key
+    return best
+
+
+# _INVERSE_SYMMETRIES[k][image] is the square that symmetry k maps onto image
+_INVERSE_SYMMETRIES = tuple(
+    tuple(perm.index(square) for square in range(16)) for perm in BOARD_SYMMETRIES
+)
+
+
+class Orientation(NamedTuple):
+    """How a position maps onto its canonical form, the one canonical_key packs.
+
+    Squares move by board symmetry `symmetry`. A piece code has bit i moved to bit
+    `order[i]`, then is xored with `flip`. The same mapping relabels every move and
+    position that follows, so a move found in the canonical form translates back.
+    """
+    key: int
+    symmetry: int
+    order: tuple[int, ...]
+    flip: int
+
+    def square(self, square: int) -> int:
+        return BOARD_SYMMETRIES[self.symmetry][square]
+
+    def piece(self, code: int) -> int:
+        if code == EMPTY:
+            return EMPTY
+        return sum(1 << self.order[bit] for bit in range(4) if code >> bit & 1) ^ self.flip
+
+    def move(self, move: tuple[int, int]) -> tuple[int, int]:
+        square, give = move
+        return (EMPTY if square == EMPTY else self.square(square), self.piece(give))
+
+    def square_back(self, square: int) -> int:
+        return _INVERSE_SYMMETRIES[self.symmetry][square]
+
+    def piece_back(self, code: int) -> int:
+        if code == EMPTY:
+            return EMPTY
+        code ^= self.flip
+        return sum(1 << bit for bit in range(4) if code >> self.order[bit] & 1)
+
+    def move_back(self, move: tuple[int, int]) -> tuple[int, int]:
+        square, give = move
+        return (EMPTY if square == EMPTY else self.square_back(square), self.piece_back(give))
+
+
+def canonical_orientation(state: BitState) -> Orientation:
+    """canonical_key(state) together with the relabeling that reaches it. Slower than
+    canonical_key, which search calls far more often."""
+    selected = state.selected
+    extra = (0, 0, 0, 0)
+    if selected != EMPTY:
+        extra = tuple(SELECTED_BIT if selected & bit else 0 for bit in ATTRIBUTE_BITS)
+    selected_bit = 0 if selected == EMPTY else SELECTED_BIT
+
+    best = None
+    for symmetry, (low, high) in enumerate(_MASK_TABLES):
+        occupied = low[state.occupied & 0xFF] | high[state.occupied >> 8] | selected_bit
+        columns = []
+        for bit, (mask, selected_extra) in enumerate(zip(state.attrs, extra)):
+            column = low[mask & 0xFF] | high[mask >> 8] | selected_extra
+            flipped = column ^ occupied
+            columns.append((flipped, bit, True) if flipped < column else (column, bit, False))
+        columns.sort()
+        key = occupied
+        for column, _, _ in columns:
+            key = key << 17 | column
+        if best is None or key < best.key:
+            order = [0] * 4
+            flip = 0
+            for target, (_, bit, flipped) in enumerate(columns):
+                order[bit] = target
+                flip |= flipped << target
+            best = Orientation(key, symmetry, tuple(order), flip)
+    return best
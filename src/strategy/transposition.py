@@ -0,0 +1,158 @@
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+
+class TableEntry(NamedTuple):
+    key: int
+    depth: int
+    flag: int
+    score: int
+    generation: int = 0
+
+
+class TranspositionTable:
+    """Fixed-size table of search results indexed by canonical position key.
+
+    Each key maps to a single slot. A new entry replaces one searched no deeper, or
+    one for another position stored by an earlier search (see new_search), so memory
+    stays bounded however long the table lives and stale results give way to fresh
+    ones without a shallow re-search discarding what a deeper one found.
+    """
+
+    def __init__(self, size: int = 1 << 18):
+        slots = 1
+        while slots < size:
+            slots <<= 1
+        self.mask = slots - 1
+        self.slots: list[Optional[TableEntry]] = [None] * slots
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return sum(entry is not None for entry in self.slots)
+
+    def new_search(self) -> None:
+        """Mark entries stored so far as old, so they are the first to be replaced."""
+        self.generation = (self.generation + 1) & 0xFF
+
+    def probe(self, key: int) -> Optional[TableEntry]:
+        entry = self.slots[hash(key) & self.mask]
+        if entry is not None and entry.key == key:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def store(self, key: int, depth: int, flag: int, score: int) -> None:
+        index = hash(key) & self.mask
+        entry = self.slots[index]
+        if entry is None or depth >= entry.depth or entry.key != key and entry.generation != self.generation:
+            self.slots[index] = TableEntry(key, depth, flag, score, self.generation)
+
+    def clear(self) -> None:
+        self.slots = [None] * (self.mask + 1)
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+
+# File layout: header, then one 16-byte slot per entry. A slot holds the key xor-ed
+# with its packed data, then the data: depth, flag, score and age. A probe recomputes
+# the key from both halves, so a slot torn by two processes writing it at once reads
+# as a miss instead of a wrong result. Age is the generation plus one; 0 marks an
+# empty slot.
+_MAGIC = b"QTT1"
+_HEADER = struct.Struct("<4sHBxI")  # magic, version, generation, slots
+_GENERATION_OFFSET = 6
+_VERSION = 1
+_KEY_BYTES = 11
+_SLOT = struct.Struct(f"<{_KEY_BYTES}sBBhB")
+_KEY_MASK = (1 << 8 * _KEY_BYTES) - 1
+
+
+def _pack_data(depth: int, flag: int, score: int, age: int) -> int:
+    return depth | flag << 8 | (score & 0xFFFF) << 16 | age << 32
+
+
+class MappedTranspositionTable:
+    """TranspositionTable kept in a fixed-size file mapped into memory.
+
+    The file outlives the process and any number of processes can map it at once;
+    each sees the others' results as soon as they are stored. Without locking,
+    concurrent writers can lose each other's entries but never corrupt one.
+    """
+
+    def __init__(self, path: str | os.PathLike, size: int = 1 << 20):
+        self.path = Path(path)
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            slots = 1
+            while slots < size:
+                slots <<= 1
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, _VERSION, 0, slots))
+                f.truncate(_HEADER.size + slots * _SLOT.size)
+        with open(self.path, "r+b") as f:
+            self._map = mmap.mmap(f.fileno(), 0)
+        magic, version, _, slots = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC or version != _VERSION or len(self._map) != _HEADER.size + slots * _SLOT.size:
+            self._map.close()
+            raise ValueError(f"{self.path} is not a version {_VERSION} transposition table.")
+        self.mask = slots - 1
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        data = self._map
+        return sum(
+            data[offset] != 0
+            for offset in range(_HEADER.size + _SLOT.size - 1, len(data), _SLOT.size)
+        )
+
+    @property
+    def generation(self) -> int:
+        # Kept in the header so every process mapping the file ages entries together
+        return self._map[_GENERATION_OFFSET]
+
+    def new_search(self) -> None:
+        self._map[_GENERATION_OFFSET] = (self.generation + 1) % 255
+
+    def probe(self, key: int) -> Optional[TableEntry]:
+        offset = _HEADER.size + (hash(key) & self.mask) * _SLOT.size
+        check, depth, flag, score, age = _SLOT.unpack_from(self._map, offset)
+        if age and int.from_bytes(check, "little") ^ _pack_data(depth, flag, score, age) == key:
+            self.hits += 1
+            return TableEntry(key, depth, flag, score, age - 1)
+        self.misses += 1
+        return None
+
+    def store(self, key: int, depth: int, flag: int, score: int) -> None:
+        offset = _HEADER.size + (hash(key) & self.mask) * _SLOT.size
+        check, old_depth, old_flag, old_score, age = _SLOT.unpack_from(self._map, offset)
+        if age:
+            old_key = int.from_bytes(check, "little") ^ _pack_data(old_depth, old_flag, old_score, age)
+            if depth < old_depth and (old_key == key or age == self.generation + 1):
+                return
+        age = self.generation + 1
+        check = (key ^ _pack_data(depth, flag, score, age)) & _KEY_MASK
+        _SLOT.pack_into(self._map, offset, check.to_bytes(_KEY_BYTES, "little"), depth, flag, score, age)
+
+    def clear(self) -> None:
+        self._map[_HEADER.size:] = bytes(len(self._map) - _HEADER.size)
+        self._map[_GENERATION_OFFSET] = 0
+        self.hits = 0
+        self.misses = 0
+
+    def flush(self) -> None:
+        self._map.flush()
+
+    def close(self) -> None:
+        self._map.close()
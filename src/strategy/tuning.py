@@ -0,0 +1,194 @@
+import argparse
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple
+
+import numpy as np
+
+from src.engine.bitboard import BitState, make_move
+from src.engine.records import DRAW, UNFINISHED, GameRecord, read_records
+from src.strategy.evaluation import (
+    DEFAULT_WEIGHTS_PATH,
+    FEATURES,
+    WEIGHTS_VERSION,
+    WIN_THRESHOLD,
+    batch_features,
+)
+
+DEFAULT_CHUNK = 1 << 16
+
+# Evaluation points per unit of log-odds: a score of SCORE_SCALE means the player to move
+# is fitted to win e times as often as they lose
+SCORE_SCALE = 100
+
+# Every value each feature can take: can_win 0-1, open threes 0-19 (one per line), and
+# dangerous and safe pieces 0-15 (the held piece is not in the pool)
+_FEATURE_SIZES = (2, 20, 16, 16)
+_BINS = int(np.prod(_FEATURE_SIZES))
+
+
+class TrainingChunk(NamedTuple):
+    cells: np.ndarray
+    remaining: np.ndarray
+    selected: np.ndarray
+    outcomes: np.ndarray  # 1 win, 1/2 draw, 0 loss for the player holding the piece
+
+
+class TunedWeights(NamedTuple):
+    weights: tuple[int, ...]
+    bias: float  # log-odds of the player to move winning when every feature is 0
+    loss: float  # mean log loss of the fitted model over the training positions
+    positions: int
+    games: int
+
+
+def training_chunks(records: Iterable[GameRecord], chunk: int = DEFAULT_CHUNK) -> Iterator[TrainingChunk]:
+    """Every position of finished games where a piece has just been given, paired with how
+    the game ended for the player now holding it, `chunk` positions at a time."""
+    cells: list[list[int]] = []
+    remaining: list[int] = []
+    selected: list[int] = []
+    outcomes: list[float] = []
+    for record in records:
+        if record.result == UNFINISHED:
+            continue
+        state = BitState.initial()
+        for i, ply in enumerate(record.plies):
+            if i % 2:
+                make_move(state, placement=ply)
+                continue
+            make_move(state, piece_to_give=ply)
+            cells.append(state.cells[:])
+            remaining.append(state.remaining)
+            selected.append(state.selected)
+            outcomes.append(0.5 if record.result == DRAW else float(record.result == state.player))
+            if len(outcomes) == chunk:
+                yield _chunk(cells, remaining, selected, outcomes)
+                cells, remaining, selected, outcomes = [], [], [], []
+    if outcomes:
+        yield _chunk(cells, remaining, selected, outcomes)
+
+def _chunk(cells: list, remaining: list, selected: list, outcomes: list) -> TrainingChunk:
+    return TrainingChunk(
+        np.array(cells, dtype=np.int8),
+        np.array(remaining, dtype=np.int64),
+        np.array(selected, dtype=np.int8),
+        np.array(outcomes, dtype=np.float64)
+    )
+
+
+class FeatureHistogram:
+    """Position counts and summed outcomes per distinct feature vector.
+
+    The features take few enough values that the histogram has a fixed size however many
+    positions go into it, and it holds everything the regression needs.
+    """
+
+    def __init__(self):
+        self.counts = np.zeros(_BINS)
+        self.outcomes = np.zeros(_BINS)
+
+    @property
+    def positions(self) -> int:
+        return int(self.counts.sum())
+
+    def add(self, features: np.ndarray, outcomes: np.ndarray) -> None:
+        index = np.ravel_multi_index(features.T, _FEATURE_SIZES)
+        self.counts += np.bincount(index, minlength=_BINS)
+        self.outcomes += np.bincount(index, weights=outcomes, minlength=_BINS)
+
+    def rows(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(features, counts, summed outcomes) of every feature vector seen."""
+        seen = np.flatnonzero(self.counts)
+        features = np.stack(np.unravel_index(seen, _FEATURE_SIZES), axis=1)
+        return features, self.counts[seen], self.outcomes[seen]
+
+
+def fit_logistic(histogram: FeatureHistogram, l2: float = 1.0, iterations: int = 50) -> tuple[np.ndarray, float, float]:
+    """Logistic regression of outcome on features, by Newton's method.
+
+    Returns (weight per feature, bias, mean log loss), in log-odds. The L2 penalty keeps
+    weights finite when a feature all but decides the game, as can_win does.
+    """
+    features, counts, wins = histogram.rows()
+    if not len(counts):
+        raise ValueError("No finished games to fit weights to.")
+    design = np.hstack([features, np.ones((len(features), 1))])
+    penalty = np.diag([l2] * len(FEATURES) + [0.0])
+    theta = np.zeros(design.shape[1])
+    for _ in range(iterations):
+        p = 1 / (1 + np.exp(-(design @ theta)))
+        gradient = design.T @ (counts * p - wins) + penalty @ theta
+        hessian = (design * (counts * p * (1 - p))[:, None]).T @ design + penalty
+        step = np.linalg.lstsq(hessian, gradient, rcond=None)[0]
+        theta -= step
+        if np.abs(step).max() < 1e-9:
+            break
+    p = np.clip(1 / (1 + np.exp(-(design @ theta))), 1e-12, 1 - 1e-12)
+    loss = -(wins * np.log(p) + (counts - wins) * np.log(1 - p)).sum() / counts.sum()
+    return theta[:-1], float(theta[-1]), float(loss)
+
+def to_score_weights(logits: np.ndarray) -> tuple[int, ...]:
+    """Integer evaluation weights for log-odds weights, scaled down if needed so no
+    heuristic score can reach WIN_THRESHOLD."""
+    weights = logits * SCORE_SCALE
+    largest = np.abs(weights) @ (np.array(_FEATURE_SIZES) - 1)
+    if largest >= WIN_THRESHOLD:
+        weights *= (WIN_THRESHOLD - 1) / largest
+    return tuple(int(weight) for weight in np.trunc(weights))
+
+
+def tune(records: Iterable[GameRecord], chunk: int = DEFAULT_CHUNK, l2: float = 1.0) -> TunedWeights:
+    """Fit evaluation weights to the outcomes of `records`, streaming `chunk` positions at a time."""
+    games = 0
+
+    def counted() -> Iterator[GameRecord]:
+        nonlocal games
+        for record in records:
+            games += record.result != UNFINISHED
+            yield record
+
+    histogram = FeatureHistogram()
+    for batch in training_chunks(counted(), chunk):
+        histogram.add(batch_features(batch.cells, batch.remaining, batch.selected), batch.outcomes)
+    logits, bias, loss = fit_logistic(histogram, l2)
+    return TunedWeights(to_score_weights(logits), bias, loss, histogram.positions, games)
+
+def write_weights(path: str | os.PathLike, tuned: TunedWeights, sources: Iterable[str] = ()) -> None:
+    """Write a weights file that evaluation.load_weights reads."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({
+        "version": WEIGHTS_VERSION,
+        "features": list(FEATURES),
+        "weights": list(tuned.weights),
+        "score_scale": SCORE_SCALE,
+        "bias": tuned.bias,
+        "loss": tuned.loss,
+        "positions": tuned.positions,
+        "games": tuned.games,
+        "sources": list(sources),
+        "created": datetime.now(timezone.utc).isoformat(),
+    }, indent=2) + "\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fit evaluation weights to the outcomes of recorded games.")
+    parser.add_argument("games", nargs="+", help="game record files (.qgr)")
+    parser.add_argument("--output", default=str(DEFAULT_WEIGHTS_PATH), help="weights file the evaluator loads")
+    parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK, help="positions featurized per batch")
+    parser.add_argument("--l2", type=float, default=1.0, help="L2 penalty on the weights")
+    args = parser.parse_args()
+
+    records = (record for path in args.games for record in read_records(path))
+    tuned = tune(records, args.chunk, args.l2)
+    write_weights(args.output, tuned, args.games)
+    weights = ", ".join(f"{name}={weight}" for name, weight in zip(FEATURES, tuned.weights))
+    print(f"Fitted {weights} on {tuned.positions} positions from {tuned.games} games (log loss {tuned.loss:.4f})")
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
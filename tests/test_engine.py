@@ -1,14 +1,33 @@
 from itertools import product
+import asyncio
+import json
+import random
 
 import pytest
-from src.engine.models import Piece, Board, GamePhase, GameState
+from src.engine import bitboard, perft, records
+from src.engine.models import Piece, Board, GamePhase, GameState, PIECES, all_pieces, intern_piece, piece_id
 from src.engine.game import (
     get_legal_placements,
     get_legal_piece_selections,
     make_move,
-    check_winner
+    unmake_move,
+    check_winner,
+    placement_wins,
+    LINES,
+    SQUARE_LINES
 )
-from src.interface.cli import piece_to_code, _parse_piece_string, _parse_placement_string
+from src.interface.cli import (
+    piece_to_code,
+    _parse_piece_string,
+    _parse_placement_string,
+    _is_undo,
+    parse_args,
+    game_from_text,
+    game_to_text,
+    export_games,
+    import_games,
+)
+from src.interface.server import EngineServer
 
 class TestGetLegalPlacement:
     def test_legal_placement_empty_board(self):
@@ -226,6 +245,82 @@ class TestMakeMove:
         assert result.current_phase == GamePhase.PLACE_PIECE
         assert current_player != result.current_player
 
+class TestUnmakeMove:
+    def _full_state(self):
+        remaining_pieces = [
+            Piece(height=h, color=c, shape=s, top=t)
+            for h, c, s, t in product([True, False], repeat=4)
+        ]
+        return GameState(
+            board=Board.empty(),
+            remaining_pieces=remaining_pieces,
+            current_phase=GamePhase.SELECT_PIECE,
+            selected_piece=None,
+            current_player=0
+        )
+
+    def test_unmake_move_empty_history(self):
+        with pytest.raises(ValueError, match="No move to undo."):
+            unmake_move(self._full_state())
+        with pytest.raises(ValueError, match="No move to undo."):
+            bitboard.unmake_move(bitboard.BitState.initial())
+
+    def test_unmake_select_restores_piece_order(self):
+        state = self._full_state()
+        before = state.model_copy(deep=True)
+        piece = state.remaining_pieces[5]
+
+        make_move(state, piece_to_give=piece)
+        assert state.history[-1].piece == piece
+        assert state.history[-1].piece_index == 5
+
+        unmake_move(state)
+        assert state == before
+
+    def test_unmake_place_restores_selected_piece(self):
+        state = self._full_state()
+        piece = state.remaining_pieces[0]
+        make_move(state, piece_to_give=piece)
+        before = state.model_copy(deep=True)
+
+        make_move(state, placement=(3, 1))
+        unmake_move(state)
+        assert state == before
+        assert state.selected_piece == piece
+        assert state.board.grid[3][1] is None
+
+    @pytest.mark.parametrize("seed", range(10))
+    def test_unmake_full_game(self, seed):
+        rng = random.Random(seed)
+        state = self._full_state()
+        bits = bitboard.BitState.initial()
+        snapshots = []
+
+        while state.remaining_pieces or state.current_phase == GamePhase.PLACE_PIECE:
+            snapshots.append((state.model_copy(deep=True), bits.copy()))
+            if state.current_phase == GamePhase.SELECT_PIECE:
+                piece = rng.choice(state.remaining_pieces)
+                make_move(state, piece_to_give=piece)
+                bitboard.make_move(bits, piece_to_give=bitboard.piece_to_bits(piece))
+            else:
+                row, col = rng.choice(get_legal_placements(state))
+                make_move(state, placement=(row, col))
+                bitboard.make_move(bits, placement=bitboard.square_index(row, col))
+            assert bits.to_game_state() == state
+            assert bitboard.BitState.from_game_state(state).history == bits.history
+
+        while snapshots:
+            expected_state, expected_bits = snapshots.pop()
+            unmake_move(state)
+            bitboard.unmake_move(bits)
+            assert state == expected_state
+            assert bits.cells == expected_bits.cells
+            assert bits.attrs == expected_bits.attrs
+            assert (bits.occupied, bits.remaining, bits.selected, bits.phase, bits.player) == \
+                (expected_bits.occupied, expected_bits.remaining, expected_bits.selected,
+                 expected_bits.phase, expected_bits.player)
+
+
 class TestCheckWinner:
     def test_check_winner_no_winner_empty_board(self):
         remaining_pieces = [
@@ -422,6 +517,56 @@ class TestCheckWinner:
         assert result == 1-state.current_player
 
 
+class TestPlacementWins:
+    def test_square_lines_index(self):
+        assert len(LINES) == 19
+        assert len(SQUARE_LINES[(0, 0)]) == 4  # row, column, diagonal, one 2x2 square
+        assert len(SQUARE_LINES[(1, 1)]) == 7  # row, column, diagonal, four 2x2 squares
+        for square, masks in enumerate(bitboard.SQUARE_LINE_MASKS):
+            assert len(masks) == len(SQUARE_LINES[bitboard.square_coords(square)])
+
+    def test_placement_wins_only_on_completing_square(self):
+        pieces = [
+            Piece(height=True, color=True, shape=True, top=True),
+            Piece(height=True, color=False, shape=True, top=True),
+            Piece(height=True, color=True, shape=False, top=True),
+            Piece(height=True, color=True, shape=True, top=False)
+        ]
+        board = Board.empty()
+        for i in range(4):
+            board.place(piece=pieces[i], row=2, col=i)
+        state = GameState(
+            board=board,
+            remaining_pieces=[],
+            current_phase=GamePhase.SELECT_PIECE,
+            selected_piece=None,
+            current_player=0
+        )
+
+        assert placement_wins(state, (2, 3))
+        assert not placement_wins(state, (0, 0))
+
+        bits = bitboard.BitState.from_game_state(state)
+        assert bitboard.placement_wins(bits, bitboard.square_index(2, 3))
+        assert not bitboard.placement_wins(bits, bitboard.square_index(0, 0))
+
+    @pytest.mark.parametrize("seed", range(20))
+    def test_placement_wins_matches_check_winner(self, seed):
+        rng = random.Random(seed)
+        bits = bitboard.BitState.initial()
+        while True:
+            bitboard.make_move(bits, piece_to_give=rng.choice(bitboard.get_legal_piece_selections(bits)))
+            square = rng.choice(bitboard.get_legal_placements(bits))
+            bitboard.make_move(bits, placement=square)
+
+            state = bits.to_game_state()
+            won = check_winner(state) is not None
+            assert placement_wins(state, bitboard.square_coords(square)) == won
+            assert bitboard.placement_wins(bits, square) == won
+            if won or not bits.remaining:
+                break
+
+
 class TestCliParsing:
     """Unit tests for CLI helpers: piece_to_code, _parse_piece_string, _parse_placement_string."""
 
@@ -473,9 +618,384 @@ class TestCliParsing:
         assert _parse_placement_string("1,b") is None
         assert _parse_placement_string("a,2") is None
 
+    def test_is_undo(self):
+        assert _is_undo("u")
+        assert _is_undo(" UNDO ")
+        assert not _is_undo("1,2")
+        assert not _is_undo("TLSH")
+
+    def test_parse_args(self):
+        args = parse_args(["--ai", "1", "--think-time", "0.5"])
+        assert args.ai == 1
+        assert args.think_time == 0.5
+        assert parse_args([]).ai is None
+        assert not parse_args([]).stats
+        assert parse_args(["--stats", "--profile", "ai.prof"]).profile == "ai.prof"
+
     def test_parse_placement_string_out_of_range(self):
         assert _parse_placement_string("-1,0") is None
         assert _parse_placement_string("0,-1") is None
         assert _parse_placement_string("4,0") is None
         assert _parse_placement_string("0,4") is None
-        assert _parse_placement_string("5,5") is None
\ No newline at end of file
+        assert _parse_placement_string("5,5") is None
+
+class TestPieceCatalog:
+    def test_catalog_ids(self):
+        assert len(set(PIECES)) == 16
+        for i, piece in enumerate(PIECES):
+            assert piece_id(piece) == i
+        assert piece_id(Piece(height=True, color=False, shape=False, top=True)) == 0b1001
+
+    def test_all_pieces_matches_product_order(self):
+        expected = [
+            Piece(height=h, color=c, shape=s, top=t)
+            for h, c, s, t in product([True, False], repeat=4)
+        ]
+        assert all_pieces() == expected
+        assert all_pieces() is not all_pieces()
+
+    def test_interning(self):
+        piece = Piece(height=True, color=False, shape=True, top=False)
+        assert intern_piece(piece) is PIECES[piece_id(piece)]
+        assert _parse_piece_string("TDSS") is intern_piece(piece)
+        assert bitboard.bits_to_piece(0b1010) is intern_piece(piece)
+
+    def test_remaining_mask_tracks_moves(self):
+        state = GameState(
+            board=Board.empty(),
+            remaining_pieces=all_pieces(),
+            current_phase=GamePhase.SELECT_PIECE,
+            selected_piece=None,
+            current_player=0,
+            remaining_mask=0
+        )
+        assert state.remaining_mask == 0xFFFF
+        piece = PIECES[6]
+        make_move(state, piece_to_give=piece)
+        assert not state.has_remaining(piece)
+        assert state.remaining_mask == 0xFFFF & ~(1 << 6)
+        unmake_move(state)
+        assert state.has_remaining(piece)
+
+    def test_remaining_mask_follows_reassignment(self):
+        state = GameState(
+            board=Board.empty(),
+            remaining_pieces=all_pieces(),
+            current_phase=GamePhase.SELECT_PIECE,
+            selected_piece=None,
+            current_player=0
+        )
+        state.remaining_pieces = [PIECES[1], PIECES[2]]
+        assert state.remaining_mask == 0b110
+        assert "remaining_mask" not in state.model_dump()
+
+
+class TestTrustedConstruction:
+    def _state(self):
+        return GameState(
+            board=Board.empty(),
+            remaining_pieces=all_pieces(),
+            current_phase=GamePhase.SELECT_PIECE,
+            selected_piece=None,
+            current_player=0
+        )
+
+    def test_trusted_equals_validated(self):
+        state = self._state()
+        make_move(state, piece_to_give=PIECES[3])
+        make_move(state, placement=(2, 2))
+        trusted = GameState.trusted(
+            board=Board.trusted([row[:] for row in state.board.grid]),
+            remaining_pieces=state.remaining_pieces[:],
+            current_phase=state.current_phase,
+            selected_piece=state.selected_piece,
+            current_player=state.current_player,
+            history=state.history[:]
+        )
+        assert trusted == state
+        assert trusted.remaining_mask == state.remaining_mask
+
+    def test_fast_copy_is_independent(self):
+        state = self._state()
+        make_move(state, piece_to_give=PIECES[3])
+        copy = state.fast_copy()
+        assert copy == state
+
+        make_move(copy, placement=(0, 1))
+        make_move(copy, piece_to_give=PIECES[4])
+        assert state.board.grid[0][1] is None
+        assert state.has_remaining(PIECES[4])
+        assert len(state.history) == 1
+
+        unmake_move(copy)
+        unmake_move(copy)
+        assert copy == state
+
+
+class TestBitboard:
+    def _full_state(self):
+        remaining_pieces = [
+            Piece(height=h, color=c, shape=s, top=t)
+            for h, c, s, t in product([True, False], repeat=4)
+        ]
+        return GameState(
+            board=Board.empty(),
+            remaining_pieces=remaining_pieces,
+            current_phase=GamePhase.SELECT_PIECE,
+            selected_piece=None,
+            current_player=0
+        )
+
+    def test_piece_bits_roundtrip(self):
+        for code in range(16):
+            assert bitboard.piece_to_bits(bitboard.bits_to_piece(code)) == code
+        assert bitboard.piece_to_bits(Piece(height=True, color=False, shape=False, top=True)) == 0b1001
+
+    def test_line_masks(self):
+        assert len(bitboard.LINE_MASKS) == 19
+        assert all(bin(line).count("1") == 4 for line in bitboard.LINE_MASKS)
+
+    def test_game_state_roundtrip(self):
+        state = self._full_state()
+        make_move(state, piece_to_give=state.remaining_pieces[3])
+        make_move(state, placement=(1, 2))
+
+        result = bitboard.BitState.from_game_state(state).to_game_state()
+        assert result == state
+
+    def test_invalid_moves_match_pydantic_engine(self):
+        bits = bitboard.BitState.initial()
+        with pytest.raises(ValueError, match="Must provide a piece to give during SELECT_PIECE phase."):
+            bitboard.make_move(bits)
+
+        bitboard.make_move(bits, piece_to_give=5)
+        with pytest.raises(ValueError, match="Must provide a placement during PLACE_PIECE phase."):
+            bitboard.make_move(bits)
+
+        bitboard.make_move(bits, placement=0)
+        with pytest.raises(ValueError, match="Piece is not available for selection."):
+            bitboard.make_move(bits, piece_to_give=5)
+
+        bitboard.make_move(bits, piece_to_give=6)
+        with pytest.raises(ValueError, match="Position is already occupied or out of bounds."):
+            bitboard.make_move(bits, placement=0)
+
+    @pytest.mark.parametrize("seed", range(20))
+    def test_random_games_match_pydantic_engine(self, seed):
+        rng = random.Random(seed)
+        state = self._full_state()
+        bits = bitboard.BitState.from_game_state(state)
+
+        while True:
+            placements = get_legal_placements(state)
+            assert [bitboard.square_index(r, c) for r, c in placements] == sorted(bitboard.get_legal_placements(bits))
+            assert sorted(map(bitboard.piece_to_bits, get_legal_piece_selections(state))) == \
+                bitboard.get_legal_piece_selections(bits)
+
+            if state.current_phase == GamePhase.SELECT_PIECE:
+                piece = rng.choice(get_legal_piece_selections(state))
+                make_move(state, piece_to_give=piece)
+                bitboard.make_move(bits, piece_to_give=bitboard.piece_to_bits(piece))
+            else:
+                row, col = rng.choice(placements)
+                make_move(state, placement=(row, col))
+                bitboard.make_move(bits, placement=bitboard.square_index(row, col))
+
+                winner = check_winner(state)
+                assert winner == bitboard.check_winner(bits)
+                if winner is not None or not state.remaining_pieces:
+                    break
+
+            assert bits.to_game_state() == state
+
+
+class TestPerft:
+    def test_start_position_counts(self):
+        state = bitboard.BitState.initial()
+        assert [perft.bitboard_perft(state, depth) for depth in range(1, 4)] == [16, 256, 3840]
+
+    @pytest.mark.parametrize("name", sorted(perft.PERFT_POSITIONS))
+    def test_reference_positions(self, name):
+        depth, expected = min(perft.PERFT_POSITIONS[name][1].items())
+        state = perft.perft_position(name)
+        assert perft.bitboard_perft(state, depth) == expected
+        assert perft.perft(state.to_game_state(), depth) == expected
+
+    def test_state_is_restored(self):
+        state = perft.perft_position("endgame")
+        before = state.to_bytes(), list(state.history)
+        perft.bitboard_perft(state, 3)
+        assert (state.to_bytes(), state.history) == before
+
+
+def random_game(seed: int) -> bitboard.BitState:
+    rng = random.Random(seed)
+    state = bitboard.BitState.initial()
+    while True:
+        bitboard.make_move(state, piece_to_give=rng.choice(bitboard.get_legal_piece_selections(state)))
+        square = rng.choice(bitboard.get_legal_placements(state))
+        bitboard.make_move(state, placement=square)
+        if bitboard.placement_wins(state, square) or not state.remaining:
+            return state
+
+
+class TestGameRecords:
+    def test_record_and_replay(self):
+        for seed in range(20):
+            state = random_game(seed)
+            record = records.record_game(state)
+            assert record.result == (records.DRAW if bitboard.check_winner(state) is None else state.player)
+            assert records.replay(record).to_bytes() == state.to_bytes()
+            assert records.decode(records.encode(record)) == (record, len(records.encode(record)))
+
+    def test_full_game_is_18_bytes(self):
+        plies = []
+        for square in range(16):
+            plies += [square, square]
+        record = records.GameRecord(tuple(plies), records.DRAW)
+        assert len(records.encode(record)) == 18
+
+    def test_unfinished_game(self):
+        state = perft.perft_position("midgame")
+        assert records.record_game(state).result == records.UNFINISHED
+        with pytest.raises(ValueError):
+            records.record_game(bitboard.BitState.from_bytes(state.to_bytes()))
+
+    def test_stream_many_records(self, tmp_path):
+        path = tmp_path / "games.qgr"
+        games = [records.record_game(random_game(seed)) for seed in range(50)] * 200
+        assert records.write_records(path, games[:5000]) == 5000
+        with records.RecordWriter(path) as writer:
+            for record in games[5000:]:
+                writer.write(record)
+        assert path.stat().st_size > 1 << 16
+        assert list(records.read_records(path)) == games
+
+    def test_bad_files(self, tmp_path):
+        path = tmp_path / "games.qgr"
+        path.write_bytes(b"nope")
+        with pytest.raises(ValueError):
+            list(records.read_records(path))
+        records.write_records(path.with_name("ok.qgr"), [records.record_game(random_game(0))])
+        data = path.with_name("ok.qgr").read_bytes()
+        path.write_bytes(data[:-1])
+        with pytest.raises(ValueError):
+            list(records.read_records(path))
+
+    def test_text_round_trip(self, tmp_path):
+        record = records.record_game(random_game(3))
+        text = game_to_text(record)
+        assert text.split()[1].count(",") == 1
+        assert game_from_text(text) == record
+        assert game_from_text(text.lower()) == record
+        path = tmp_path / "games.qgr"
+        assert import_games([text, "", game_to_text(records.record_game(random_game(4)))], path) == 2
+        assert list(export_games(path))[0] == text
+
+    def test_text_errors(self):
+        with pytest.raises(ValueError):
+            game_from_text("XXXX 0,0")
+        with pytest.raises(ValueError):
+            game_from_text("TLSH 5,0")
+        with pytest.raises(ValueError):
+            game_from_text("TLSH 0,0 TLSH")
+
+
+@pytest.fixture(scope="module")
+def engine_server():
+    with EngineServer(workers=2, max_searches=4) as server:
+        yield server
+
+
+def run_session(server: EngineServer, script) -> list[dict]:
+    """Feed requests to one session; a step that is a number waits for that many replies."""
+    replies: list[dict] = []
+
+    async def lines():
+        for step in script:
+            if isinstance(step, int):
+                while len(replies) < step:
+                    await asyncio.sleep(0.01)
+            else:
+                yield json.dumps(step).encode()
+
+    asyncio.run(server.serve(lines(), replies.append))
+    return replies
+
+
+class TestEngineServer:
+    def test_play_and_search(self, engine_server):
+        replies = run_session(engine_server, [
+            {"id": 1, "cmd": "new"},
+            {"id": 2, "cmd": "move", "game": "g1", "moves": "TLSH 0,0 SDRS"},
+            {"id": 3, "cmd": "go", "game": "g1", "depth": 2},
+            3,
+            {"id": 4, "cmd": "stats", "game": "g1"},
+        ])
+        by_id = {reply["id"]: reply for reply in replies}
+        assert by_id[2]["phase"] == "place" and by_id[2]["held"] == "SDRS"
+        best = by_id[3]
+        assert best["ok"] and best["depth"] == 2 and best["pv"][0] == best["move"]
+        assert by_id[4]["moves"] == "TLSH 0,0 SDRS" and not by_id[4]["searching"]
+
+        replies = run_session(engine_server, [
+            {"id": 1, "cmd": "position", "game": "g1", "moves": ""},
+            {"id": 2, "cmd": "new", "game": "x"},
+            {"id": 3, "cmd": "position", "game": "x", "moves": f"TLSH 0,0 SDRS {best['move']}"},
+        ])
+        assert not replies[0]["ok"]
+        assert replies[2]["ok"] and replies[2]["phase"] == "place"
+
+    def test_stop_and_concurrent_games(self, engine_server):
+        replies = run_session(engine_server, [
+            {"id": "slow", "cmd": "new", "game": "a"},
+            {"id": "fast", "cmd": "new", "game": "b"},
+            {"id": "slow", "cmd": "go", "game": "a"},
+            {"id": "fast", "cmd": "go", "game": "b", "depth": 1},
+            3,
+            {"id": "stop", "cmd": "stop", "game": "a"},
+        ])
+        order = [reply["id"] for reply in replies if "move" in reply]
+        assert order == ["fast", "slow"]
+        assert [reply for reply in replies if reply["id"] == "stop"][0]["stopping"]
+
+    def test_game_over_and_errors(self, engine_server):
+        # Player 1 fills the top row with four tall pieces
+        moves = "TLSH 0,0 SDRS 3,0 TDRS 0,1 SLSH 3,2 TLRS 0,2 SDSH 2,1 TDSH 0,3"
+        replies = run_session(engine_server, [
+            "not json",
+            {"cmd": "go", "game": "nope"},
+            {"cmd": "dance"},
+            {"cmd": "new", "game": "w"},
+            {"cmd": "position", "game": "w", "moves": moves},
+            {"cmd": "move", "game": "w", "moves": "SDSS"},
+            {"cmd": "go", "game": "w"},
+            {"cmd": "new", "game": "v"},
+            {"cmd": "go", "game": "v", "time": -1},
+            {"cmd": "move", "game": "v", "moves": "TLSH 5,5"},
+            {"cmd": "stats", "game": "v"},
+            {"cmd": "quit"},
+            {"cmd": "new"},
+        ])
+        assert [reply["ok"] for reply in replies] == [
+            False, False, False, True, True, False, False, True, False, False, True, True
+        ]
+        assert replies[4]["over"] and replies[4]["winner"] == 1
+        assert replies[10]["moves"] == ""
+
+    def test_malformed_fields(self, engine_server):
+        script = [
+            {"cmd": "new", "game": "u"},
+            {"cmd": "stats", "game": ["u"]},
+            {"cmd": "move", "game": {"u": 1}, "moves": "TLSH"},
+            {"cmd": "new", "game": ["v"]},
+            {"cmd": "go", "game": "u", "depth": float("inf")},
+            {"cmd": "go", "game": "u", "nodes": float("nan")},
+            {"cmd": "go", "game": "u", "depth": 1.5},
+            {"cmd": "go", "game": "u", "nodes": "10"},
+            {"cmd": "stats", "game": "u"},
+        ]
+        replies = run_session(engine_server, script)
+        assert [reply["ok"] for reply in replies] == [True, False, False, False, False, False, False, False, True]
+        assert "whole number" in replies[6]["error"]
+        assert not replies[8]["searching"]
@@ -0,0 +1,193 @@
+import asyncio
+import time
+
+import pytest
+from src.engine.bitboard import EMPTY, BitState, make_move
+from src.explanation.cache import ExplanationCache, explanation_key, from_template, to_template
+from src.explanation.generator import StubGenerator, generate
+from src.explanation.prompts import describe_move, describe_piece, explanation_prompt
+from src.interface.server import EngineServer, Game
+from src.knowledge.store import Chunk, KnowledgeIndex
+from src.orchestrator.orchestrator import Orchestrator, strategy_query
+from src.strategy.symmetry import canonical_orientation
+
+NOTES = [
+    Chunk("Count the safe pieces before giving one away; parity decides the endgame.", "endgame.md", "Safe pieces"),
+    Chunk("Spread early placements out so no line gathers three shared attributes.", "opening.md", "Opening play"),
+]
+
+
+@pytest.fixture(scope="module")
+def engine_server():
+    with EngineServer(workers=1, max_searches=4) as server:
+        yield server
+
+
+@pytest.fixture
+def notes_index(tmp_path):
+    with KnowledgeIndex(tmp_path / "index") as index:
+        index.add(NOTES)
+        yield index
+
+
+def position(moves: str) -> BitState:
+    game = Game()
+    game.play(moves)
+    return game.state
+
+
+class TestExplanation:
+    def test_prompt_states_the_facts(self):
+        state = position("TLSH 0,0 SDRS")
+        prompt = explanation_prompt(state, (5, 0b0011), 0, NOTES[:1], "Why there?")
+        assert describe_piece(0b1011) == "tall dark square hollow"
+        assert "  0,0: tall light square hollow" in prompt
+        assert "Piece to place: short dark round solid" in prompt
+        assert "Recommended move: place the held piece on 1,1 and give the short dark square hollow piece" in prompt
+        assert "- Safe pieces: Count the safe pieces" in prompt
+        assert prompt.endswith("Question: Why there?")
+        assert describe_move((EMPTY, 0)) == "give the short dark round solid piece"
+
+    def test_stub_is_deterministic(self):
+        prompt = explanation_prompt(position("TLSH"), (0, 1), 20, NOTES)
+        stub = StubGenerator(first_token_delay=0, token_delay=0)
+        text = asyncio.run(generate(stub, prompt))
+        assert text == asyncio.run(generate(stub, prompt))
+        assert text.startswith("The engine recommends to place the held piece on 0,0")
+        assert "As the notes on safe pieces put it: Count the safe pieces before giving one away; parity decides the endgame." in text
+        assert stub.calls == 2
+
+
+class TestOrchestrator:
+    def test_streams_move_then_explanation(self, engine_server, notes_index):
+        state = position("TLSH 0,0 SDRS")
+        orchestrator = Orchestrator(
+            engine_server, notes_index, StubGenerator(first_token_delay=0.05, token_delay=0), think_time=0.2
+        )
+
+        async def collect():
+            return [update async for update in orchestrator.advise(state, "which piece is safe?")]
+
+        updates = asyncio.run(collect())
+        kinds = [update.kind for update in updates]
+        assert set(kinds[:2]) == {"move", "knowledge"}
+        assert kinds[-1] == "done" and "timeout" not in kinds
+        move = next(update.value for update in updates if update.kind == "move")
+        knowledge = next(update.value for update in updates if update.kind == "knowledge")
+        assert knowledge[0] == NOTES[0]
+        explanation = "".join(update.value for update in updates if update.kind == "token")
+        assert describe_move(move.move) in explanation
+        elapsed = [update.elapsed for update in updates]
+        assert elapsed == sorted(elapsed)
+        timings = updates[-1].value
+        assert timings["search"] < timings["first_token"] <= timings["total"]
+        # The state passed in is left alone
+        assert state.history == position("TLSH 0,0 SDRS").history
+
+    def test_timeouts(self, engine_server):
+        orchestrator = Orchestrator(
+            engine_server,
+            generator=StubGenerator(first_token_delay=0, token_delay=0.2),
+            think_time=60,
+            search_timeout=0.3,
+            explanation_timeout=0.5
+        )
+        state = BitState.initial()
+        make_move(state, piece_to_give=0)
+        start = time.monotonic()
+        advice = asyncio.run(orchestrator.answer(state))
+        assert time.monotonic() - start < 5
+        assert advice.timeouts == ["search", "explanation"]
+        assert advice.result.move[0] in range(16)
+        # Cut off after the first few words
+        assert advice.explanation.startswith("The engine ")
+        assert not advice.explanation.endswith(".")
+
+    def test_rejects_finished_game(self, engine_server):
+        state = position("TLSH 0,0 SDRS 3,0 TDRS 0,1 SLSH 3,2 TLRS 0,2 SDSH 2,1 TDSH 0,3")
+        orchestrator = Orchestrator(engine_server)
+
+        async def collect():
+            return [update async for update in orchestrator.advise(state)]
+
+        with pytest.raises(ValueError):
+            asyncio.run(collect())
+        state = BitState.from_bytes(state.to_bytes())
+        with pytest.raises(ValueError):
+            asyncio.run(collect())
+
+    def test_position_without_history(self, engine_server, tmp_path):
+        state = BitState.from_bytes(position("TLSH 0,0 SDRS").to_bytes())
+        orchestrator = Orchestrator(
+            engine_server, KnowledgeIndex(tmp_path / "index"), StubGenerator(0, 0), think_time=0.1
+        )
+        advice = asyncio.run(orchestrator.answer(state))
+        assert advice.result.move[0] in range(16) and advice.timeouts == []
+
+    def test_strategy_query(self):
+        assert "opening" in strategy_query(BitState.initial())
+        assert strategy_query(position("TLSH"), "why?").endswith("why?")
+
+
+# The first position turned half a turn with every attribute of every piece flipped
+MIRRORED = ("TLSH 0,0 SDRS", "SDRS 3,3 TLSH")
+
+
+class TestExplanationCache:
+    def test_tiers_and_stats(self, tmp_path):
+        path = tmp_path / "explanations.qec"
+        with ExplanationCache(path, capacity=2) as cache:
+            for i in range(3):
+                cache.put(bytes([i]) * 16, {"text": f"entry {i}"}, seconds=1.5)
+            assert cache.get(bytes([2]) * 16) == {"text": "entry 2"}
+            assert cache.get(bytes([0]) * 16) == {"text": "entry 0"}
+            assert cache.get(bytes([9]) * 16) is None
+            stats = cache.stats()
+        assert stats["memory_hits"] == 1 and stats["disk_hits"] == 1 and stats["misses"] == 1
+        assert stats["entries"] == 3 and stats["in_memory"] == 2
+        assert stats["hit_rate"] == 0.667 and stats["saved_seconds"] == 3.0
+
+        # An interrupted write leaves a partial record, which reopening drops
+        with open(path, "ab") as f:
+            f.write(b"\x07" * 20)
+        with ExplanationCache(path) as cache:
+            assert len(cache) == 3
+            assert cache.get(bytes([1]) * 16) == {"text": "entry 1"}
+            cache.put(bytes([3]) * 16, [1, 2], seconds=0.5)
+        with ExplanationCache(path) as cache:
+            assert cache.get(bytes([3]) * 16) == [1, 2]
+
+        (tmp_path / "other").write_bytes(b"something else")
+        with pytest.raises(ValueError):
+            ExplanationCache(tmp_path / "other")
+
+    def test_text_translates_between_orientations(self):
+        first, second = (canonical_orientation(position(moves)) for moves in MIRRORED)
+        assert first.key == second.key
+        text = "Tall light square hollow pieces on 0,1 and 2,2; the short piece is safe."
+        template = to_template(text, first)
+        assert "0,1" not in template and "Tall" not in template
+        assert from_template(template, first) == text
+        assert from_template(template, second) == "Short dark round solid pieces on 3,2 and 1,1; the tall piece is safe."
+        move = (1, 0b0001)
+        assert explanation_key(first, move, "Why 0,1?") == explanation_key(second, second.move_back(first.move(move)), "why 3,2?")
+        assert explanation_key(first, move) != explanation_key(first, move, generator="other")
+
+    def test_orchestrator_answers_symmetric_positions_from_cache(self, engine_server, tmp_path):
+        generator = StubGenerator(first_token_delay=0.05, token_delay=0)
+        empty = KnowledgeIndex(tmp_path / "index")
+        with ExplanationCache(tmp_path / "explanations.qec") as cache:
+            orchestrator = Orchestrator(engine_server, empty, generator, think_time=0.2, cache=cache)
+            fresh = asyncio.run(orchestrator.answer(position(MIRRORED[0])))
+            again = asyncio.run(orchestrator.answer(position(MIRRORED[0])))
+            mirrored = asyncio.run(orchestrator.answer(position(MIRRORED[1])))
+            stats = cache.stats()
+        assert generator.calls == 1
+        assert again.result.move == fresh.result.move and again.explanation == fresh.explanation
+        first, second = (canonical_orientation(position(moves)) for moves in MIRRORED)
+        assert mirrored.result.move == second.move_back(first.move(fresh.result.move))
+        assert mirrored.explanation == asyncio.run(generate(StubGenerator(0, 0), explanation_prompt(
+            position(MIRRORED[1]), mirrored.result.move, mirrored.result.score
+        )))
+        assert stats["misses"] == 2 and stats["memory_hits"] == 4
+        assert stats["saved_seconds"] > 0
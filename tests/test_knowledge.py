@@ -0,0 +1,129 @@
+import math
+import time
+
+import numpy as np
+import pytest
+from src.knowledge.embeddings import HashingEmbedder, embedder_for
+from src.knowledge.retrieval import chunk_text, load_index, retrieve_strategy, source_chunks
+from src.knowledge.store import B, K1, Chunk, KnowledgeIndex, tokenize
+
+CHUNKS = [
+    Chunk("Never give your opponent a piece that completes a line of four shared attributes.", "basics.md", "Giving"),
+    Chunk("In the endgame count the safe pieces left; an odd number of safe gives usually decides it.", "endgame.md", "Parity"),
+    Chunk("Early in the game place pieces away from each other to keep lines open.", "opening.md", "Placement"),
+    Chunk("A line of three tall pieces is dangerous: any tall piece given wins it.", "basics.md", "Threats"),
+    Chunk("Parity of safe pieces is the key endgame idea: force the last safe give onto them.", "endgame.md", "Parity"),
+]
+
+
+class TestKnowledgeIndex:
+    def test_bm25_scores_by_hand(self, tmp_path):
+        with KnowledgeIndex(tmp_path / "index") as index:
+            index.add(CHUNKS)
+            scores = index.bm25_scores("safe pieces")
+
+            lengths = [len(tokenize(f"{c.title}\n{c.text}")) for c in CHUNKS]
+            average = sum(lengths) / len(lengths)
+            expected = []
+            for chunk, length in zip(CHUNKS, lengths):
+                tokens = tokenize(f"{chunk.title}\n{chunk.text}")
+                score = 0.0
+                for term in ("safe", "pieces"):
+                    containing = sum(term in tokenize(f"{c.title}\n{c.text}") for c in CHUNKS)
+                    idf = math.log(1 + (len(CHUNKS) - containing + 0.5) / (containing + 0.5))
+                    tf = tokens.count(term)
+                    score += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / average))
+                expected.append(score)
+            assert np.allclose(scores, expected, rtol=1e-5)
+
+            hits = index.search("safe pieces endgame", k=2)
+            assert [hit.chunk.source for hit in hits] == ["endgame.md", "endgame.md"]
+            assert hits[0].score >= hits[1].score
+            assert index.search("zebra") == []
+
+    def test_add_rebuild_and_reopen(self, tmp_path):
+        path = tmp_path / "index"
+        with KnowledgeIndex(path) as whole:
+            whole.add(CHUNKS)
+            expected = whole.search("tall piece line", k=3)
+
+        split = tmp_path / "split"
+        with KnowledgeIndex(split) as index:
+            assert index.add(CHUNKS[:2]) == 2
+            assert index.add([]) == 0
+            assert index.add(CHUNKS[2:]) == 3
+            assert len(list(split.glob("segment-*"))) == 2
+            assert index.search("tall piece line", k=3) == expected
+
+        with KnowledgeIndex(split) as index:
+            assert len(index) == len(CHUNKS)
+            assert isinstance(index._segments[0].postings, np.memmap)
+            index.rebuild()
+            assert len(list(split.glob("segment-*"))) == 1
+            assert index.search("tall piece line", k=3) == expected
+            assert index.chunk(4) == CHUNKS[4]
+            with pytest.raises(ValueError):
+                index.chunk(5)
+
+    def test_hybrid_search_with_embeddings(self, tmp_path):
+        path = tmp_path / "index"
+        with KnowledgeIndex(path, HashingEmbedder(64)) as index:
+            index.add(CHUNKS)
+            hits = index.search("parity of safe pieces", k=3)
+            assert hits[0].chunk == CHUNKS[4]
+            assert all(0 < hit.score <= 1 for hit in hits)
+
+        # The built-in embedder is found from the manifest; another is refused
+        with KnowledgeIndex(path) as index:
+            assert index.embedder.name == "hashing-64"
+            index.add(CHUNKS[:1])
+            assert index.search("parity of safe pieces", k=1)[0].chunk == CHUNKS[4]
+        with pytest.raises(ValueError):
+            KnowledgeIndex(path, HashingEmbedder(32))
+
+    def test_embedder_is_deterministic_and_normalized(self):
+        embedder = HashingEmbedder(128)
+        vectors = embedder.embed(["safe pieces", "safe pieces", ""])
+        assert vectors.shape == (3, 128) and vectors.dtype == np.float32
+        assert np.allclose(vectors[0], vectors[1])
+        assert np.isclose(np.linalg.norm(vectors[0]), 1)
+        assert not vectors[2].any()
+        assert embedder_for("hashing-128").name == "hashing-128"
+        assert embedder_for("some-model") is None
+
+    def test_query_latency(self, tmp_path):
+        rng = np.random.default_rng(7)
+        words = [f"term{i}" for i in range(2000)]
+        chunks = [Chunk(" ".join(rng.choice(words, 80))) for _ in range(5000)]
+        with KnowledgeIndex(tmp_path / "index", HashingEmbedder()) as index:
+            index.add(chunks)
+            index.search("term1 term2 term3")
+            start = time.perf_counter()
+            for i in range(20):
+                index.search(f"term{i} term{i + 100} term{i + 200}")
+            assert (time.perf_counter() - start) / 20 < 0.05
+
+
+class TestRetrieval:
+    def test_chunk_text(self):
+        text = "# Openings\n\nFirst idea\nspans lines.\n\nSecond idea.\n\n## Endgame ##\n\n" + "word " * 150
+        chunks = list(chunk_text(text, "guide.md", max_words=5))
+        assert chunks[0] == Chunk("First idea spans lines.", "guide.md", "Openings")
+        assert chunks[1] == Chunk("Second idea.", "guide.md", "Openings")
+        assert chunks[2].title == "Endgame" and len(chunks[2].text.split()) == 150
+        assert len(list(chunk_text(text, max_words=100))) == 2
+
+    def test_retrieve_strategy(self, tmp_path):
+        sources = tmp_path / "processed"
+        sources.mkdir()
+        (sources / "endgame.md").write_text("# Parity\n\nCount the safe pieces before giving.\n")
+        (sources / "notes.json").write_text("{}")
+        index_path = tmp_path / "index"
+        assert load_index(index_path) is None
+        with KnowledgeIndex(index_path) as index:
+            index.add(source_chunks(sources))
+        index = load_index(index_path)
+        assert retrieve_strategy("how many safe pieces", index=index) == [
+            Chunk("Count the safe pieces before giving.", "endgame.md", "Parity")
+        ]
+        index.close()
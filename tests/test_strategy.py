@@ -0,0 +1,869 @@
+from itertools import permutations
+import json
+import random
+import threading
+import time
+
+import numpy as np
+import pytest
+from src.engine import bitboard
+from src.engine.bitboard import BitState, EMPTY, LINE_MASKS, square_index
+from src.engine.models import GamePhase, Piece
+from src.engine.records import UNFINISHED, GameRecord, read_records, record_game, replay, write_records
+from src.strategy import book as book_module
+from src.strategy.analysis import AnalysisCache, analyze_file, game_positions
+from src.strategy import arena
+from src.strategy.arena import Player, opening, parse_player, play_game, run_arena, summarize
+from src.strategy.book import BookEntry, OpeningBook, book_positions, build_book, child_key, turn_moves
+from src.strategy.endgame import (
+    DRAW,
+    LOSS,
+    WIN,
+    EndgameSolver,
+    Tablebase,
+    build_tablebase,
+    sample_positions,
+    write_tablebase,
+)
+from src.strategy.evaluation import (
+    WIN_SCORE,
+    batch_features,
+    completes_three,
+    deadly_after,
+    deadly_pieces,
+    evaluate,
+    evaluate_batch,
+    features,
+    load_weights,
+    open_threes,
+    position_arrays,
+)
+from src.strategy.instrumentation import SearchStats, profiled
+from src.strategy.minimax import Searcher, get_best_move, think
+from src.strategy.mcts import MCTS, get_mcts_move, random_playouts
+from src.strategy.parallel import ParallelSearcher, compare
+from src.strategy.ponder import Ponderer
+from src.strategy.symmetry import BOARD_SYMMETRIES, canonical_key, canonical_orientation, permute_mask
+from src.strategy.tuning import FeatureHistogram, fit_logistic, to_score_weights, training_chunks, tune, write_weights
+from src.strategy.transposition import EXACT, LOWER_BOUND, MappedTranspositionTable, TranspositionTable
+
+
+def _safe_gives(state: BitState) -> list[int]:
+    gives = bitboard.get_legal_piece_selections(state)
+    empties = bitboard.get_legal_placements(state)
+    safe = [g for g in gives if not any(bitboard.wins_with(state, s, g) for s in empties)]
+    return safe or gives
+
+def random_position(seed: int, turns: int) -> BitState:
+    """Play `turns` random place+give turns from the start, avoiding wins and winning gives
+    where possible."""
+    rng = random.Random(seed)
+    state = BitState.initial()
+    bitboard.make_move(state, piece_to_give=rng.choice(bitboard.get_legal_piece_selections(state)))
+    for _ in range(turns):
+        squares = [
+            square for square in bitboard.get_legal_placements(state)
+            if not bitboard.wins_with(state, square, state.selected)
+        ]
+        bitboard.make_move(state, placement=rng.choice(squares))
+        bitboard.make_move(state, piece_to_give=rng.choice(_safe_gives(state)))
+    return state
+
+def transform(state: BitState, symmetry: int, order: tuple[int, ...], flip: int) -> BitState:
+    """Apply a board symmetry, then permute attribute bits by `order` and xor with `flip`."""
+    def relabel(code: int) -> int:
+        if code == EMPTY:
+            return EMPTY
+        moved = sum(1 << order[bit] for bit in range(4) if code >> bit & 1)
+        return moved ^ flip
+
+    cells = [EMPTY] * 16
+    for square, code in enumerate(state.cells):
+        cells[BOARD_SYMMETRIES[symmetry][square]] = relabel(code)
+    remaining = sum(1 << relabel(code) for code in range(16) if state.remaining >> code & 1)
+    return BitState(
+        cells=cells,
+        remaining=remaining,
+        phase=state.phase,
+        selected=relabel(state.selected),
+        player=state.player
+    )
+
+def reference_negamax(state: BitState, depth: int, ply: int = 0) -> int:
+    """Plain negamax without pruning or table, mirroring Searcher.negamax scoring."""
+    empties = bitboard.get_legal_placements(state)
+    for square in empties:
+        if bitboard.wins_with(state, square, state.selected):
+            return WIN_SCORE - ply
+    if not state.remaining:
+        return 0
+    if depth == 0:
+        return evaluate(state)
+    best = -WIN_SCORE - 1
+    for square in empties:
+        bitboard.make_move(state, placement=square)
+        for give in bitboard.get_legal_piece_selections(state):
+            bitboard.make_move(state, piece_to_give=give)
+            best = max(best, -reference_negamax(state, depth - 1, ply + 1))
+            bitboard.unmake_move(state)
+        bitboard.unmake_move(state)
+    return best
+
+def reference_outcome(state: BitState) -> int:
+    """Exhaustive win/draw/loss for the player holding state.selected."""
+    empties = bitboard.get_legal_placements(state)
+    if any(bitboard.wins_with(state, square, state.selected) for square in empties):
+        return WIN
+    if not state.remaining:
+        return DRAW
+    best = LOSS
+    for square in empties:
+        bitboard.make_move(state, placement=square)
+        for give in bitboard.get_legal_piece_selections(state):
+            bitboard.make_move(state, piece_to_give=give)
+            best = max(best, -reference_outcome(state))
+            bitboard.unmake_move(state)
+        bitboard.unmake_move(state)
+    return best
+
+
+class TestSymmetry:
+    def test_board_symmetries_preserve_lines(self):
+        assert len(BOARD_SYMMETRIES) == 8
+        lines = set(LINE_MASKS)
+        for symmetry in range(8):
+            assert {permute_mask(line, symmetry) for line in LINE_MASKS} == lines
+
+    @pytest.mark.parametrize("seed", range(5))
+    def test_canonical_key_invariant(self, seed):
+        state = random_position(seed, turns=6)
+        key = canonical_key(state)
+        rng = random.Random(seed)
+        for symmetry in range(8):
+            order = tuple(rng.sample(range(4), 4))
+            flip = rng.randrange(16)
+            assert canonical_key(transform(state, symmetry, order, flip)) == key
+
+    @pytest.mark.parametrize("seed", range(5))
+    def test_canonical_orientation(self, seed):
+        state = random_position(seed, turns=2 * seed)
+        rng = random.Random(seed)
+        other = transform(state, rng.randrange(8), tuple(rng.sample(range(4), 4)), rng.randrange(16))
+        mine, theirs = canonical_orientation(state), canonical_orientation(other)
+        assert mine.key == theirs.key == canonical_key(state)
+        # Both relabel onto the same position, so moves translate between them
+        canonical = transform(state, mine.symmetry, mine.order, mine.flip)
+        assert canonical.cells == transform(other, theirs.symmetry, theirs.order, theirs.flip).cells
+        for move in turn_moves(state)[:10]:
+            assert mine.move_back(mine.move(move)) == move
+            assert child_key(other, theirs.move_back(mine.move(move))) == child_key(state, move)
+
+    def test_canonical_key_separates_positions(self):
+        state = random_position(0, turns=6)
+        other = state.copy()
+        bitboard.make_move(other, placement=bitboard.get_legal_placements(other)[0])
+        assert canonical_key(state) != canonical_key(other)
+
+    def test_canonical_key_collapses_first_turn(self):
+        keys = set()
+        raw = set()
+        for first in range(16):
+            for square in range(16):
+                for give in range(16):
+                    if give == first:
+                        continue
+                    state = BitState.initial()
+                    bitboard.make_move(state, piece_to_give=first)
+                    bitboard.make_move(state, placement=square)
+                    bitboard.make_move(state, piece_to_give=give)
+                    raw.add((tuple(state.cells), state.selected))
+                    keys.add(canonical_key(state))
+        assert len(raw) == 3840
+        # 3 square classes times 4 classes of (placed, held) attribute differences
+        assert len(keys) == 12
+
+
+class TestTranspositionTable:
+    def test_store_and_probe(self):
+        table = TranspositionTable(size=16)
+        table.store(key=12345, depth=2, flag=EXACT, score=7)
+        entry = table.probe(12345)
+        assert entry is not None and entry.score == 7 and entry.depth == 2
+        assert table.probe(999) is None
+        assert (table.hits, table.misses) == (1, 1)
+
+    def test_depth_preferred_replacement(self):
+        table = TranspositionTable(size=1)
+        table.store(key=1, depth=5, flag=EXACT, score=1)
+        table.store(key=2, depth=3, flag=EXACT, score=2)
+        assert table.probe(1) is not None
+        table.store(key=2, depth=6, flag=EXACT, score=2)
+        assert table.probe(1) is None
+        assert table.probe(2).score == 2
+
+    def test_aging_replacement(self):
+        table = TranspositionTable(size=1)
+        table.store(key=1, depth=5, flag=EXACT, score=1)
+        table.new_search()
+        table.store(key=2, depth=1, flag=EXACT, score=2)
+        assert table.probe(1) is None
+        assert table.probe(2).generation == 1
+
+    def test_mapped_table(self, tmp_path):
+        path = tmp_path / "search.qtt"
+        table = MappedTranspositionTable(path, size=16)
+        key = canonical_key(random_position(0, turns=5))
+        table.store(key, depth=3, flag=LOWER_BOUND, score=-9990)
+        assert table.probe(key) == (key, 3, LOWER_BOUND, -9990, 0)
+        assert table.probe(key + 1) is None
+        assert len(table) == 1
+
+        other = MappedTranspositionTable(path)
+        assert other.probe(key).score == -9990
+        other.new_search()
+        assert table.generation == 1
+        table.close()
+        other.close()
+        assert MappedTranspositionTable(path).probe(key).depth == 3
+
+    def test_mapped_table_replacement_and_torn_slots(self, tmp_path):
+        table = MappedTranspositionTable(tmp_path / "search.qtt", size=1)
+        table.store(key=1, depth=5, flag=EXACT, score=1)
+        table.store(key=2, depth=3, flag=EXACT, score=2)
+        assert table.probe(1) is not None
+        table.new_search()
+        table.store(key=2, depth=3, flag=EXACT, score=2)
+        assert table.probe(1) is None and table.probe(2) is not None
+        # A slot whose data no longer matches its check bytes reads as a miss
+        table._map[-2] ^= 0xFF
+        assert table.probe(2) is None
+        table.clear()
+        assert len(table) == 0
+
+    def test_rejects_other_files(self, tmp_path):
+        path = tmp_path / "not-a-table"
+        path.write_bytes(b"hello world, this is not a table")
+        with pytest.raises(ValueError):
+            MappedTranspositionTable(path)
+
+    def test_research_reuses_table(self):
+        state = random_position(9, turns=4)
+        searcher = Searcher()
+        first = searcher.iterative_search(state, max_depth=3)
+        again = searcher.iterative_search(state, max_depth=3)
+        assert again.score == first.score
+        assert again.nodes < first.nodes
+
+    def test_search_with_mapped_table_matches(self, tmp_path):
+        state = random_position(10, turns=5)
+        table = MappedTranspositionTable(tmp_path / "search.qtt", size=1 << 12)
+        assert Searcher(table=table).search(state, 3).score == Searcher().search(state, 3).score
+
+
+class TestEvaluation:
+    def test_open_threes(self):
+        state = BitState.initial()
+        for col, code in enumerate((0b1111, 0b1011, 0b1101)):
+            state.cells[square_index(0, col)] = code
+        state = BitState(cells=state.cells, remaining=0, phase=GamePhase.SELECT_PIECE)
+        assert open_threes(state) == [(square_index(0, 3), 0b1001, 0)]
+
+    def test_deadly_pieces_match_open_threes(self):
+        for seed in range(20):
+            state = random_position(seed, turns=6)
+            threes = open_threes(state)
+            expected = sum(1 << code for code in range(16) if completes_three(code, threes))
+            assert deadly_pieces(state) == expected
+            for square in bitboard.get_legal_placements(state):
+                after = deadly_after(state, square, state.selected)
+                bitboard.make_move(state, placement=square)
+                assert after == deadly_pieces(state)
+                bitboard.unmake_move(state)
+
+    def test_batch_matches_scalar(self):
+        cells = BitState.initial().cells
+        for col, code in enumerate((0b1111, 0b1011, 0b1101)):
+            cells[col] = code
+        # The held piece wins with nothing left to give, and a draw-bound last piece
+        states = [
+            BitState.initial(),
+            BitState(cells=cells[:], remaining=0, phase=GamePhase.PLACE_PIECE, selected=0b1001),
+            BitState(cells=cells[:], remaining=0, phase=GamePhase.PLACE_PIECE, selected=0b0110),
+        ]
+        for seed in range(60):
+            state = random_position(seed, turns=seed % 11)
+            states.append(state.copy())
+            # Every child of a node, including the select-phase states in between
+            for square in bitboard.get_legal_placements(state)[:3]:
+                bitboard.make_move(state, placement=square)
+                states.append(state.copy())
+                for give in bitboard.get_legal_piece_selections(state):
+                    bitboard.make_move(state, piece_to_give=give)
+                    states.append(state.copy())
+                    bitboard.unmake_move(state)
+                bitboard.unmake_move(state)
+        arrays = position_arrays(states)
+        assert [tuple(row) for row in batch_features(*arrays).tolist()] == [features(s) for s in states]
+        assert evaluate_batch(*arrays).tolist() == [evaluate(s) for s in states]
+        assert len(evaluate_batch(*position_arrays([]))) == 0
+
+    def test_batched_leaves_search_identically(self):
+        for seed, turns in ((1, 3), (2, 5), (9, 4), (5, 7)):
+            state = random_position(seed, turns)
+            batched = Searcher().search(state, depth=3)
+            assert batched == Searcher(batch_leaves=False).search(state, depth=3)
+
+
+class TestSearch:
+    def test_takes_immediate_win(self):
+        tall = [Piece(height=True, color=c, shape=s, top=False) for c in (True, False) for s in (True, False)]
+        state = random_position(0, 0).to_game_state()
+        state.board = state.board.empty()
+        for col in range(3):
+            state.board.place(tall[col], 1, col)
+        state.remaining_pieces = [p for p in state.remaining_pieces if p not in tall]
+        state.selected_piece = tall[3]
+        state.current_phase = GamePhase.PLACE_PIECE
+
+        placement, piece = get_best_move(state, depth=2)
+        assert placement == (1, 3)
+        assert piece is None
+
+    def test_avoids_giving_winning_piece(self):
+        state = BitState.initial()
+        for col, code in enumerate((0b1000, 0b1001, 0b1010)):
+            state.cells[square_index(0, col)] = code
+        remaining = bitboard.ALL_PIECES & ~0b10111 & ~(1 << 0b1000) & ~(1 << 0b1001) & ~(1 << 0b1010)
+        state = BitState(cells=state.cells, remaining=remaining, phase=GamePhase.PLACE_PIECE, selected=0b0100)
+
+        result = Searcher().search(state, depth=1)
+        square, give = result.move
+        bitboard.make_move(state, placement=square)
+        assert not any(bitboard.wins_with(state, s, give) for s in bitboard.get_legal_placements(state))
+
+    @pytest.mark.parametrize("seed", range(4))
+    def test_matches_plain_negamax(self, seed):
+        state = random_position(seed, turns=6)
+        expected = reference_negamax(state.copy(), depth=2)
+        result = Searcher().search(state, depth=2)
+        assert result.score == expected
+        assert state.history == random_position(seed, turns=6).history
+
+    def test_table_reused_between_searches(self):
+        state = random_position(1, turns=6)
+        searcher = Searcher()
+        first = searcher.search(state, depth=3)
+        second = searcher.search(state, depth=3)
+        assert second.score == first.score
+        assert searcher.table.hits > 0
+        assert second.nodes < first.nodes
+
+    def test_root_moves_prune_losing_gives(self):
+        state = random_position(3, turns=6)
+        moves = Searcher().root_moves(state)
+        for square, give in moves:
+            bitboard.make_move(state, placement=square)
+            deadly = deadly_pieces(state)
+            safe = state.remaining & ~deadly
+            assert not deadly >> give & 1 or not safe
+            bitboard.unmake_move(state)
+        assert len(moves) < len(bitboard.get_legal_placements(state)) * len(bitboard.get_legal_piece_selections(state))
+
+    def test_killers_and_history_are_recorded(self):
+        searcher = Searcher()
+        searcher.iterative_search(random_position(2, turns=4), max_depth=3)
+        assert any(searcher._killers)
+        assert sum(searcher._history) > 0
+        searcher.clear_ordering()
+        assert not any(searcher._killers) and not any(searcher._history)
+
+
+class TestEndgame:
+    def test_solver_matches_exhaustive_search(self):
+        outcomes = set()
+        for state in sample_positions(12, empty=5, seed=0):
+            expected = reference_outcome(state.copy())
+            assert EndgameSolver().solve(state) == expected
+            outcomes.add(expected)
+        assert len(outcomes) > 1
+
+    def test_best_move_achieves_outcome(self):
+        for state in sample_positions(5, empty=6, seed=1):
+            solver = EndgameSolver()
+            (square, give), outcome = solver.best_move(state)
+            assert outcome == solver.solve(state)
+            bitboard.make_move(state, placement=square)
+            if give != EMPTY:
+                bitboard.make_move(state, piece_to_give=give)
+                assert -EndgameSolver().solve(state) == outcome
+
+    def test_tablebase_roundtrip(self, tmp_path):
+        path = tmp_path / "endgame.qtb"
+        positions = sample_positions(6, empty=7, seed=2)
+        entries = build_tablebase(path, [p.copy() for p in positions], max_empty=7)
+
+        tablebase = Tablebase(path)
+        try:
+            assert len(tablebase) == entries > 0
+            assert tablebase.max_empty == 7
+            for state in positions:
+                assert tablebase.probe(state) == EndgameSolver().solve(state)
+            assert tablebase.probe(random_position(0, turns=2)) is None
+        finally:
+            tablebase.close()
+
+    def test_tablebase_probe_select_phase(self, tmp_path):
+        path = tmp_path / "endgame.qtb"
+        state = sample_positions(1, empty=6, seed=3)[0]
+        build_tablebase(path, [state.copy()], max_empty=6)
+        tablebase = Tablebase(path)
+        try:
+            square = next(s for s in bitboard.get_legal_placements(state)
+                          if not bitboard.wins_with(state, s, state.selected))
+            bitboard.make_move(state, placement=square)
+            outcome = tablebase.probe(state)
+            if outcome is not None:
+                assert outcome == max(
+                    -EndgameSolver().solve(bitboard.make_move(state.copy(), piece_to_give=g))
+                    for g in bitboard.get_legal_piece_selections(state)
+                )
+        finally:
+            tablebase.close()
+
+    def test_rejects_foreign_file(self, tmp_path):
+        path = tmp_path / "bogus.qtb"
+        path.write_bytes(b"not a tablebase at all")
+        with pytest.raises(ValueError, match="is not a version 1 tablebase"):
+            Tablebase(path)
+
+    def test_search_uses_tablebase(self, tmp_path):
+        path = tmp_path / "endgame.qtb"
+        state = sample_positions(1, empty=8, seed=4)[0]
+        solver = EndgameSolver()
+        solver.solve(state.copy())
+        write_tablebase(path, solver.results, max_empty=8)
+
+        outcome = EndgameSolver().solve(state.copy())
+        tablebase = Tablebase(path)
+        try:
+            # one turn of lookahead is enough once every reply is in the table
+            result = Searcher(tablebase=tablebase, solve_empty=0).search(state, depth=1)
+            assert (result.score > 0, result.score < 0) == (outcome == WIN, outcome == LOSS)
+        finally:
+            tablebase.close()
+
+    def test_search_plays_perfectly_when_sparse(self):
+        state = sample_positions(1, empty=6, seed=5)[0]
+        result = Searcher().search(state, depth=1)
+        _, outcome = EndgameSolver().best_move(state)
+        assert (result.score > 0) == (outcome == WIN)
+        assert (result.score < 0) == (outcome == LOSS)
+
+
+class TestIterativeDeepening:
+    def test_reaches_fixed_depth_result(self):
+        state = random_position(1, turns=6)
+        result = Searcher().iterative_search(state, max_depth=3)
+        assert result.depth == 3
+        assert result.score == Searcher().search(state, depth=3).score
+        assert result.pv[0] == result.move
+
+    def test_node_limit_interrupts_and_restores_state(self):
+        state = random_position(2, turns=4)
+        before = (state.cells[:], state.remaining, state.selected, state.history[:])
+        result = Searcher().iterative_search(state, node_limit=3000)
+        assert result.move in Searcher().root_moves(state)
+        assert result.nodes < 3000 + 256
+        assert (state.cells, state.remaining, state.selected, state.history) == before
+
+    def test_nodes_include_an_iteration_cut_short(self):
+        # The limit hits the third iteration before its first root move finishes
+        stats = SearchStats()
+        result = Searcher(stats=stats).iterative_search(random_position(0, turns=4), node_limit=500)
+        assert result.depth == 2
+        assert result.nodes == stats.nodes > sum(iteration.nodes for iteration in stats.iterations[:2])
+
+    def test_time_limit(self):
+        state = random_position(0, turns=2)
+        start = time.monotonic()
+        result = Searcher().iterative_search(state, time_limit=0.3)
+        assert time.monotonic() - start < 1.0
+        assert result.depth >= 1
+
+    def test_stop_event_before_start_returns_legal_move(self):
+        stop = threading.Event()
+        stop.set()
+        state = random_position(3, turns=3)
+        result = Searcher().iterative_search(state, stop_event=stop)
+        assert result.move in Searcher().root_moves(state)
+
+    def test_limits_cut_the_endgame_solver_short(self):
+        # Solving this eight-empty position takes about 9000 solver nodes
+        state = random_position(7, turns=8)
+        before = (state.cells[:], state.remaining, state.selected, state.history[:])
+        exact = Searcher().iterative_search(state)
+        result = Searcher().iterative_search(state, node_limit=2000)
+        assert result.nodes < 2000 + 256 and exact.nodes > result.nodes
+        assert result.move in Searcher().root_moves(state) and result.depth == 1
+        assert result.score == Searcher(solve_empty=0).search(state, depth=1).score
+        stop = threading.Event()
+        stop.set()
+        assert Searcher().iterative_search(state, stop_event=stop).move in Searcher().root_moves(state)
+        assert (state.cells, state.remaining, state.selected, state.history) == before
+
+    def test_reports_each_iteration(self):
+        depths = []
+        Searcher().iterative_search(random_position(1, turns=6), max_depth=3,
+                                    on_iteration=lambda r: depths.append(r.depth))
+        assert depths == [1, 2, 3]
+
+    def test_think_on_game_state(self):
+        state = random_position(4, turns=5).to_game_state()
+        result = think(state, node_limit=2000)
+        assert result.move is not None
+
+
+class TestPonder:
+    def test_stop_is_prompt_and_leaves_state_alone(self):
+        state = random_position(5, turns=4)
+        before = (state.cells[:], state.remaining, state.selected, state.history[:])
+        ponderer = Ponderer(Searcher())
+        assert ponderer.start(state)
+        time.sleep(0.2)
+        start = time.monotonic()
+        result = ponderer.stop()
+        assert time.monotonic() - start < 0.5
+        assert not ponderer.active
+        assert result.move in Searcher().root_moves(state)
+        assert len(ponderer.searcher.table) > 0
+        assert (state.cells, state.remaining, state.selected, state.history) == before
+        assert ponderer.stop() is None
+
+    def test_warms_the_replies(self):
+        state = random_position(5, turns=4)
+        ponderer = Ponderer(Searcher())
+        ponderer.start(state, max_depth=4)
+        while ponderer.result is None:
+            time.sleep(0.01)
+        result = ponderer.stop()
+        square, give = result.move
+        bitboard.make_move(state, placement=square)
+        bitboard.make_move(state, piece_to_give=give)
+        cold = Searcher().search(state, depth=3)
+        warm = Searcher(table=ponderer.searcher.table).search(state, depth=3)
+        assert warm.nodes < cold.nodes
+
+    def test_restart_cancels_and_solver_range_is_skipped(self):
+        ponderer = Ponderer(Searcher())
+        assert ponderer.start(random_position(6, turns=3))
+        assert ponderer.start(random_position(7, turns=3))
+        assert not ponderer.start(random_position(8, turns=9))
+        assert not ponderer.active
+
+
+@pytest.fixture(scope="module")
+def opening_book(tmp_path_factory):
+    path = tmp_path_factory.mktemp("book") / "opening.qbk"
+    build_book(path, turns=1, depth=1)
+    book = OpeningBook(path)
+    yield book
+    book.close()
+
+
+class TestOpeningBook:
+    def test_positions_are_canonically_distinct(self):
+        positions = book_positions(1)
+        assert len(positions) == 1 + 1 + 12
+        assert len({canonical_key(state) for state in positions}) == len(positions)
+
+    def test_book_move_matches_search_in_every_orientation(self, opening_book):
+        assert len(opening_book) == 14
+        state = random_position(7, turns=1)
+        score = Searcher().search(state, depth=1).score
+        orders = list(permutations(range(4)))
+        for k in range(8):
+            image = transform(state, k, orders[3 * k], k * 3 % 16)
+            move, entry = opening_book.lookup(image)
+            assert move in Searcher().root_moves(image)
+            assert (entry.score, entry.depth) == (score, 1)
+
+    def test_out_of_book(self, opening_book):
+        assert opening_book.lookup(random_position(8, turns=3)) is None
+
+    def test_think_uses_default_book(self, opening_book, monkeypatch):
+        monkeypatch.setattr(book_module, "_default_book", opening_book)
+        result = think(BitState.initial().to_game_state(), node_limit=10)
+        assert result.nodes == 0
+        assert result.move[0] == EMPTY
+
+
+class TestInstrumentation:
+    def test_stats_do_not_change_search(self):
+        state = random_position(4, turns=5)
+        plain = Searcher().search(state, depth=3)
+        stats = SearchStats()
+        counted = Searcher(stats=stats).search(state, depth=3)
+        assert (counted.move, counted.score, counted.nodes) == (plain.move, plain.score, plain.nodes)
+        assert stats.nodes == plain.nodes
+        assert stats.win_checks > 0 and stats.evaluations > 0
+        assert stats.tt_hits + stats.tt_misses > 0
+        assert [iteration.depth for iteration in stats.iterations] == [3]
+
+    def test_branching_by_ply(self):
+        stats = SearchStats()
+        Searcher(stats=stats).iterative_search(random_position(5, turns=4), max_depth=3)
+        assert [iteration.depth for iteration in stats.iterations] == [1, 2, 3]
+        assert stats.expanded[1] > 0
+        assert 0 < stats.branching_factor(1) <= 12 * 11
+        assert stats.branching_factor(99) == 0.0
+        assert "branching by ply" in stats.report()
+        assert stats.as_dict()["nodes"] == stats.nodes
+
+    def test_profile_dump(self, tmp_path):
+        path = tmp_path / "search.prof"
+        with profiled(str(path)) as summary:
+            Searcher().search(random_position(6, turns=5), depth=2)
+        assert path.stat().st_size > 0
+        assert "negamax" in summary.getvalue()
+
+
+class TestParallel:
+    def test_state_bytes_roundtrip(self):
+        placed = random_position(0, turns=5)
+        bitboard.make_move(placed, placement=bitboard.get_legal_placements(placed)[-1])
+        for state in (BitState.initial(), random_position(1, turns=3), placed):
+            packed = state.to_bytes()
+            assert len(packed) == 14
+            restored = BitState.from_bytes(packed)
+            assert restored.cells == state.cells
+            assert restored.attrs == state.attrs
+            assert (restored.occupied, restored.remaining, restored.selected, restored.phase, restored.player) == \
+                (state.occupied, state.remaining, state.selected, state.phase, state.player)
+
+    def test_parallel_score_matches_serial(self):
+        state = random_position(1, turns=6)
+        expected = Searcher().search(state.copy(), depth=2)
+        with ParallelSearcher(workers=2) as searcher:
+            result = searcher.search(state, depth=2)
+        assert result.score == expected.score
+        assert result.move in Searcher().root_moves(state)
+
+    def test_compare_reports_speedup(self):
+        report = compare(random_position(2, turns=6), depth=2, workers=2)
+        assert report["serial_score"] == report["parallel_score"]
+        assert report["speedup"] > 0
+
+
+class TestMCTS:
+    def _winning_position(self) -> BitState:
+        state = BitState.initial()
+        for col, code in enumerate((0b1000, 0b1001, 0b1010)):
+            state.cells[square_index(0, col)] = code
+        remaining = bitboard.ALL_PIECES & ~(1 << 0b1000 | 1 << 0b1001 | 1 << 0b1010 | 1 << 0b1011)
+        return BitState(cells=state.cells, remaining=remaining, phase=GamePhase.PLACE_PIECE, selected=0b1011)
+
+    def test_playouts_match_python_playouts(self):
+        state = random_position(0, turns=3)
+        rng = np.random.default_rng(1)
+        batched = random_playouts([state], 4000, rng)[0] / 4000
+
+        py_rng = random.Random(1)
+        total = 0
+        for _ in range(1000):
+            game = state.copy()
+            sign = 1
+            while True:
+                square = py_rng.choice(bitboard.get_legal_placements(game))
+                bitboard.make_move(game, placement=square)
+                if bitboard.placement_wins(game, square):
+                    total += sign
+                    break
+                if not game.remaining:
+                    break
+                bitboard.make_move(game, piece_to_give=py_rng.choice(bitboard.get_legal_piece_selections(game)))
+                sign = -sign
+        assert abs(batched - total / 1000) < 0.1
+
+    def test_playout_of_last_square(self):
+        cells = [0, 15, 1, 14, 2, 13, 3, 12, 4, 11, 5, 10, 6, 9, 7, EMPTY]
+        state = BitState(cells=cells, remaining=0, phase=GamePhase.PLACE_PIECE, selected=8)
+        expected = 1 if bitboard.wins_with(state, 15, 8) else 0
+        assert random_playouts([state], 10, np.random.default_rng(0))[0] == 10 * expected
+
+    def test_takes_immediate_win(self):
+        result = MCTS(seed=0).search(self._winning_position(), iterations=5)
+        assert result.move == (square_index(0, 3), EMPTY)
+        assert result.value == 1.0
+
+    def test_avoids_giving_winning_piece(self):
+        state = self._winning_position()
+        state.selected = 0b0100
+        state.remaining |= 1 << 0b1011
+        state.remaining &= ~(1 << 0b0100)
+        result = MCTS(seed=0).search(state, iterations=60)
+        square, give = result.move
+        bitboard.make_move(state, placement=square)
+        assert not any(bitboard.wins_with(state, s, give) for s in bitboard.get_legal_placements(state))
+
+    def test_seeded_search_is_deterministic(self):
+        state = random_position(3, turns=5).to_game_state()
+        first = get_mcts_move(state, iterations=10, seed=7)
+        second = get_mcts_move(state, iterations=10, seed=7)
+        assert first == second
+
+
+class TestArena:
+    def test_parse_player(self):
+        assert parse_player("random") == ("random", 0)
+        assert parse_player("minimax:3") == ("minimax", 3)
+        assert parse_player("think:0.5") == ("think", 0.5)
+        for spec in ("alphabeta:3", "mcts", "minimax:x", "think:0"):
+            with pytest.raises(ValueError):
+                parse_player(spec)
+
+    def test_openings_are_seeded_and_quiet(self):
+        state = opening(5, turns=3)
+        assert state.to_bytes() == opening(5, turns=3).to_bytes()
+        assert state.occupied.bit_count() == 3
+        assert not any(bitboard.wins_with(state, s, state.selected) for s in bitboard.get_legal_placements(state))
+
+    def test_game_plays_to_the_end(self):
+        state = opening(1, turns=2)
+        winner, plies = play_game((Player("random", 0), Player("minimax:1", 1)), state)
+        assert winner in (0, 1, None)
+        if winner is None:
+            assert not state.remaining and state.occupied == bitboard.FULL_BOARD
+        else:
+            assert bitboard.check_winner(state) is not None
+
+    def test_summary(self):
+        records = [arena.MatchResult(i, i % 2 == 0, result, 10, 0.1) for i, result in enumerate((1, 1, 0, -1))]
+        summary = summarize(records, played=4, seconds=2.0)
+        assert (summary.wins, summary.draws, summary.losses) == (2, 1, 1)
+        assert summary.score == 0.625
+        assert 0 < summary.margin < 1
+        assert summary.elo > 0
+        assert summary.games_per_second == 2.0
+
+    def test_streams_and_resumes(self, tmp_path):
+        path = tmp_path / "match.jsonl"
+        seen = []
+        first = run_arena("random", "minimax:1", 4, output=path, workers=1, on_game=lambda r, s: seen.append(r))
+        assert first.games == 4 and len(seen) == 4
+        assert len(path.read_text().splitlines()) == 5
+        with open(path, "a") as f:
+            f.write('{"game": 9, "a_fi')
+        second = run_arena("random", "minimax:1", 6, output=path, workers=1)
+        assert second.games == 6
+        assert sorted(json.loads(line)["game"] for line in path.read_text().splitlines()[1:]) == list(range(6))
+        with pytest.raises(ValueError):
+            run_arena("random", "minimax:2", 6, output=path, workers=1)
+
+
+def deadly_give_game() -> GameRecord:
+    """Pieces 0-3 go along the top row; player 1 makes it three and then gives the fourth."""
+    plies = (0, 0, 1, 1, 2, 2, 3, 3)
+    record = record_game(replay(GameRecord(plies, UNFINISHED)))
+    assert record.result == 0
+    return record
+
+
+class TestAnalysis:
+    def test_game_positions(self):
+        positions = game_positions(deadly_give_game())
+        assert [move for _, move in positions] == [(EMPTY, 0), (0, 1), (1, 2), (2, 3), (3, EMPTY)]
+        unfinished = game_positions(GameRecord((5, 0, 6), UNFINISHED))
+        assert unfinished[-1][1] is None and unfinished[-1][0].selected == 6
+        with pytest.raises(ValueError):
+            game_positions(GameRecord((5, 0, 6, 1), UNFINISHED))
+
+    def test_annotations_flag_blunders_and_use_cache(self, tmp_path):
+        games = tmp_path / "games.qgr"
+        write_records(games, [deadly_give_game(), GameRecord((5, 0, 6, 1, 7), UNFINISHED), deadly_give_game()])
+        output = tmp_path / "notes.jsonl"
+        cache = tmp_path / "analysis.qac"
+        written, searched = analyze_file(games, output, depth=1, cache_path=cache, workers=1)
+        notes = [json.loads(line) for line in output.read_text().splitlines()]
+        assert written == len(notes) == 5 + 3 + 5
+        # Giving piece 3 next to the three it completes loses at once
+        assert [note["blunder"] for note in notes[:5]] == [False, False, False, True, False]
+        assert notes[4]["played_score"] == WIN_SCORE
+        assert notes[3]["best"] != notes[3]["move"]
+        # The repeated game and the shared opening position are searched only once, and
+        # the position the unfinished game stops at not at all
+        assert searched == 5 + 1
+        positions = game_positions(deadly_give_game())
+        assert [note["static"] for note in notes[:5]] == [evaluate(state) for state, _ in positions]
+
+        written_again, searched_again = analyze_file(games, output, depth=1, cache_path=cache, workers=1)
+        assert (written_again, searched_again) == (written, 0)
+        assert len(AnalysisCache(cache)) == searched
+
+    def test_engine_moves_are_not_blunders(self, tmp_path):
+        # With nine empty squares the heuristic likes the engine's move, while one turn
+        # later the exact solver already sees it lose; the two must not be compared
+        state = random_position(1, 7)
+        move = Searcher().search(state, 1).move
+        bitboard.make_move(state, placement=move[0])
+        bitboard.make_move(state, piece_to_give=move[1])
+        games = tmp_path / "games.qgr"
+        write_records(games, [record_game(state)])
+        output = tmp_path / "notes.jsonl"
+        analyze_file(games, output, depth=1, workers=1)
+        notes = [json.loads(line) for line in output.read_text().splitlines()]
+        assert notes[-1]["move"] == notes[-1]["best"] == list(move)
+        for note in notes:
+            if note["move"] == note["best"]:
+                assert not note["blunder"] and note["played_score"] == note["score"]
+
+    def test_cache_survives_partial_write(self, tmp_path):
+        path = tmp_path / "analysis.qac"
+        cache = AnalysisCache(path)
+        cache.put(12345, BookEntry(678, -5, 2))
+        cache.close()
+        with open(path, "ab") as f:
+            f.write(b"\x01\x02")
+        reopened = AnalysisCache(path)
+        assert reopened.get(12345, 2) == BookEntry(678, -5, 2)
+        assert reopened.get(12345, 3) is None
+        reopened.put(999, BookEntry(0, 1, 1))
+        reopened.close()
+        assert len(AnalysisCache(path)) == 2
+
+
+class TestTuning:
+    def test_training_positions(self):
+        chunks = list(training_chunks([deadly_give_game(), GameRecord((5, 0, 6), UNFINISHED)], chunk=3))
+        assert [len(chunk.outcomes) for chunk in chunks] == [3, 1]
+        # Player 0 wins, and holds the piece after every second give
+        assert np.concatenate([chunk.outcomes for chunk in chunks]).tolist() == [0, 1, 0, 1]
+        assert chunks[0].selected.tolist() == [0, 1, 2]
+
+    def test_fit_recovers_logistic_weights(self):
+        rng = np.random.default_rng(0)
+        sample = np.stack([rng.integers(0, size, 4000) for size in (2, 20, 16, 16)], axis=1)
+        true = np.array([2.0, 0.1, -0.2, 0.05])
+        histogram = FeatureHistogram()
+        # Expected outcomes stand in for many games per position
+        histogram.add(sample, 1 / (1 + np.exp(-(sample @ true - 0.3))))
+        logits, bias, _ = fit_logistic(histogram, l2=0.0)
+        assert np.allclose(logits, true, atol=1e-6) and abs(bias + 0.3) < 1e-6
+        assert to_score_weights(logits) == (200, 10, -20, 5)
+        assert sum(abs(w) * (size - 1) for w, size in zip(to_score_weights(logits * 100), (2, 20, 16, 16))) < 9_900
+
+    def test_tune_from_recorded_self_play(self, tmp_path):
+        games = tmp_path / "self_play.qgr"
+        run_arena("random", "minimax:1", 6, workers=1, record_path=games)
+        assert len(list(read_records(games))) == 6
+        tuned = tune(read_records(games), chunk=5)
+        assert tuned == tune(read_records(games), chunk=1 << 16)
+        assert tuned.games == 6 and tuned.positions > 6 * 3
+
+        path = tmp_path / "weights.json"
+        write_weights(path, tuned, [str(games)])
+        assert load_weights(path) == tuned.weights
+        data = json.loads(path.read_text())
+        data["version"] += 1
+        path.write_text(json.dumps(data))
+        with pytest.raises(ValueError):
+            load_weights(path)